@@ -9,6 +9,9 @@ import _binary_corr
 import _binary_corr_trunc
 import _binary_corr_prune
 import _csv_mean
+import _filter_chain
+import _construction
+import _compile
 
 
 class _Plotter(object):
@@ -55,6 +58,27 @@ if __name__ == '__main__':
         p.add_results(num_rows, _csv_mean.run_tests(algs, num_rows, 10, num_its))
     p.to_file('CSVMean.png')
 
+    p = _Plotter('# Rows', 'Time (sec)')
+    algs = ['dagpype', 'fused dagpype', 'batched dagpype', 'fused batched dagpype']        
+    for num_rows in (base * i for i in range(1, 30) if i % 3 == 0):
+        print('running', num_rows)
+        p.add_results(num_rows, _filter_chain.run_tests(algs, num_rows, 10, num_its))
+    p.to_file('FilterChain.png')
+
+    p = _Plotter('# Pipes', 'Time (sec)')
+    algs = ['dagpype', 'filtered dagpype', 'standard Python']        
+    for num_pipes in (base * i for i in range(1, 30) if i % 3 == 0):
+        print('running', num_pipes)
+        p.add_results(num_pipes, _construction.run_tests(algs, num_pipes, num_its))
+    p.to_file('Construction.png')
+
+    p = _Plotter('# Pipes', 'Time (sec)')
+    algs = ['dagpype', 'compiled dagpype']        
+    for num_pipes in (base * i for i in range(1, 30) if i % 3 == 0):
+        print('running', num_pipes)
+        p.add_results(num_pipes, _compile.run_tests(algs, num_pipes, num_its))
+    p.to_file('Compile.png')
+
     p = _Plotter('# Rows', 'Time (sec)')
     algs = ['dagpype', 'chunking dagpype', 'csv.reader', 'csv.DictReader', 'numpy']        
     for num_rows in (base * i for i in range(1, 30) if i % 3 == 0):
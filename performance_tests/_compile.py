@@ -0,0 +1,43 @@
+import sys
+import time
+
+sys.path.extend(['..', '../..'])
+from dagpype import *
+
+
+_data = [1, 2, 3]
+
+
+def _target():
+    return filt(lambda x: x + 1) | filt(pre = lambda x: x > 1) | filt(lambda x: 2 * x) | sum_()
+
+
+def _piped(num_pipes):
+    target = _target()
+    for j in range(num_pipes):
+        source(_data) | target
+
+
+def _compiled(num_pipes):
+    runner = compile_(_target())
+    for j in range(num_pipes):
+        runner(_data)
+
+
+def _run_test(fn, num_pipes, num_its):
+    start = time.time()
+    for i in range(num_its):
+        fn(num_pipes)
+    end = time.time()
+    diff = (end - start) / num_its
+    return diff
+
+
+def run_tests(names, num_pipes, num_its):
+    fns = dict([
+        ('dagpype', _piped),
+        ('compiled dagpype', _compiled)])
+    t = dict([])        
+    for name in names:        
+        t[name] = _run_test(fns[name], num_pipes, num_its)
+    return t
@@ -0,0 +1,41 @@
+import sys
+import time
+
+sys.path.extend(['..', '../..'])
+from dagpype import *
+
+
+_data = [1, 2, 3]
+
+
+def _pipe():
+    source(_data) | sum_()
+
+
+def _filter_pipe():
+    source(_data) | filt(lambda x: x + 1) | filt(pre = lambda x: x > 1) | filt(lambda x: 2 * x) | sum_()
+
+
+def _python():
+    sum(2 * (x + 1) for x in _data if x + 1 > 1)
+
+
+def _run_test(fn, num_pipes, num_its):
+    start = time.time()
+    for i in range(num_its):
+        for j in range(num_pipes):
+            fn()
+    end = time.time()
+    diff = (end - start) / num_its
+    return diff
+
+
+def run_tests(names, num_pipes, num_its):
+    fns = dict([
+        ('dagpype', _pipe),
+        ('filtered dagpype', _filter_pipe),
+        ('standard Python', _python)])
+    t = dict([])        
+    for name in names:        
+        t[name] = _run_test(fns[name], num_pipes, num_its)
+    return t
@@ -0,0 +1,47 @@
+import os
+import sys
+import time
+
+import _src
+sys.path.extend(['..', '../..'])
+from dagpype import *
+
+
+_f_name = 'perf.csv'
+
+
+def _pipe(fused, batched):
+    prev_fused, prev_batched = fusion(fused), batch_size(1024 if batched else 0)
+    try:
+        stream_vals(_f_name) | \
+            filt(pre = lambda t: t[0] > 0.1) | \
+            filt(lambda t: (t[1], t[2], t[0])) | \
+            select_inds((0, 2)) | \
+            cast((float, float)) | \
+            count()
+    finally:
+        fusion(prev_fused)
+        batch_size(prev_batched)
+
+
+def _run_test(fn, num_rows, num_cols, num_its):
+    _src.make_csv_file(_f_name, num_rows, num_cols)
+    start = time.time()
+    for i in range(num_its):
+        fn()
+    end = time.time()
+    diff = (end - start) / num_its
+    os.remove(_f_name)
+    return diff
+
+
+def run_tests(names, num_rows, num_cols, num_its):
+    fns = dict([
+        ('dagpype', lambda: _pipe(False, False)),
+        ('fused dagpype', lambda: _pipe(True, False)),
+        ('batched dagpype', lambda: _pipe(False, True)),
+        ('fused batched dagpype', lambda: _pipe(True, True))])
+    t = dict([])        
+    for name in names:        
+        t[name] = _run_test(fns[name], num_rows, num_cols, num_its)
+    return t
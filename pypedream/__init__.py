@@ -18,6 +18,9 @@ from . import _src
 from . import _filt
 from . import _snk
 from . import _subgroup_filt
+from . import _parallel
+from . import _profile
+from . import _incremental
 
 
 try:
@@ -26,6 +29,9 @@ try:
     from ._filt import *
     from ._snk import *
     from ._subgroup_filt import *
+    from ._parallel import *
+    from ._profile import *
+    from ._incremental import *
     from ._csv_utils import *
 except ValueError:
     from _core import *
@@ -33,13 +39,22 @@ except ValueError:
     from _filt import *
     from _snk import *
     from _subgroup_filt import *
+    from _parallel import *
+    from _profile import *
+    from _incremental import *
     from _csv_utils import *
+try:
+    from . import _async
+    from ._async import *
+except SyntaxError:
+    # The asyncio stages require Python 3.5 or later.
+    _async = None
 from . import np
 from . import plot
 
 
 __all__ = []
-for m in [_core, _src, _filt, _snk, _subgroup_filt]:
+for m in [_core, _src, _filt, _snk, _subgroup_filt, _parallel, _profile, _incremental] + ([_async] if _async is not None else []):
     for s in dir(m):
         if s[0] == '_':
             continue
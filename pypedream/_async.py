@@ -0,0 +1,296 @@
+"""
+Stages and execution for asyncio (Python 3.5 and later).
+
+Pipes containing these stages can still be connected as usual (e.g., via source(...) | sink),
+    in which case each awaitable is run to completion on a private event loop. Running
+    them with run_async instead, e.g.,
+
+    >>> res = await (async_source(requests()) | async_filt(lookup, limit = 32)).run_async(to_list())
+
+    runs the stages as tasks of the running event loop, connected by bounded queues.
+"""
+
+
+import asyncio
+import collections
+
+from dagpype._core import _SrcPiped, _MidPiped, _Chainer, _FinalActor, _fuse, _rewrite, InvalidParamError
+from dagpype import _core
+
+
+__all__ = []
+
+
+# Maximal number of elements queued between tasks.
+_queue_size = 64
+
+_end = object()
+
+
+def _async_kind(fn):
+    return getattr(fn, '_dagpype_async', (None, ))[0]
+
+
+__all__ += ['async_source']
+def async_source(aiterable):
+    """
+    Creates a source from an asynchronous iterable.
+
+    Arguments:
+        aiterable -- Asynchronous iterable whose values will be sent on.
+
+    See Also:
+        :func:`dagpype.source`
+        :func:`dagpype.async_filt`
+
+    Example:
+
+    >>> async def ticks():
+    ...     for i in range(3):
+    ...         await asyncio.sleep(0.1)
+    ...         yield i
+    >>> async_source(ticks()) | to_list()
+    [0, 1, 2]
+    """
+    def act(target):
+        loop = asyncio.new_event_loop()
+        it = aiterable.__aiter__()
+        try:
+            while True:
+                try:
+                    e = loop.run_until_complete(it.__anext__())
+                except StopAsyncIteration:
+                    break
+                (yield)
+                target.send(e)
+        except GeneratorExit:
+            pass
+        finally:
+            loop.close()
+        target.close()
+
+    act._dagpype_async = ('source', aiterable)
+    return _SrcPiped([act])
+
+
+__all__ += ['async_filt']
+def async_filt(fn, limit = 16):
+    """
+    Applies an asynchronous function to each element, e.g., for I/O-bound lookups. When run
+        via run_async, up to limit calls are awaited concurrently; the results are sent
+        on in the order of the elements.
+
+    Arguments:
+        fn -- Coroutine function taking an element.
+
+    Keyword Arguments:
+        limit -- Maximal number of concurrent calls (default 16).
+
+    See Also:
+        :func:`dagpype.offload`
+        :func:`dagpype.filt`
+
+    Example:
+
+    >>> async def double(x):
+    ...     await asyncio.sleep(0.1)
+    ...     return 2 * x
+    >>> source([1, 2, 3]) | async_filt(double) | to_list()
+    [2, 4, 6]
+    """
+    if limit < 1:
+        raise InvalidParamError('limit', limit, 'Must be positive')
+
+    def _dagpype_internal_fn_act(target):
+        loop = asyncio.new_event_loop()
+        try:
+            while True:
+                target.send(loop.run_until_complete(fn((yield))))
+        except GeneratorExit:
+            target.close()
+        finally:
+            loop.close()
+
+    _dagpype_internal_fn_act._dagpype_async = ('filter', fn, limit)
+    return _MidPiped([_dagpype_internal_fn_act])
+
+
+__all__ += ['offload']
+def offload(fn, executor = None, limit = 16):
+    """
+    Applies a (CPU-heavy) function to each element. When run via run_async, the calls run
+        in an executor, so that they do not block the event loop; up to limit calls
+        run concurrently, and the results are sent on in the order of the elements.
+
+    Arguments:
+        fn -- Function taking an element.
+
+    Keyword Arguments:
+        executor -- concurrent.futures executor, or None for the loop's default
+            executor (default None).
+        limit -- Maximal number of concurrent calls (default 16).
+
+    See Also:
+        :func:`dagpype.async_filt`
+
+    Example:
+
+    >>> res = await (source(range(100)) | offload(lambda x : x ** 1000 % 7)).run_async(sum_())
+    """
+    if limit < 1:
+        raise InvalidParamError('limit', limit, 'Must be positive')
+
+    def _dagpype_internal_fn_act(target):
+        try:
+            while True:
+                target.send(fn((yield)))
+        except GeneratorExit:
+            target.close()
+
+    def start(e):
+        return asyncio.get_event_loop().run_in_executor(executor, fn, e)
+
+    _dagpype_internal_fn_act._dagpype_async = ('filter', start, limit)
+    return _MidPiped([_dagpype_internal_fn_act])
+
+
+def _segments(fns):
+    """
+    Splits a list of stage functions into lists of synchronous stages and single
+        asynchronous stages.
+    """
+    def check(fns):
+        for what in fns:
+            if isinstance(what, tuple):
+                for fn in what:
+                    if any(_async_kind(f) is not None for f in fn if not isinstance(f, tuple)):
+                        raise InvalidParamError('fns', fn, 'Async stages within fans are unsupported')
+                    check([f for f in fn if isinstance(f, tuple)])
+
+    check(fns)
+    segs, sync = [], []
+    for i, what in enumerate(fns):
+        kind = _async_kind(what) if not isinstance(what, tuple) else None
+        if kind is None:
+            sync.append(what)
+            continue
+        assert kind == 'filter' or i == 0
+        if len(sync) > 0:
+            segs.append(sync)
+            sync = []
+        segs.append(what)
+    if len(sync) > 0:
+        segs.append(sync)
+    return segs
+
+
+def _collect(out):
+    while True:
+        out.append((yield))
+
+
+async def _drive_source(gen, out, q):
+    try:
+        while True:
+            gen.send(True)
+            if q is not None:
+                for e in out:
+                    await q.put(e)
+                del out[:]
+            else:
+                # Yields to the loop, as the whole pipe runs here.
+                await asyncio.sleep(0)
+    except StopIteration:
+        pass
+    if q is not None:
+        for e in out:
+            await q.put(e)
+        await q.put(_end)
+
+
+async def _drive_async_source(aiterable, q):
+    async for e in aiterable:
+        await q.put(e)
+    await q.put(_end)
+
+
+async def _drive_filter(start, limit, in_q, q):
+    pending = collections.deque()
+    try:
+        while True:
+            e = await in_q.get()
+            if e is _end:
+                break
+            pending.append(asyncio.ensure_future(start(e)))
+            if len(pending) >= limit:
+                await q.put(await pending.popleft())
+        while len(pending) > 0:
+            await q.put(await pending.popleft())
+    finally:
+        for f in pending:
+            f.cancel()
+        await asyncio.gather(*pending, return_exceptions = True)
+    await q.put(_end)
+
+
+async def _drive_sync(gen, out, in_q, q):
+    try:
+        while True:
+            e = await in_q.get()
+            if e is _end:
+                gen.close()
+                break
+            gen.send(e)
+            if q is not None:
+                for e in out:
+                    await q.put(e)
+                del out[:]
+    except StopIteration:
+        pass
+    if q is not None:
+        for e in out:
+            await q.put(e)
+        await q.put(_end)
+
+
+async def _run(pipe, target):
+    fns = pipe.simple() + target.simple()
+    segs = _segments(_rewrite(fns) if _core._optimization else fns)
+    f = _FinalActor()
+    coros, in_q = [], None
+    for i, seg in enumerate(segs):
+        last = i == len(segs) - 1
+        q = None if last else asyncio.Queue(_queue_size)
+        if not isinstance(seg, list):
+            if _async_kind(seg) == 'source':
+                coros.append(_drive_async_source(seg._dagpype_async[1], q))
+            else:
+                coros.append(_drive_filter(seg._dagpype_async[1], seg._dagpype_async[2], in_q, q))
+        else:
+            out = []
+            if last:
+                gen = f.gen
+            else:
+                gen = _collect(out)
+                next(gen)
+            gen = _Chainer(_fuse(seg) if _core._fusion else seg, gen, src = i == 0).gen
+            if i == 0:
+                coros.append(_drive_source(gen, out, q))
+            else:
+                coros.append(_drive_sync(gen, out, in_q, q))
+        in_q = q
+
+    tasks = [asyncio.ensure_future(c) for c in coros]
+    try:
+        while not tasks[-1].done():
+            done, _ = await asyncio.wait(tasks, return_when = asyncio.FIRST_COMPLETED)
+            for t in done:
+                if t.exception() is not None:
+                    raise t.exception()
+            tasks = [t for t in tasks if t is tasks[-1] or not t.done()]
+        tasks[-1].result()
+    finally:
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions = True)
+    return f.res()
@@ -1,11 +1,39 @@
+import sys
 import types
 import itertools
 import collections
 import warnings
+import functools
+import threading
+try:
+    import Queue as _queue
+except ImportError:
+    import queue as _queue
 
 
 __all__ = []
-    
+
+
+_batch_size = 1024
+_batch_source = 'source'
+_batch_filter = 'filter'
+_batch_sink = 'sink'
+
+_fusion = True
+_fuse_map = 'map'
+_fuse_pred = 'pred'
+
+_threaded_fans = False
+# Number of elements queued to a fan branch running on its own thread.
+_fan_queue_size = 8
+# Placeholder for a fan branch which has not sent a value yet.
+_missing = object()
+
+# Whether plans are rewritten before they are run.
+_optimization = True
+# Whether rewrites may assume the functions passed to filt (and sort_ keys) are pure.
+_assume_pure = False
+
 
 class Error(Exception):
     """
@@ -52,7 +80,46 @@ class InvalidParamError(Error, ValueError):
 __all__ += ['InvalidParamError']
 
 
+class JoinOverflowError(Error):
+    """
+    Indicates a fan branch got too far ahead of the others (see align).
+    """
+
+    def __init__(self, branch, max_buffer):
+        Error.__init__(self, 'branch %d buffered more than %d elements' % (branch, max_buffer))
+        self._branch = branch
+
+    def branch(self):
+        """
+        Returns the index of the offending branch.
+        """
+
+        return self._branch
+__all__ += ['JoinOverflowError']
+
+
 class _Piped(object):
+    def explain(self, optimize = True):
+        """
+        Returns a description of the plan of this pipe: each stage's position (e.g., '2.1.0' 
+            for the first stage of the second branch of a fan which is the third stage),
+            the name of its factory (e.g., 'filt'), and its parameters.
+
+        Keyword Arguments:
+            optimize -- Whether to describe the plan as rewritten for running it 
+                (see optimization) (default True).
+
+        Example:
+
+        >>> print((relay() | (select_inds(0) | sum_()) + (select_inds(0) | count())).explain())
+        0      select_inds(inds=0)
+        1      fan
+        1.0.0    sum_()
+        1.1.0    count()
+        """
+        fns = self.simple()
+        return _explain(_rewrite(fns) if optimize else fns)
+
     @staticmethod
     def assert_valid_fn_list(fns):
         assert isinstance(fns, list)
@@ -72,6 +139,26 @@ class _Piped(object):
             assert isinstance(fn_, types.FunctionType)
 
 
+class _Fan(tuple):
+    """
+    Fan (tuple of branch stage function lists) with a join alignment (see align).
+    """
+
+    def __new__(cls, branches, alignment):
+        fan = tuple.__new__(cls, branches)
+        fan.alignment = alignment
+        return fan
+
+
+def _like_fan(fan, branches):
+    """
+    Returns a fan of branches, keeping the alignment of fan.
+    """
+    if isinstance(fan, _Fan):
+        return _Fan(branches, fan.alignment)
+    return tuple(branches)
+
+
 class _SimplePiped(_Piped):
     def __init__(self, fns):
         self._fns = fns
@@ -95,6 +182,60 @@ class _SrcPiped(_SimplePiped):
     def __add__(self, other):
         return _SrcFannedPiped(self.fanned() + other.fanned())
 
+    def run_async(self, target):
+        """
+        Returns an awaitable connecting this pipe to a target, equivalently to self | target,
+            where asynchronous stages (e.g., async_source, async_filt, offload) run as tasks 
+            of the running event loop. Requires Python 3.5 or later.
+        """
+        from dagpype._async import _run
+        return _run(self, target)
+
+
+def _source(iterable, close):
+    """
+    Creates a source from an iterable, calling close (if not None) once the pipe is done 
+        with the source (after its target is closed), so that resources it owns (e.g., 
+        open files) are released even if it is not exhausted.
+    """
+    def act(target):
+        it = iter(iterable)
+        try:
+            try:
+                for e in it:
+                    (yield)
+                    target.send(e)
+            except GeneratorExit:
+                pass
+            target.close()
+        finally:
+            if close is not None:
+                close()
+
+    def batch_act(target):
+        it = iter(iterable)
+        try:
+            try:
+                while True:
+                    l = list(itertools.islice(it, _batch_size))
+                    if len(l) == 0:
+                        break
+                    (yield)
+                    target.send(l)
+            except GeneratorExit:
+                pass
+            target.close()
+        finally:
+            if close is not None:
+                close()
+
+    act._dagpype_batch_twin = batch_act
+    batch_act._dagpype_batch = _batch_source
+    piped = _node(_SrcPiped([act]), 'source', iterable = iterable)
+    # Described as source (e.g., by profile) whichever of the two runs.
+    batch_act._dagpype_node = act._dagpype_node
+    return piped
+
 
 __all__ += ['source']
 def source(iterable):
@@ -115,21 +256,15 @@ def source(iterable):
     >>> source(()) | count()
     0
     """
-    def act(target):
-        try:
-            for e in iterable:
-                (yield)
-                target.send(e) 
-        except GeneratorExit:
-            target.close()    
-
-    return _SrcPiped([act])
+    return _source(iterable, None)
 
 
 __all__ += ['sources']
 def sources(fn):
     """
-    Decorator signifying a (generator) function is a source function.
+    Decorator signifying a (generator) function is a source function. The generator is
+        closed once the pipe is done with it, even if it is not exhausted (whereas source
+        leaves the iterables passed to it to their callers).
 
     Arguments:
         fn -- Decorated function.
@@ -144,7 +279,8 @@ def sources(fn):
     ...             yield '1'
     ...     return _act
     """
-    return source(fn())
+    gen = fn()
+    return _source(gen, gen.close)
 
 
 class _MidPiped(_SimplePiped):
@@ -188,72 +324,994 @@ def filters(fn):
     return _MidPiped([fn])
 
 
+__all__ += ['batch_filters']
+def batch_filters(fn):
+    """
+    Decorator signifying a (generator) function is a batch filter function. A batch
+        filter receives lists of elements, and sends on lists of elements. Where a batch
+        stage meets a per-element stage, adapters are inserted automatically.
+        The received lists should not be modified.
+
+    Arguments:
+        fn -- Decorated function.
+
+    See Also:
+        :func:`dagpype.batch_sinks`
+        :func:`dagpype.batch_size`
+
+    Example:
+
+    >>> # Function adding 1 to anything, a list at a time:
+    >>> def add_1():
+    ...     @batch_filters
+    ...     def _act(target):
+    ...         try:
+    ...             while True:
+    ...                 target.send([e + 1 for e in (yield)])
+    ...         except GeneratorExit:
+    ...             target.close()
+    ...     return _act
+    """
+    fn._dagpype_batch = _batch_filter
+    return _MidPiped([fn])
+
+
+def _with_batch(piped, batch_piped):
+    """
+    Attaches to a (single-stage) pipe a native batch implementation, used in place of the
+        per-element one whenever this avoids adapters.
+    """
+    piped._fns[0]._dagpype_batch_twin = batch_piped._fns[0]
+    return piped
+
+
+def _mergeable(piped, merge, finalize):
+    """
+    Makes mergeable a sink pipe sending on a partial state (even if it received no elements), 
+        by appending a stage finalizing the state. merge combines two states, and finalize 
+        converts a state to a result, raising NoResultError if there is none.
+
+    See Also:
+        :func:`dagpype.partial_state`
+        :func:`dagpype.merge_states`
+    """
+    def _dagpype_internal_fn_act(target):
+        has = False
+        try:
+            while True:
+                s = (yield)
+                has = True
+        except GeneratorExit:
+            if has:
+                try:
+                    res = finalize(s)
+                except NoResultError:
+                    pass
+                else:
+                    target.send(res)
+            target.close()
+
+    _dagpype_internal_fn_act._dagpype_reduce = (merge, finalize)
+    # The pipe is a fresh one, so the stage is appended to it rather than to a copy.
+    piped._fns.append(_dagpype_internal_fn_act)
+    return piped
+
+
+def _merge_non_empty(op):
+    """
+    Returns a merge function for states which are None if empty, and otherwise combined by op.
+    """
+    def merge(a, b):
+        if a is None:
+            return b
+        if b is None:
+            return a
+        return op(a, b)
+    return merge
+
+
+def _finalize_non_empty(s):
+    if s is None:
+        raise NoResultError()
+    return s
+
+
+def _add_states(a, b):
+    return tuple(e + f for e, f in zip(a, b))
+
+
+__all__ += ['batch_size']
+def batch_size(size = None):
+    """
+    Gets and optionally sets the number of elements sent at a time between stages
+        supporting batch transport. Pipes whose source is a sequence shorter than a batch
+        do not use batch transport.
+
+    Keyword Arguments:
+        size -- If not None, the new batch size; 0 disables batch transport (default None).
+
+    Returns:
+        The batch size in effect before the call.
+
+    See Also:
+        :func:`dagpype.batch_filters`
+        :func:`dagpype.batch_sinks`
+
+    Example:
+
+    >>> prev = batch_size(0)
+    >>> source([1, 2, 3, 4]) | filt(lambda x : 2 * x) | sum_()
+    20
+    >>> batch_size(prev)
+    0
+    """
+    global _batch_size
+    prev = _batch_size
+    if size is not None:
+        if size < 0:
+            raise InvalidParamError('size', size, 'Must be non-negative')
+        _batch_size = size
+    return prev
+
+
+def _batch_relay(size):
+    def _dagpype_internal_fn_act(target):
+        l = []
+        try:
+            while True:
+                l.append((yield))
+                if len(l) >= size:
+                    target.send(l)
+                    l = []
+        except GeneratorExit:
+            if len(l) > 0:
+                target.send(l)
+            target.close()
+    return _dagpype_internal_fn_act
+
+
+def _unbatch_relay():
+    def _dagpype_internal_fn_act(target):
+        try:
+            while True:
+                for e in (yield):
+                    target.send(e)
+        except GeneratorExit:
+            target.close()
+    return _dagpype_internal_fn_act
+
+
+def _fusable(piped, steps):
+    """
+    Marks a (single-stage) pipe as fusable with adjacent fusable stages. Steps is a list of
+        (_fuse_map, fn) or (_fuse_pred, fn) pairs, describing the stage's per-element
+        transformations and suppressions, in order.
+    """
+    piped._fns[0]._dagpype_fuse = steps
+    return piped
+
+
+def _node(piped, kind, **params):
+    """
+    Records the declarative node of a (single-stage) pipe: its role ('source', 'filter', or
+        'sink'), its kind (the name of its factory, e.g., 'filt'), and its parameters.
+        Nodes are used for describing (see explain) and rewriting (see optimization) plans.
+    """
+    role = 'source' if isinstance(piped, _SrcPiped) else 'filter' if isinstance(piped, _MidPiped) else 'sink'
+    piped._fns[0]._dagpype_node = (role, kind, params)
+    return piped
+
+
+def _projectable(piped, project):
+    """
+    Marks a (single-stage) pipe as able to absorb a select_inds, cast, or filt stage following
+        it (e.g., a CSV reader reading only the selected columns). project takes the kind
+        and parameters of the following stage's node, and returns a stage function 
+        performing both stages, or None if it cannot.
+    """
+    piped._fns[0]._dagpype_project = project
+    return piped
+
+
+# Factory names of stage functions, by code object.
+_stage_names = dict([])
+
+
+def _encloses(code, inner):
+    for c in code.co_consts:
+        if isinstance(c, types.CodeType) and (c is inner or _encloses(c, inner)):
+            return True
+    return False
+
+
+def _stage_name(fn):
+    """
+    Returns the name of the function which created the stage function fn (e.g., 'filt'),
+        or fn's own name if this cannot be found.
+    """
+    node = getattr(fn, '_dagpype_node', None)
+    if node is not None:
+        return node[1]
+    code = fn.__code__
+    if code in _stage_names:
+        return _stage_names[code]
+    qualname = getattr(fn, '__qualname__', None)
+    if qualname is not None and '.<locals>.' in qualname:
+        name = qualname.split('.<locals>.')[-2]
+    else:
+        # Pre Py3K, the enclosing function is found by its nested code objects.
+        module = sys.modules.get(fn.__module__)
+        fns = [v for v in vars(module).values() if isinstance(v, types.FunctionType)] \
+            if module is not None else []
+        name = next((f.__name__ for f in fns if _encloses(f.__code__, code)), fn.__name__)
+    _stage_names[code] = name
+    return name
+
+
+__all__ += ['fusion']
+def fusion(enable = None):
+    """
+    Gets and optionally sets whether runs of adjacent fusable stages (e.g., filt, select_inds, 
+        cast, relay, grep, prob_rand_sample) are collapsed into a single stage when a pipeline 
+        is completed.
+
+    Keyword Arguments:
+        enable -- If not None, whether to fuse stages (default None).
+
+    Returns:
+        Whether stages were fused before the call.
+
+    Example:
+
+    >>> prev = fusion(False)
+    >>> source([1, 2, 3, 4]) | filt(lambda x : 2 * x) | filt(pre = lambda x : x > 2) | to_list()
+    [4, 6, 8]
+    >>> fusion(prev)
+    False
+    """
+    global _fusion
+    prev = _fusion
+    if enable is not None:
+        _fusion = bool(enable)
+    return prev
+
+
+# Compiled code of fused stage functions, by the kinds of their steps, so that completing 
+#     pipelines of the same shape binds new steps to existing code.
+_fused_codes = dict([])
+
+
+def _fused_code(kinds):
+    code = _fused_codes.get(kinds)
+    if code is not None:
+        return code
+    body, batch_body = [], []
+    # Steps are bound to locals, as local lookups are the cheapest.
+    bind = ''.join('f%d, ' % i for i in range(len(kinds))) + '= fns' if len(kinds) > 0 else 'pass'
+    for i, kind in enumerate(kinds):
+        if kind == _fuse_map:
+            body.append('e = f%d(e)' % i)
+            batch_body.append('l = list(map(f%d, l))' % i)
+        else:
+            assert kind == _fuse_pred
+            body.extend(['if not f%d(e):' % i, '    continue'])
+            batch_body.append('l = list(filter(f%d, l))' % i)
+    src = '\n'.join([
+        'def _dagpype_internal_fn_act(target):',
+        '    ' + bind,
+        '    send = target.send',
+        '    try:',
+        '        while True:',
+        '            e = (yield)'] + 
+        ['            ' + l for l in body] + [
+        '            send(e)',
+        '    except GeneratorExit:',
+        '        target.close()',
+        'def _dagpype_internal_fn_batch_act(target):',
+        '    ' + bind,
+        '    try:',
+        '        while True:',
+        '            l = (yield)'] +
+        ['            ' + l for l in batch_body] + [
+        '            if len(l) > 0:',
+        '                target.send(l)',
+        '    except GeneratorExit:',
+        '        target.close()'])
+    code = _fused_codes[kinds] = compile(src, '<string>', 'exec')
+    return code
+
+
+def _make_fused(steps):
+    """
+    Generates a stage function (with a batch twin) performing a list of fusion steps.
+    """
+    ns = {'fns': [fn for _, fn in steps]}
+    exec(_fused_code(tuple(kind for kind, _ in steps)), ns)
+    act, batch_act = ns['_dagpype_internal_fn_act'], ns['_dagpype_internal_fn_batch_act']
+    batch_act._dagpype_batch = _batch_filter
+    act._dagpype_batch_twin = batch_act
+    act._dagpype_fuse = steps
+    return act
+
+
+def _fuse(fns):
+    """
+    Returns a copy of a list of stage functions, where each run of adjacent fusable
+        stages is replaced by a single generated stage.
+    """
+    fused, run = [], []
+
+    def flush():
+        if len(run) == 1:
+            fused.append(run[0])
+        elif len(run) > 1:
+            fused.append(_make_fused([step for fn in run for step in fn._dagpype_fuse]))
+        del run[:]
+
+    for what in fns:
+        if isinstance(what, tuple):
+            flush()
+            fused.append(_like_fan(what, [_fuse(fn) for fn in what]))
+        elif getattr(what, '_dagpype_fuse', None) is not None:
+            run.append(what)
+        else:
+            flush()
+            fused.append(what)
+    flush()
+    return fused
+
+
+__all__ += ['optimization']
+def optimization(enable = None):
+    """
+    Gets and optionally sets whether plans are rewritten before they are run. The rewrites 
+        drop relay stages, push select_inds and cast stages into preceding CSV readers
+        (stream_vals, csv_split, and np.chunk_stream_vals), so that these parse only the
+        selected columns, push filt stages whose sole function is a pre field predicate 
+        (see field) into preceding stream_vals readers, so that these evaluate them on the
+        parsed fields, share the identical leading stages of all branches of fans, 
+        so that these run once, and move skip and slice_ stages before one-to-one stages 
+        (select_inds and cast), so that these process fewer elements. Stages calling
+        functions passed to them (filt, and sort_) are shared or moved past only if these
+        functions are assumed to be pure (see assume_pure).
+
+    Keyword Arguments:
+        enable -- If not None, whether to rewrite plans (default None).
+
+    Returns:
+        Whether plans were rewritten before the call.
+
+    See Also:
+        :func:`dagpype.fusion`
+        :func:`dagpype.assume_pure`
+
+    Example:
+
+    >>> print((select_inds(0) | skip(2) | to_list()).explain())
+    0      skip(n=2)
+    1      select_inds(inds=0)
+    2      to_list()
+    >>> prev = optimization(False)
+    >>> optimization(prev)
+    False
+    """
+    global _optimization
+    prev = _optimization
+    if enable is not None:
+        _optimization = bool(enable)
+    return prev
+
+
+__all__ += ['assume_pure']
+def assume_pure(enable = None):
+    """
+    Gets and optionally sets whether plan rewrites (see optimization) may assume the 
+        functions passed to filt (and the keys passed to sort_) are pure: they have no side
+        effects, and keep no state. If so, skip and slice_ stages are moved before filt 
+        stages with only a trans function, and identical filt and sort_ stages leading all
+        branches of fans are shared; otherwise (the default), these functions are called
+        on exactly the elements they would be called on without rewrites.
+
+    Keyword Arguments:
+        enable -- If not None, whether to assume these functions are pure (default None).
+
+    Returns:
+        Whether these functions were assumed to be pure before the call.
+
+    See Also:
+        :func:`dagpype.optimization`
+
+    Example:
+
+    >>> prev = assume_pure(True)
+    >>> print((filt(lambda x : x * x) | skip(2) | to_list()).explain())
+    0      skip(n=2)
+    1      filt(trans=<lambda>)
+    2      to_list()
+    >>> assume_pure(prev)
+    True
+    """
+    global _assume_pure
+    prev = _assume_pure
+    if enable is not None:
+        _assume_pure = bool(enable)
+    return prev
+
+
+# Kinds of filter stages calling functions passed to them (see assume_pure).
+_user_fn_kinds = ('filt', 'sort_')
+
+
+def _node_of(what):
+    if isinstance(what, tuple):
+        return None
+    return getattr(what, '_dagpype_node', None)
+
+
+def _drop_relays(fns):
+    kept = [_like_fan(what, [_drop_relays(fn) for fn in what]) if isinstance(what, tuple) else what \
+        for what in fns if (_node_of(what) or (None, None))[1] != 'relay']
+    return kept if len(kept) > 0 else fns[: 1]
+
+
+def _one_to_one(what):
+    """
+    Returns whether a stage sends on exactly one element per element, independently of
+        the other elements, and may be called on fewer elements (see assume_pure).
+    """
+    node = _node_of(what)
+    if node is None:
+        return False
+    _, kind, params = node
+    return kind in ('select_inds', 'cast') or \
+        (_assume_pure and kind == 'filt' and params['pre'] is None and params['post'] is None)
+
+
+def _skip_early(fns):
+    fns = [_like_fan(what, [_skip_early(fn) for fn in what]) if isinstance(what, tuple) else what \
+        for what in fns]
+    for i in range(1, len(fns)):
+        j = i
+        while j > 0 and (_node_of(fns[j]) or (None, None))[1] in ('skip', 'slice_') and _one_to_one(fns[j - 1]):
+            fns[j - 1], fns[j] = fns[j], fns[j - 1]
+            j -= 1
+    return fns
+
+
+def _push_projections(fns):
+    fns = [_like_fan(what, [_push_projections(fn) for fn in what]) if isinstance(what, tuple) else what \
+        for what in fns]
+    pushed = []
+    for what in fns:
+        node = _node_of(what)
+        if node is not None and node[1] in ('select_inds', 'cast', 'filt'):
+            # Counting stages may be skipped by projections, as these send an element per element.
+            j = len(pushed) - 1
+            while node[1] != 'filt' and j >= 0 and (_node_of(pushed[j]) or (None, None))[1] in ('skip', 'slice_'):
+                j -= 1
+            project = getattr(pushed[j], '_dagpype_project', None) if j >= 0 else None
+            fn = project(node[1], node[2]) if project is not None else None
+            if fn is not None:
+                pushed[j] = fn
+                continue
+        pushed.append(what)
+    return pushed
+
+
+def _same_filters(fns):
+    nodes = [_node_of(fn) for fn in fns]
+    if nodes[0] is None or nodes[0][0] != 'filter':
+        return False
+    if nodes[0][1] in _user_fn_kinds and not _assume_pure:
+        return False
+    try:
+        return all(n == nodes[0] for n in nodes[1: ])
+    except (TypeError, ValueError):
+        return False
+
+
+def _share_prefixes(fns):
+    shared = []
+    for what in fns:
+        if not isinstance(what, tuple):
+            shared.append(what)
+            continue
+        branches = [_share_prefixes(fn) for fn in what]
+        n = 0
+        while all(len(b) > n + 1 for b in branches) and _same_filters([b[n] for b in branches]):
+            n += 1
+        shared.extend(branches[0][: n])
+        shared.append(_like_fan(what, [b[n: ] for b in branches]))
+    return shared
+
+
+# Rewrite passes applied to plans (see optimization), in order.
+_rewrites = [_drop_relays, _push_projections, _share_prefixes, _skip_early]
+
+
+def _may_rewrite(fns):
+    """
+    Returns whether any rewrite pass might change a plan, i.e., whether it contains a fan,
+        a stage absorbing following stages, or a relay, skip, or slice_ stage.
+    """
+    for what in fns:
+        if isinstance(what, tuple):
+            return True
+        # Checked on every run, and getattr is slow for the (many) stages lacking these.
+        attrs = what.__dict__
+        if attrs.get('_dagpype_project') is not None:
+            return True
+        node = attrs.get('_dagpype_node')
+        if node is not None and node[1] in ('relay', 'skip', 'slice_'):
+            return True
+    return False
+
+
+def _rewrite(fns):
+    # Most small plans have nothing to rewrite, and are not copied by each pass.
+    if not _may_rewrite(fns):
+        return fns
+    for r in _rewrites:
+        fns = r(fns)
+    return fns
+
+
+def _plan(fns, fuse = True):
+    """
+    Returns the stage functions run for a list of stage functions: rewritten (see 
+        optimization), then fused (see fusion) if fuse.
+    """
+    if _optimization:
+        fns = _rewrite(fns)
+    return _fuse(fns) if _fusion and fuse else fns
+
+
+def _plan_run(fns):
+    """
+    Returns the stage functions run for a full plan (from a source to a sink). A flat plan 
+        of fewer than 4 stages (e.g., a source, a filter, and a sink) has no two filters to
+        fuse, and nothing worth rewriting unless its source absorbs the following stage, so
+        it is run as it is. A plan whose source sends on fewer elements than a batch is not
+        fused, as fusing would cost more than it saves.
+    """
+    if len(fns) < 4 and getattr(fns[0], '_dagpype_project', None) is None and \
+            not any(isinstance(what, tuple) for what in fns):
+        return fns
+    return _plan(fns, fuse = not _within_batch(fns[0]))
+
+
+def _explain_lines(fns, pos):
+    """
+    Returns (position, depth, description) triplets of the stages of a list of stage functions.
+    """
+    lines = []
+    for i, what in enumerate(fns):
+        p, depth = '.'.join(str(q) for q in pos + (i, )), len(pos) // 2
+        if isinstance(what, tuple):
+            lines.append((p, depth, 'fan'))
+            for j, fn in enumerate(what):
+                lines.extend(_explain_lines(fn, pos + (i, j)))
+            continue
+        if getattr(what, '_dagpype_reduce', None) is not None:
+            continue
+        node = _node_of(what)
+        params = [] if node is None else \
+            ['%s=%s' % (k, _explain_param(v)) for k, v in sorted(node[2].items()) if v is not None]
+        lines.append((p, depth, '%s(%s)' % (_stage_name(what), ', '.join(params))))
+    return lines
+
+
+def _explain(fns):
+    lines = _explain_lines(fns, ())
+    width = max([len(p) for p, _, _ in lines] + [5]) + 2
+    return '\n'.join(p.ljust(width) + '  ' * depth + d for p, depth, d in lines)
+
+
+def _explain_param(v):
+    if isinstance(v, (types.FunctionType, types.BuiltinFunctionType, type)):
+        return v.__name__
+    r = repr(v)
+    return r if len(r) <= 40 else r[: 37] + '...'
+
+
+__all__ += ['threaded_fans']
+def threaded_fans(enable = None):
+    """
+    Gets and optionally sets whether the branches of fans (e.g., mean() + min_() + max_())
+        run each on its own thread, fed through a bounded queue. This pays off when the
+        branches spend most of their time in code releasing the GIL, e.g., NumPy 
+        reductions over chunks. Fans of sources are unaffected.
+
+    Keyword Arguments:
+        enable -- If not None, whether to run fan branches on threads (default None).
+
+    Returns:
+        Whether fan branches ran on threads before the call.
+
+    Example:
+
+    >>> prev = threaded_fans(True)
+    >>> source([1, 2, 3, 4]) | np.chunk() | np.mean() + np.min_() + np.max_()
+    (2.5, 1.0, 4.0)
+    >>> threaded_fans(prev)
+    True
+    """
+    global _threaded_fans
+    prev = _threaded_fans
+    if enable is not None:
+        _threaded_fans = bool(enable)
+    return prev
+
+
+__all__ += ['prefetch']
+def prefetch(n):
+    """
+    Runs everything upstream of this stage, up to and including the source, on a producer
+        thread, handing items to the downstream stages through a bounded buffer. Reading 
+        and parsing then overlap with downstream work. Exceptions upstream are raised 
+        downstream, and if the downstream stages stop early (e.g., nth(0)), the producer 
+        is stopped. In pipes not starting with a source, this stage just relays elements.
+
+    Arguments:
+        n -- Maximal number of buffered items (elements, or batches of elements where
+            batch transport is in effect).
+
+    See Also:
+        :func:`dagpype.threaded_fans`
+
+    Example:
+
+    >>> stream_vals('meteo.csv', b'wind') | prefetch(16) | filt(lambda x : 2 * x) | sum_()
+    864.0
+    """
+    if n < 1:
+        raise InvalidParamError('n', n, 'Must be positive')
+
+    def _dagpype_internal_fn_act(target):
+        try:
+            while True:
+                target.send((yield))
+        except GeneratorExit:
+            target.close()
+
+    _dagpype_internal_fn_act._dagpype_prefetch = n
+    return _MidPiped([_dagpype_internal_fn_act])
+
+
+def _prefetch_items(fns, n, batch):
+    """
+    Generates the items sent on by a source chain running on a producer thread.
+    """
+    q, stop, end, errors = _queue.Queue(n), threading.Event(), object(), []
+
+    def put():
+        while not stop.is_set():
+            q.put((yield))
+
+    def produce():
+        try:
+            g = put()
+            next(g)
+            src = _Chainer(fns, g, batch, True, batch).gen
+            while not stop.is_set():
+                src.send(True)
+        except StopIteration:
+            pass
+        except Exception as err:
+            errors.append(err)
+        finally:
+            q.put(end)
+
+    producer = threading.Thread(target = produce)
+    producer.daemon = True
+    producer.start()
+    ended = False
+    try:
+        while True:
+            e = q.get()
+            if e is end:
+                ended = True
+                break
+            yield e
+    finally:
+        stop.set()
+        while not ended:
+            ended = q.get() is end
+        producer.join()
+    if len(errors) > 0:
+        raise errors[0]
+
+
+def _prefetch_source(fns, n, batch):
+    """
+    Returns a source stage function (with a batch twin if batch) sending on the items of 
+        a source chain running on a producer thread.
+    """
+    def act(target):
+        items = _prefetch_items(fns, n, batch)
+        try:
+            for item in items:
+                for e in item if batch else (item,):
+                    (yield)
+                    target.send(e)
+        except GeneratorExit:
+            pass
+        finally:
+            items.close()
+        target.close()
+
+    def batch_act(target):
+        items = _prefetch_items(fns, n, batch)
+        try:
+            for l in items:
+                (yield)
+                target.send(l)
+        except GeneratorExit:
+            pass
+        finally:
+            items.close()
+        target.close()
+
+    if batch:
+        act._dagpype_batch_twin = batch_act
+        batch_act._dagpype_batch = _batch_source
+    return act
+
+
+def _split_prefetch(fns, batch):
+    """
+    Returns a copy of a list of stage functions starting with a source, where the stages 
+        up to the first prefetch stage are replaced by a source running them on a thread.
+    """
+    for i, what in enumerate(fns):
+        n = getattr(what, '_dagpype_prefetch', None)
+        if n is not None and i > 0:
+            return _split_prefetch([_prefetch_source(fns[: i], n, batch)] + fns[i + 1: ], batch)
+    return fns
+
+
+def _batch_modes(fn):
+    """
+    Returns whether a stage function receives batches, and whether it sends batches.
+    """
+    kind = getattr(fn, '_dagpype_batch', None)
+    if kind is None:
+        return False, False
+    return kind != _batch_source, kind != _batch_sink
+
+
+def _within_batch(what):
+    """
+    Returns whether a source stage sends on fewer elements than a batch (e.g., source of a 
+        short list), so that batching its pipe would cost more than it saves.
+    """
+    node = _node_of(what)
+    if node is None or node[1] != 'source':
+        return False
+    try:
+        return len(node[2]['iterable']) < _batch_size
+    except TypeError:
+        return False
+
+
+def _flat_chain(fns, batch):
+    """
+    Returns the stage functions (with relays adapting between per-element and batch stages)
+        connecting a flat list of stage functions, ordered from the last to the first, and
+        whether the first receives batches. Running the list again needs only 
+        _connect_flat of these, and none of the twin and adapter resolution.
+    """
+    chain, down_batch = [], False
+    for what in reversed(fns):
+        twin = getattr(what, '_dagpype_batch_twin', None) if batch else None
+        if twin is not None and _batch_modes(twin)[1] == down_batch:
+            what = twin
+        in_batch, out_batch = _batch_modes(what)
+        if out_batch and not down_batch:
+            chain.append(_unbatch_relay())
+        elif down_batch and not out_batch:
+            chain.append(_batch_relay(_batch_size if _batch_size > 0 else 1))
+        chain.append(what)
+        down_batch = in_batch
+    return chain, down_batch
+
+
+def _connect_flat(chain, gen):
+    """
+    Returns the head of the stages of a chain (see _flat_chain) connected to a target.
+    """
+    for fn in chain:
+        gen = fn(gen)
+        if gen is None:
+            return None
+        _Chainer._prime(gen)
+    return gen
+
+
 class _Chainer(object):
-    def __init__(self, fns, gen):
-        self.gen = self._connect_all(fns, gen)
-            
-    def _connect_all(self, fns, gen):
-        for what in reversed(fns):
+    def __init__(self, fns, gen, batch = False, src = False, gen_batch = False, profiler = None, pos = ()):
+        """
+        Arguments:
+            fns -- Stage functions (and fans of stage function lists).
+            gen -- Target receiving the elements of the last stage.
+
+        Keyword Arguments:
+            batch -- Whether stages may use native batch implementations, and the
+                head may receive batches (see self.batch).
+            src -- Whether the first stage is a source (or a fan of sources).
+            gen_batch -- Whether gen receives batches.
+            profiler -- If not None, object whose probe(fn, pos, src) method returns a
+                probe wrapping the stage fn (see dagpype.profile).
+            pos -- Position of fns within the DAG.
+        """
+        self.batch = False
+        self._profiler, self._pos = profiler, pos
+        batch = batch and _batch_size > 0
+        if src:
+            batch = batch and not _within_batch(fns[0])
+            fns = _split_prefetch(fns, batch)
+        self.gen = self._connect_all(fns, gen, batch, src, gen_batch)
+
+    @staticmethod
+    def _prime(gen):
+        try:
+            next(gen)
+        except StopIteration:
+            pass
+        return gen
+
+    def _adapt(self, gen, batch):
+        relay = _batch_relay(_batch_size if _batch_size > 0 else 1) if batch else _unbatch_relay()
+        return self._prime(relay(gen))
+
+    def _connect_all(self, fns, gen, batch, src, down_batch):
+        for i in range(len(fns) - 1, -1, -1):
+            what = fns[i]
             assert isinstance(gen, types.GeneratorType)
             if isinstance(what, types.FunctionType):
+                twin = getattr(what, '_dagpype_batch_twin', None) if batch else None
+                if twin is not None and _batch_modes(twin)[1] == down_batch:
+                    what = twin
+                # Most stages are per-element, and need no look at their modes.
+                in_batch = out_batch = False
+                if getattr(what, '_dagpype_batch', None) is not None:
+                    in_batch, out_batch = _batch_modes(what)
+                if out_batch and not down_batch:
+                    gen = self._adapt(gen, False)
+                elif down_batch and not out_batch:
+                    gen = self._adapt(gen, True)
+                probe = None if self._profiler is None else \
+                    self._profiler.probe(what, self._pos + (i, ), src and i == 0)
+                if probe is not None:
+                    gen = self._prime(probe.out(gen, out_batch))
                 gen = what(gen)
                 if gen is None:
                     break
-                try:
-                    next(gen)
-                except StopIteration:
-                    pass
+                self._prime(gen)
+                if probe is not None:
+                    gen = self._prime(probe.in_(gen, in_batch))
+                down_batch = in_batch
                 continue
             assert isinstance(what, tuple)
-            gens = self._connect_join(gen, len(what))
-            gens = [_Chainer(fn, gen).gen for fn, gen in zip(what, gens)]
-            gen = self._connect_split(gens)
+            if down_batch:
+                gen = self._adapt(gen, True)
+            threaded = _threaded_fans and not (src and i == 0)
+            gens = self._connect_join(gen, what, threading.Lock() if threaded else None)
+            chainers = [_Chainer(fn, gen, batch, src and i == 0, profiler = self._profiler, pos = self._pos + (i, j)) \
+                for j, (fn, gen) in enumerate(zip(what, gens))]
+            down_batch = all(c.batch for c in chainers)
+            gens = [c.gen if c.batch == down_batch or c.gen is None else self._adapt(c.gen, True) \
+                for c in chainers]
+            gen = self._connect_threaded_split(gens) if threaded else self._connect_split(gens)
             if gen is None:
                 break
+        if down_batch and not src and not batch and gen is not None:
+            gen = self._adapt(gen, True)
+            down_batch = False
+        self.batch = down_batch and not src
         return gen
 
-    def _connect_join(self, g, size):    
-        def join(target):
-            payloads = [collections.deque() for i in range(size)]
-            closed = [False] * size
+    def _connect_join(self, g, fan, lock = None):
+        """
+        Returns the relays feeding a join of the branches of fan. Each relay appends directly
+            to its branch's buffer, and readiness is tracked by counting the non-empty
+            buffers, so an element costs no tuple tagging or scanning. If lock is not None,
+            the relays hold it, as the branches run on different threads.
+        """
+        size = len(fan)
+        policy, max_buffer, overflow = getattr(fan, 'alignment', ('zip', None, 'raise'))
+        buffers = [collections.deque() for i in range(size)]
+        latest = [_missing] * size
+        closed = [False] * size
+        # Number of non-empty buffers (for 'latest', of branches with a value), number of
+        #   closed branches, whether the join is finished, and number of buffered elements.
+        counts = [0, 0, False, 0]
+
+        def zip_arrive(i, e):
+            if counts[2]:
+                return False
+            b = buffers[i]
+            if len(b) > 0:
+                if max_buffer is not None and len(b) >= max_buffer:
+                    if overflow == 'raise':
+                        raise JoinOverflowError(i, max_buffer)
+                    b.popleft()
+                    counts[3] -= 1
+                b.append(e)
+                counts[3] += 1
+                return True
+            b.append(e)
+            counts[0] += 1
+            counts[3] += 1
+            if counts[0] < size:
+                return True
+            ps = tuple([b.popleft() for b in buffers])
+            counts[3] -= size
+            if counts[3] == 0:
+                # Each buffer held one element (the usual case), so all are now empty.
+                counts[0] = 0
+                dry = counts[1] > 0
+            else:
+                dry = False
+                for j, b in enumerate(buffers):
+                    if len(b) == 0:
+                        counts[0] -= 1
+                        # A closed branch whose buffer empties has nothing more to join.
+                        dry = dry or closed[j]
+            g.send(ps)
+            if dry and not counts[2]:
+                finish()
+            return not counts[2]
+
+        def latest_arrive(i, e):
+            if counts[2]:
+                return False
+            if latest[i] is _missing:
+                counts[0] += 1
+            latest[i] = e
+            if counts[0] == size:
+                g.send(tuple(latest))
+            return True
+
+        def finish():
+            # Nothing more will be joined, so the target is closed, and the branches
+            #   are stopped (by their relays ending).
+            counts[2] = True
+            for b in buffers:
+                b.clear()
+            g.close()
+
+        def leave(i):
+            closed[i] = True
+            counts[1] += 1
+            if not counts[2] and (counts[1] == size or (policy == 'zip' and len(buffers[i]) == 0)):
+                finish()
+
+        arrive = latest_arrive if policy == 'latest' else zip_arrive
+
+        def relay(i):
+            try:
+                while arrive(i, (yield)):
+                    pass
+            except GeneratorExit:
+                leave(i)
+
+        def locked_relay(i):
             try:
                 while True:
                     e = (yield)
-                    i, active = e[0], e[1]
-                    if not active:
-                        closed[i] = True
-                        if True not in closed:
-                            target.close()
+                    with lock:
+                        if not arrive(i, e):
                             return
-                        continue
-                    payload_data = e[2]     
-                    payloads[i].append(payload_data)
-                    if not all(len(payloads[j]) > 0 for j in range(size)):    
-                        continue
-                    ps = tuple(p.popleft() for p in payloads)
-                    target.send(ps)
             except GeneratorExit:
-                target.close()
+                with lock:
+                    leave(i)
 
-        g = join(g)
-        next(g)
-        
-        def numbered_relay(i):
-            def act(target):
-                try:
-                    while True:
-                        e = (yield)
-                        target.send((i, True, e))
-                except GeneratorExit:
-                    target.send((i, False,))
-            return act
-
-        relays = [numbered_relay(i) for i in range(size)]
-        gens = [r(g) for r in relays]
-        for g in gens:
-            next(g)
-            
-        return gens    
+        gens = [(relay if lock is None else locked_relay)(i) for i in range(size)]
+        for r in gens:
+            next(r)
+
+        return gens
 
     def _connect_split(self, gens):
         assert len(gens) > 0
@@ -277,7 +1335,8 @@ class _Chainer(object):
                                 raise
             except GeneratorExit:
                 for t in targets:
-                    t.close()
+                    if t is not None:
+                        t.close()
 
         g = split(gens)
         assert g is not None
@@ -285,6 +1344,67 @@ class _Chainer(object):
         
         return g
 
+    def _connect_threaded_split(self, gens):
+        assert len(gens) > 0
+        if gens[0] is None:
+            assert all(g is None for g in gens)
+            return None
+        assert None not in gens
+
+        end = object()
+        queues = [_queue.Queue(_fan_queue_size) for g in gens]
+        done, errors = [False] * len(gens), []
+
+        def work(i, target, q):
+            failed = False
+            e = q.get()
+            while e is not end:
+                if not done[i]:
+                    try:
+                        target.send(e)
+                    except StopIteration:
+                        done[i] = True
+                    except Exception as err:
+                        errors.append(err)
+                        done[i] = failed = True
+                e = q.get()
+            # A failed branch is not closed, so that it does not send on a partial result.
+            if failed:
+                return
+            try:
+                target.close()
+            except Exception as err:
+                errors.append(err)
+
+        def split(targets):
+            assert len(targets) > 1
+            threads = [threading.Thread(target = work, args = (i, t, q)) \
+                for i, (t, q) in enumerate(zip(targets, queues))]
+            for t in threads:
+                t.daemon = True
+                t.start()
+            try:
+                while True:
+                    e = (yield)
+                    for q in queues:
+                        q.put(e)
+                    if len(errors) > 0 or all(done):
+                        break
+            except GeneratorExit:
+                pass
+            finally:
+                for q in queues:
+                    q.put(end)
+                for t in threads:
+                    t.join()
+            if len(errors) > 0:
+                raise errors[0]
+
+        g = split(gens)
+        next(g)
+
+        return g
+
 
 class _FinalActor(object):
     def __init__(self):
@@ -311,6 +1431,8 @@ class _FinalActor(object):
                     self.gen.close()
                     if len(self._l) == 0:
                         raise NoResultError()
+            # The result is in, so the source is cancelled (e.g., closing its file).
+            gen.close()
 
     def res(self):
         with warnings.catch_warnings() as w:
@@ -319,6 +1441,16 @@ class _FinalActor(object):
             return self._l[0]
 
 
+def _run_fns(fns):
+    """
+    Runs a list of stage functions, starting with a source and ending with a sink,
+        and returns the result.
+    """
+    f = _FinalActor()
+    f.pump(_Chainer(fns, f.gen, batch = True, src = True).gen)
+    return f.res()
+
+
 class _SnkPiped(_SimplePiped):        
     def __init__(self, fns):
         _SimplePiped.__init__(self, fns)
@@ -327,10 +1459,7 @@ class _SnkPiped(_SimplePiped):
         return other.connect_snk(self)
 
     def connect_src(self, prev):
-        f = _FinalActor()
-        gen = _Chainer(prev._fns + self._fns, f.gen).gen
-        f.pump(gen)
-        return f.res()
+        return _run_fns(_plan_run(prev._fns + self._fns))
         
     def connect_mid(self, prev):
         return _SnkPiped(prev._fns + self._fns)
@@ -356,7 +1485,10 @@ class _FrozenSnkPiped(_Piped):
         self._fns = fns
        
     def connect_src(self, prev):
-        gen = _Chainer(prev._fns + self._fns + [_no_close_relay()], self._connect_gen).gen
+        self.pump(_plan_run(prev._fns + self._fns) + [_no_close_relay()])
+
+    def pump(self, fns):
+        gen = _Chainer(fns, self._connect_gen, batch = True, src = True).gen
         try:    
             while True:
                 gen.send(True)
@@ -403,6 +1535,39 @@ def sinks(fn):
     return _SnkPiped([fn])
 
 
+__all__ += ['batch_sinks']
+def batch_sinks(fn):
+    """
+    Decorator signifying a (generator) function is a batch sink function. A batch sink
+        receives lists of elements, and sends on its result as a single element.
+        The received lists should not be modified.
+
+    Arguments:
+        fn -- Decorated function.
+
+    See Also:
+        :func:`dagpype.batch_filters`
+        :func:`dagpype.batch_size`
+
+    Example:
+
+    >>> # Function returning the number of elements (there are simpler ways of doing this):
+    >>> def num_elems():
+    ...     @batch_sinks
+    ...     def _act(target):
+    ...         n = 0
+    ...         try:
+    ...             while True:
+    ...                 n += len((yield))
+    ...         except GeneratorExit:
+    ...             target.send(n)
+    ...             target.close()
+    ...     return _act
+    """
+    fn._dagpype_batch = _batch_sink
+    return _SnkPiped([fn])
+
+
 class _FannedPiped(_Piped):
     def __init__(self, fan):
         self._fan = fan
@@ -424,6 +1589,10 @@ class _SrcFannedPiped(_FannedPiped):
 
     def __add__(self, other):
         return _SrcFannedPiped(self.fanned() + other.fanned())
+
+    def run_async(self, target):
+        return _SrcPiped([self._fan]).run_async(target)
+    run_async.__doc__ = _SrcPiped.run_async.__doc__
         
 
 class _MidFannedPiped(_FannedPiped):
@@ -466,6 +1635,52 @@ class _SnkFannedPiped(_FannedPiped):
         return _SnkPiped(prev._fns + [self._fan])
 
 
+__all__ += ['align']
+def align(fan, policy = 'zip', max_buffer = None, overflow = 'raise'):
+    """
+    Sets how the results of the branches of a fan are aligned into tuples. By default, 
+        results are zipped: the i-th tuple holds the i-th result of each branch, so a 
+        branch which is ahead of the others (e.g., relay() in skip(5) + relay(), or in 
+        filt(pre = f) + relay() for a selective f) has its results buffered until the 
+        others catch up.
+
+    Arguments:
+        fan -- Fan of pipes (e.g., skip(5) + relay()). Its alignment is not kept if it is
+            further combined with + into a larger fan, so align the complete fan.
+
+    Keyword Arguments:
+        policy -- Either 'zip', for tuples of the results of corresponding order, or 
+            'latest', for a tuple of the latest result of each branch whenever any branch
+            sends a result (once all branches have sent one) (default 'zip').
+        max_buffer -- If not None, maximal number of results buffered per branch by
+            'zip', so that memory stays bounded on long streams (default None).
+        overflow -- What to do when a branch exceeds max_buffer: 'raise' a 
+            JoinOverflowError, or 'drop' its oldest buffered result (default 'raise').
+
+    See Also:
+        :func:`dagpype.JoinOverflowError`
+
+    Example:
+
+    >>> source(range(8)) | align(skip(5) + relay(), max_buffer = 2, overflow = 'drop') | to_list()
+    [(5, 3), (6, 4), (7, 5)]
+    >>> source([1, 2, 3]) | align(filt(pre = lambda x : x % 2 == 1) + relay(), 'latest') | to_list()
+    [(1, 1), (1, 2), (3, 2), (3, 3)]
+    """
+    if not isinstance(fan, _FannedPiped):
+        raise InvalidParamError('fan', fan, 'Must be a fan of pipes')
+    if policy not in ('zip', 'latest'):
+        raise InvalidParamError('policy', policy, "Must be 'zip' or 'latest'")
+    if max_buffer is not None:
+        if policy != 'zip':
+            raise InvalidParamError('max_buffer', max_buffer, "Only applies to 'zip'")
+        if max_buffer < 1:
+            raise InvalidParamError('max_buffer', max_buffer, 'Must be positive')
+    if overflow not in ('raise', 'drop'):
+        raise InvalidParamError('overflow', overflow, "Must be 'raise' or 'drop'")
+    return type(fan)(_Fan(fan.fanned(), (policy, max_buffer, overflow)))
+
+
 def _no_close_relay():
     def _dagpype_internal_fn_act(target):
         try:
@@ -505,8 +1720,9 @@ def sub_pipe_target(pipe, target):
     """
     g = _no_close_relay()(target)
     next(g)
-    g = _Chainer(pipe.simple(), g).gen
-    if not isinstance(pipe, _SrcPiped):
+    is_src = isinstance(pipe, _SrcPiped)
+    g = _Chainer(pipe.simple(), g, batch = is_src, src = is_src).gen
+    if not is_src:
         return g
     try:
         while True:
@@ -550,5 +1766,170 @@ __all__ += ['thaw']
 def thaw(target):
     return target.thaw()
 thaw.__doc__ = freeze.__doc__
-       
 
+
+def _partial_fns(target, fns):
+    last = fns[-1]
+    if isinstance(last, tuple):
+        return fns[: -1] + [_like_fan(last, [_partial_fns(target, fn) for fn in last])]
+    if getattr(last, '_dagpype_reduce', None) is None:
+        raise InvalidParamError('target', target, 'Not mergeable')
+    return fns[: -1]
+
+
+def _merge_fns(fns, states, final = True):
+    last = fns[-1]
+    if isinstance(last, tuple):
+        return tuple(_merge_fns(fn, [s[i] for s in states], final) for i, fn in enumerate(last))
+    merge, finalize = last._dagpype_reduce
+    state = functools.reduce(merge, states)
+    return finalize(state) if final else state
+
+
+__all__ += ['partial_state']
+def partial_state(target):
+    """
+    partial_state and merge_states are used together to reduce separate parts of a sequence
+        (e.g., in different processes), and combine the results. partial_state transforms a 
+        mergeable target (e.g., sum_, count, mean, stddev, corr, min_, max_, and fans of these)
+        into one whose result is a partial state; merge_states merges such states into 
+        the result of the original target.
+
+    Arguments:
+        target -- Mergeable target.
+        states -- (merge_states only) Sequence of partial states, as returned by pipes 
+            ending with partial_state(target).
+
+    See Also:
+        :func:`dagpype.parallel_reduce`
+
+    Example:
+
+    >>> target = count() + stddev(0)
+    >>> states = [source(l) | partial_state(target) for l in [[2, 4, 4, 4], [5, 5, 7, 9], []]]
+    >>> merge_states(target, states)
+    (8, 2.0)
+    """
+    return _SnkPiped(_partial_fns(target, target.simple()))
+
+
+__all__ += ['merge_states']
+def merge_states(target, states):
+    states = list(states)
+    if len(states) == 0:
+        raise NoResultError()
+    fns = target.simple()
+    _partial_fns(target, fns)
+    return _merge_fns(fns, states)
+merge_states.__doc__ = partial_state.__doc__
+
+
+class _Runner(object):
+    def __init__(self, target, src):
+        self._target, self._src = target, src
+        frozen = isinstance(target, _FrozenSnkPiped)
+        fns = target._fns if frozen else target.simple()
+        self._fns = _plan(list(fns)) + ([_no_close_relay()] if frozen else [])
+        # The stages of a flat target connect the same way on each run, so this is resolved
+        #   once per batch mode (see _flat_chain); fans and prefetches are connected per run.
+        flat = not frozen and all(isinstance(what, types.FunctionType) and \
+            getattr(what, '_dagpype_prefetch', None) is None for what in self._fns)
+        self._chains = {} if flat else None
+
+    def _connect(self, batch):
+        key = _batch_size if batch and _batch_size > 0 else 0
+        if key not in self._chains:
+            self._chains[key] = _flat_chain(self._fns, key > 0)
+        chain, head_batch = self._chains[key]
+        f = _FinalActor()
+        return f, _connect_flat(chain, f.gen), head_batch
+
+    def _feed(self, what):
+        """
+        Runs the input of src = source by sending its elements directly to the target.
+        """
+        try:
+            batch = len(what) >= _batch_size
+        except TypeError:
+            batch = True
+        f, gen, head_batch = self._connect(batch)
+        it = iter(what)
+        try:
+            if head_batch:
+                size = _batch_size if _batch_size > 0 else 1
+                while True:
+                    l = list(itertools.islice(it, size))
+                    if len(l) == 0:
+                        break
+                    gen.send(l)
+            else:
+                for e in it:
+                    gen.send(e)
+        except StopIteration:
+            f.gen.close()
+        else:
+            gen.close()
+        return f.res()
+
+    def __call__(self, what):
+        if self._chains is not None and self._src is source:
+            return self._feed(what)
+        pipe = self._src(what)
+        if not isinstance(pipe, (_SrcPiped, _SrcFannedPiped)):
+            raise InvalidParamError('src', self._src, 'Must return a source pipe')
+        src_fns = pipe.simple()
+        # A single-stage source (e.g., source) has nothing to rewrite or fuse.
+        if len(src_fns) > 1 or isinstance(src_fns[0], tuple):
+            src_fns = _plan(src_fns)
+        if self._chains is not None:
+            f, gen, head_batch = self._connect(True)
+            f.pump(_Chainer(src_fns, gen, batch = True, src = True, gen_batch = head_batch).gen)
+            return f.res()
+        fns = src_fns + self._fns
+        if isinstance(self._target, _FrozenSnkPiped):
+            self._target.pump(fns)
+            return
+        return _run_fns(fns)
+
+    def thaw(self):
+        return self._target.thaw()
+
+
+__all__ += ['compile_']
+def compile_(target, src = source):
+    """
+    Plans a target once (validating it, fusing its stages, and resolving how they 
+        connect, e.g., which use batches), and returns a runner: a function taking an 
+        input, and returning the result of src(input) | target. Each run only creates the
+        target's stages, and for src = source, sends the input to them directly, which 
+        saves most of the cost of src(input) | target over many small inputs. Stages of
+        the source pipe are not fused with those of the target.
+
+    Arguments:
+        target -- Target (e.g., to_list(), or mean() + stddev()), or frozen target (see
+            freeze); in the latter case, each run is accumulated into the target, and the
+            result is obtained by thaw(runner).
+
+    Keyword Arguments:
+        src -- Function taking an input and returning a source pipe (default source).
+
+    See Also:
+        :func:`dagpype.freeze`
+        :func:`dagpype.fusion`
+
+    Example:
+
+    >>> double_sum = compile_(filt(lambda x : 2 * x) | sum_())
+    >>> [double_sum(l) for l in [[1, 2], [3], [4, 5, 6]]]
+    [6, 6, 30]
+    >>> 
+    >>> # Counts the lines of several files.
+    >>> num_lines = compile_(freeze(count()), stream_lines)
+    >>> for f_name in ['data1.csv', 'data2.csv']:
+    ...     num_lines(f_name)
+    >>> thaw(num_lines)
+    8
+    """
+    if not isinstance(target, (_SnkPiped, _SnkFannedPiped, _FrozenSnkPiped)):
+        raise InvalidParamError('target', target, 'Must be a target')
+    return _Runner(target, src)
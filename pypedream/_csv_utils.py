@@ -1,12 +1,19 @@
 import itertools
+import mmap
+import numbers
 import numpy
+import operator
+import random
+import re
 import sys
 if sys.version_info >= (3, 0):
     _zip = zip
     _zip_longest = itertools.zip_longest
+    _viewable = lambda buf, end : memoryview(buf)[: end]
 else:
     _zip = itertools.izip
     _zip_longest = itertools.izip_longest
+    _viewable = lambda buf, end : buffer(buf, 0, end)
 
 try:
     from ._core import Error, InvalidParamError
@@ -70,6 +77,252 @@ def _process_inds(inds):
     return uniques, copies, max(inds) if len(inds) > 0 else -1
 
 
+def _pick(seq, inds):
+    return seq[inds] if isinstance(inds, int) else tuple(seq[i] for i in inds)
+
+
+def project(cols, types_, kind, params):
+    """
+    Returns the (cols, types_) of a reader reading what a reader of (cols, types_) followed 
+        by a select_inds or cast stage (of kind, with params) would, or None if there is none.
+    """
+    if kind == 'select_inds':
+        inds = params['inds']
+        inds_ = (inds, ) if isinstance(inds, int) else inds
+        if len(inds_) == 0 or min(inds_) < 0:
+            return None
+        if cols is None:
+            if types_ is None:
+                return inds, None
+            if not isinstance(types_, tuple) or max(inds_) >= len(types_):
+                return None
+            return inds, _pick(types_, inds)
+        if not isinstance(cols, tuple) or max(inds_) >= len(cols):
+            return None
+        if types_ is not None and not isinstance(types_, tuple):
+            return None
+        return _pick(cols, inds), None if types_ is None else _pick(types_, inds)
+
+    if kind != 'cast':
+        return None
+    # Values are read as floats by default, so only casts to floats leave them unchanged.
+    t = params['types_']
+    if types_ is not None:
+        return None
+    if t == float:
+        return (cols, t) if isinstance(cols, (int, bytes)) else None
+    if not isinstance(t, tuple) or len(t) == 0 or any(tt != float for tt in t):
+        return None
+    if cols is None or (isinstance(cols, tuple) and len(cols) == len(t)):
+        return cols, t
+    return None
+
+
+# Operations of row predicates (must match row_pred.hpp).
+_lt, _le, _gt, _ge, _eq, _ne, _bytes_eq, _bytes_ne, _and, _or, _not = range(11)
+
+_op_fns = {
+    _lt: operator.lt, _le: operator.le, _gt: operator.gt, _ge: operator.ge,
+    _eq: operator.eq, _ne: operator.ne, _bytes_eq: operator.eq, _bytes_ne: operator.ne}
+_op_strs = {
+    _lt: '<', _le: '<=', _gt: '>', _ge: '>=', _eq: '==', _ne: '!=', _bytes_eq: '==', _bytes_ne: '!='}
+
+
+class _Pred(object):
+    """
+    Declarative predicate on the fields of rows (see field), which the CSV readers evaluate
+        on the unconverted fields. Comparisons of empty fields are false.
+    """
+
+    def __and__(self, other):
+        return _Junction(_and, self, other)
+
+    def __or__(self, other):
+        return _Junction(_or, self, other)
+
+    def __invert__(self):
+        return _Not(self)
+
+
+class _Cmp(_Pred):
+    def __init__(self, op, ind, val):
+        self.op, self.ind, self.val = op, ind, val
+
+    def __call__(self, t):
+        e = t[self.ind] if isinstance(t, tuple) else t
+        return e is not None and _op_fns[self.op](e, self.val)
+
+    def __repr__(self):
+        return 'field(%d) %s %r' % (self.ind, _op_strs[self.op], self.val)
+
+    def _program(self):
+        if self.op in (_bytes_eq, _bytes_ne):
+            return [(self.op, self.ind, 0., self.val)]
+        return [(self.op, self.ind, float(self.val), b'')]
+
+    def _fields(self):
+        return [(self.ind, self.op in (_bytes_eq, _bytes_ne))]
+
+    def _remap(self, inds):
+        return _Cmp(self.op, inds.index(self.ind), self.val) if self.ind in inds else None
+
+
+class _Junction(_Pred):
+    def __init__(self, op, lhs, rhs):
+        if not isinstance(lhs, _Pred) or not isinstance(rhs, _Pred):
+            raise InvalidParamError('pred', rhs if isinstance(lhs, _Pred) else lhs, 'Must be a field predicate')
+        self.op, self.lhs, self.rhs = op, lhs, rhs
+
+    def __call__(self, t):
+        return self.lhs(t) and self.rhs(t) if self.op == _and else self.lhs(t) or self.rhs(t)
+
+    def __repr__(self):
+        return '(%r) %s (%r)' % (self.lhs, '&' if self.op == _and else '|', self.rhs)
+
+    def _program(self):
+        return self.lhs._program() + self.rhs._program() + [(self.op, 0, 0., b'')]
+
+    def _fields(self):
+        return self.lhs._fields() + self.rhs._fields()
+
+    def _remap(self, inds):
+        lhs, rhs = self.lhs._remap(inds), self.rhs._remap(inds)
+        return _Junction(self.op, lhs, rhs) if lhs is not None and rhs is not None else None
+
+
+class _Not(_Pred):
+    def __init__(self, pred):
+        self.pred = pred
+
+    def __call__(self, t):
+        return not self.pred(t)
+
+    def __repr__(self):
+        return '~(%r)' % self.pred
+
+    def _program(self):
+        return self.pred._program() + [(_not, 0, 0., b'')]
+
+    def _fields(self):
+        return self.pred._fields()
+
+    def _remap(self, inds):
+        pred = self.pred._remap(inds)
+        return _Not(pred) if pred is not None else None
+
+
+class _Field(object):
+    """
+    Field of rows, whose comparisons make predicates (see field).
+    """
+
+    def __init__(self, ind):
+        self._ind = ind
+
+    def _cmp(self, op, val):
+        if isinstance(val, bytes):
+            if op not in (_eq, _ne):
+                raise InvalidParamError('val', val, 'Bytes can only be compared for (in)equality')
+            return _Cmp(_bytes_eq if op == _eq else _bytes_ne, self._ind, val)
+        if not isinstance(val, numbers.Real):
+            raise InvalidParamError('val', val, 'Must be a number or bytes')
+        return _Cmp(op, self._ind, val)
+
+    def __lt__(self, val):
+        return self._cmp(_lt, val)
+
+    def __le__(self, val):
+        return self._cmp(_le, val)
+
+    def __gt__(self, val):
+        return self._cmp(_gt, val)
+
+    def __ge__(self, val):
+        return self._cmp(_ge, val)
+
+    def __eq__(self, val):
+        return self._cmp(_eq, val)
+
+    def __ne__(self, val):
+        return self._cmp(_ne, val)
+
+    __hash__ = None
+
+    def between(self, low, high):
+        """
+        Returns a predicate of this field being between low and high (inclusive).
+        """
+        return (self >= low) & (self <= high)
+
+    def isin(self, vals):
+        """
+        Returns a predicate of this field being equal to one of vals (numbers or bytes).
+        """
+        vals = list(vals)
+        if len(vals) == 0:
+            raise InvalidParamError('vals', vals, 'Must be nonempty')
+        pred = self == vals[0]
+        for v in vals[1: ]:
+            pred = pred | (self == v)
+        return pred
+
+
+def check_where(cols, types_, where):
+    """
+    Checks that a row predicate refers to fields read by a reader of (cols, types_), and
+        that it compares numeric fields to numbers and bytes fields to bytes.
+    """
+    if where is None:
+        return
+    if not isinstance(where, _Pred):
+        raise InvalidParamError('where', where, 'Must be a field predicate (see field)')
+    if isinstance(cols, (tuple, list)):
+        num = len(cols)
+    elif cols is not None:
+        num = 1
+    elif isinstance(types_, (tuple, list)):
+        num = len(types_)
+    else:
+        num = None if types_ is None else 1
+    for ind, is_bytes in where._fields():
+        if ind < 0 or (num is not None and ind >= num):
+            raise InvalidParamError('where', where, 'Refers to field %d, which is not read' % ind)
+        type_ = float if types_ is None else types_[ind] if isinstance(types_, (tuple, list)) else types_
+        if type_ not in ((bytes, ) if is_bytes else (int, float)):
+            raise InvalidParamError('where', where, 'Compares field %d, of type %s' % (ind, type_.__name__))
+
+
+def _where_program(where):
+    return None if where is None else tuple(where._program())
+
+
+def project_where(cols, types_, where, kind, params):
+    """
+    Like project, but for a reader also filtering by where (which may be None). Returns the
+        (cols, types_, where) of the reader, or None if there is none. A filt stage whose
+        sole function is a pre field predicate is also absorbed.
+    """
+    if kind == 'filt':
+        pre = params['pre']
+        if params['trans'] is not None or params['post'] is not None or not isinstance(pre, _Pred):
+            return None
+        where_ = pre if where is None else where & pre
+        try:
+            check_where(cols, types_, where_)
+        except InvalidParamError:
+            return None
+        return cols, types_, where_
+    projected = project(cols, types_, kind, params)
+    if projected is None or where is None:
+        return None if projected is None else projected + (None, )
+    if kind == 'select_inds':
+        inds = params['inds']
+        where = where._remap((inds, ) if isinstance(inds, int) else tuple(inds))
+        if where is None:
+            return None
+    return projected + (where, )
+
+
 _int = 0
 _float = 1
 _str = 2
@@ -144,7 +397,7 @@ def _csv_attribs(stream, cols, types_, delimit, comment, skip_init_space):
     return (cols, single, inds, uniques, copies, max_ind, types_, c_types, cast_back)
 
 
-def _make_bufs(c_types, max_field_len, max_elems):
+def _make_bufs(c_types, max_elems):
     bufs = []
     for t in c_types:
         if t == _int:
@@ -152,25 +405,188 @@ def _make_bufs(c_types, max_field_len, max_elems):
         elif t == _float:
             bufs.append( numpy.array(range(max_elems), dtype = float) )
         elif t == _str:
-            bufs.append( numpy.array(range(max_field_len * max_elems), dtype = bytes) )
+            # The reader builds string columns itself (see _copy_array).
+            bufs.append(None)
     return bufs
 
 
-def _copy_array(buf, type_, len_, max_field_len, max_elems):
-    if type_ == bytes:
-        strs = []
-        for i in range(len_):
-            len_ = 100 * int(buf[max_field_len * i]) + 10 * int(buf[max_field_len * i + 1]) + int(buf[max_field_len * i + 2])
-            str_ = type_().join(type_(buf[j]) for j in range(max_field_len * i + 3, max_field_len * i + 3 + len_))
-            strs.append(str_)
-        return numpy.array(strs, dtype = type_)
+def _copy_array(r, j, buf, type_, len_, max_elems):
+    if buf is None:
+        a = r.str_col(j)
+        return a if type_ == bytes else a.astype(type_)
 
     if len_ < max_elems:
         return numpy.array(buf[: len_], copy = True, dtype = type_)
     return numpy.array(buf, copy = True, dtype = type_)
 
 
-def array_read(stream, cols, types_, missing_vals, delimit, comment, skip_init_space, max_elems):
+class _Mapped(object):
+    """
+    A file mapped to memory, whose lines (from pos until end) the C readers scan in place.
+    """
+
+    def __init__(self, name, begin = 0, end = None):
+        with open(name, 'rb') as f:
+            try:
+                self.buf = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+            except ValueError:
+                # Empty files cannot be mapped.
+                self.buf = b''
+        self.pos = begin
+        self.end = len(self.buf) if end is None else min(end, len(self.buf))
+
+    def _bounded(self):
+        return self.buf if self.end == len(self.buf) else _viewable(self.buf, self.end)
+
+    def __iter__(self):
+        buf, end = self.buf, self.end
+        while self.pos < end:
+            begin, nl = self.pos, buf.find(b'\n', self.pos)
+            self.pos = end if nl == -1 else nl + 1
+            yield buf[begin: self.pos]
+
+    def views(self, rstrip):
+        """
+        Returns an iterator over views of the lines, which does not copy them.
+        """
+        return dagpype_c.LineViews(_viewable(self.buf, self.end), self.pos, 1 if rstrip else 0)
+
+    def reader_input(self):
+        """
+        Returns the input and offset from which the C readers should read.
+        """
+        return self._bounded(), self.pos
+
+    def close(self):
+        if isinstance(self.buf, bytes):
+            return
+        try:
+            self.buf.close()
+        except BufferError:
+            # Views are still held; the mapping is released with the last of them.
+            pass
+
+
+# Number of rows sampled from the start of the input to infer types (see infer), and number 
+#   of further rows sampled from random offsets of named files.
+_infer_rows = 1000
+_infer_offsets = 64
+
+_int_re = re.compile(br'^[+-]?[0-9]+$')
+_float_re = re.compile(br'^[+-]?([0-9]+\.?[0-9]*|\.[0-9]+)([eE][+-]?[0-9]+)?$|^[+-]?(nan|inf|infinity)$', re.I)
+
+# Inferred types, from the narrowest.
+_inferred_types = (int, float, bytes)
+
+# Range of the ints read natively (C longs, which the C readers clamp to).
+_c_long_info = numpy.iinfo(numpy.dtype('l'))
+
+
+def _field_type(f):
+    f = f.strip()
+    if len(f) == 0:
+        return None
+    if _int_re.match(f):
+        return int if _c_long_info.min <= int(f) <= _c_long_info.max else float
+    return float if _float_re.match(f) else bytes
+
+
+def _sample_offsets(f_name, begin, num):
+    """
+    Returns the lines following num random offsets (from begin on) of a file.
+    """
+    mapped = _Mapped(f_name)
+    try:
+        buf, end = mapped.buf, mapped.end
+        if end <= begin:
+            return []
+        # Seeded, so that the types of a file are the same from run to run.
+        rand = random.Random(end)
+        lines = []
+        for pos in sorted(rand.randrange(begin, end) for _ in range(num)):
+            nl = buf.find(b'\n', pos)
+            if nl == -1:
+                continue
+            nl_ = buf.find(b'\n', nl + 1)
+            lines.append(buf[nl + 1: end if nl_ == -1 else nl_ + 1])
+        return lines
+    finally:
+        mapped.close()
+
+
+def infer(stream, cols, delimit, comment, skip_init_space, infer_types):
+    """
+    Infers the types (each the narrowest of int, float, and bytes parsing all of a sample of 
+        values) of the columns read by a reader of cols with types_ None. The first rows are
+        sampled (as are rows from random offsets, if stream is the name of a file). 
+        
+    Returns:
+        The stream to read instead (as the rows sampled from a binary stream were consumed),
+            and the types.
+    """
+    num_rows = _infer_rows if infer_types is True else infer_types
+    if isinstance(stream, str):
+        mapped = _Mapped(stream)
+        try:
+            lines = list(itertools.islice(mapped, num_rows + 1))
+            lines_end, at_end = mapped.pos, mapped.pos == mapped.end
+        finally:
+            mapped.close()
+    else:
+        lines = list(itertools.islice(stream, num_rows + 1))
+        stream = itertools.chain(lines, stream)
+        at_end = True
+
+    lines_ = iter(lines)
+    if cols is None or cols_are_type(cols, int):
+        inds = None if cols is None else [cols] if isinstance(cols, int) else list(cols)
+    else:
+        inds = _inds_from_cols(lines_, cols, None, delimit, comment, skip_init_space)[2]
+    if not at_end:
+        lines_ = itertools.chain(lines_, _sample_offsets(stream, lines_end, _infer_offsets))
+
+    types_ = [None] * (0 if inds is None else len(inds))
+    for l in lines_:
+        if len(l.strip()) == 0:
+            continue
+        try:
+            fields = dagpype_c.line_to_tuple([l], delimit, comment, 1 if skip_init_space else 0)
+        except ValueError:
+            # Part of a record whose quoted field spans lines.
+            continue
+        if inds is None:
+            types_.extend([None] * (len(fields) - len(types_)))
+            fields_ = fields
+        else:
+            fields_ = [fields[i] if i < len(fields) else b'' for i in inds]
+        for i, f in enumerate(fields_):
+            t = _field_type(f)
+            if t is not None and (types_[i] is None or _inferred_types.index(t) > _inferred_types.index(types_[i])):
+                types_[i] = t
+
+    types_ = tuple(float if t is None else t for t in types_)
+    if isinstance(cols, (int, bytes)):
+        types_ = types_[0]
+    elif cols is None and len(types_) == 0:
+        types_ = None
+    return stream, types_
+
+
+def _reader_input(stream):
+    return stream.reader_input() if isinstance(stream, _Mapped) else (stream, -1)
+
+
+def open_input(stream, mapped):
+    """
+    Opens a name of a file (mapping it to memory if mapped), and returns the opened input 
+        and whether it was opened (so that it should be closed).
+    """
+    if not isinstance(stream, str):
+        return stream, False
+    return (_Mapped(stream) if mapped else open(stream, 'rb')), True
+
+
+def array_read(stream, cols, types_, missing_vals, delimit, comment, skip_init_space, max_elems, where = None):
     (cols, single, inds, uniques, copies, max_ind, types_, c_types, cast_back) = \
         _csv_attribs(stream, cols, types_, delimit, comment, skip_init_space)
 
@@ -182,29 +598,29 @@ def array_read(stream, cols, types_, missing_vals, delimit, comment, skip_init_s
     c_missing_vals = (_encode(missing_vals), ) if single else tuple(_encode(m) for m in missing_vals)
     assert len(cols) == len(c_types) == len(c_missing_vals)
 
-    max_field_len = dagpype_c.parser_max_field_len()
-    assert max_field_len > 0
-
-    bufs = _make_bufs(c_types, max_field_len, max_elems)
+    bufs = _make_bufs(c_types, max_elems)
 
+    input_, offset = _reader_input(stream)
     r = dagpype_c.ArrayColReader(
-        stream, 
+        input_, 
         delimit, comment, 1 if skip_init_space else 0, 
         1 if single else 0,
         inds, uniques, copies, max_ind,
         c_types, 
         c_missing_vals,
         max_elems,
-        bufs)
+        bufs,
+        _where_program(where),
+        offset)
 
     for len_ in r:
         if len_ == 0:
             break
         if single:
-            payload = _copy_array(bufs[0], types_, len_, max_field_len, max_elems)
+            payload = _copy_array(r, 0, bufs[0], types_, len_, max_elems)
         else:
-            payload = \
-                tuple(_copy_array(buf, type_, len_, max_field_len, max_elems) for buf, type_ in _zip(bufs, types_))
+            payload = tuple(
+                _copy_array(r, j, buf, type_, len_, max_elems) for j, (buf, type_) in enumerate(_zip(bufs, types_)))
         yield payload
         if len_ < max_elems:
             break
@@ -214,16 +630,19 @@ def _cast(a, b):
     return b(a) if a is not None and b is not None else a
 
 
-def read(stream, cols, types_, delimit, comment, skip_init_space):
+def read(stream, cols, types_, delimit, comment, skip_init_space, where = None):
     (cols, single, inds, uniques, copies, max_ind, types_, c_types, cast_back) = \
         _csv_attribs(stream, cols, types_, delimit, comment, skip_init_space)
 
+    input_, offset = _reader_input(stream)
     r = dagpype_c.ColReader(
-        stream, 
+        input_, 
         delimit, comment, 1 if skip_init_space else 0, 
         1 if single else 0,
         inds, uniques, copies, max_ind,
-        c_types)
+        c_types,
+        _where_program(where),
+        offset)
         
     if not cast_back:
         for t in r:
@@ -12,11 +12,20 @@ import collections
 import sys
 import types
 import math
+import operator
+import heapq
+import tempfile
+try:
+    import cPickle as _pickle
+except ImportError:
+    import pickle as _pickle
 
 try:
-    from ._core import filters
+    from ._core import filters, batch_filters, _with_batch, _fusable, _fuse_map, _fuse_pred, _node, _projectable
+    from ._core import InvalidParamError
 except ValueError:
-    from _core import filters
+    from _core import filters, batch_filters, _with_batch, _fusable, _fuse_map, _fuse_pred, _node, _projectable
+    from _core import InvalidParamError
 import _rank_treap
 import _csv_utils
 import dagpype_c
@@ -74,7 +83,7 @@ def filt(trans = None, pre = None, post = None):
             elif pre is None and trans is not None and post is not None:
                 while True:
                     e = trans((yield))
-                    if pos(e):
+                    if post(e):
                         target.send(e)     
             elif pre is not None and trans is None and post is None:
                 while True:
@@ -91,18 +100,37 @@ def filt(trans = None, pre = None, post = None):
                     e = (yield)
                     if pre(e):
                         target.send(trans(e))
-            elif pre is None and trans is not None and post is not None:
+            elif pre is not None and trans is not None and post is not None:
                 while True:
                     e = (yield)
                     if not pre(e):
                         continue
                     e = trans(e)
-                    if pos(e):
+                    if post(e):
                         target.send(e)     
         except GeneratorExit:
             target.close()
 
-    return _dagpype_internal_fn_act
+    @batch_filters
+    def _dagpype_internal_fn_batch_act(target):
+        try:
+            while True:
+                l = (yield)
+                if pre is not None:
+                    l = list(filter(pre, l))
+                if trans is not None:
+                    l = list(map(trans, l))
+                if post is not None:
+                    l = list(filter(post, l))
+                if len(l) > 0:
+                    target.send(l)
+        except GeneratorExit:
+            target.close()
+
+    steps = [(_fuse_pred, pre)] if pre is not None else []
+    steps += [(_fuse_map, trans)] if trans is not None else []
+    steps += [(_fuse_pred, post)] if post is not None else []
+    return _node(_fusable(_with_batch(_dagpype_internal_fn_act, _dagpype_internal_fn_batch_act), steps), 'filt', trans = trans, pre = pre, post = post)
 
 
 __all__ += ['grep']
@@ -160,7 +188,7 @@ def select_inds(inds):
             except GeneratorExit:
                 target.close()
 
-        return _dagpype_internal_fn_act_i
+        return _select_inds_fused(_dagpype_internal_fn_act_i, operator.itemgetter(inds), inds)
 
     inds = list(inds)
 
@@ -175,7 +203,7 @@ def select_inds(inds):
             except GeneratorExit:
                 target.close()
 
-        return _dagpype_internal_fn_act_2
+        return _select_inds_fused(_dagpype_internal_fn_act_2, operator.itemgetter(*inds), inds)
 
     if len(inds) == 3:
         @filters
@@ -188,7 +216,7 @@ def select_inds(inds):
             except GeneratorExit:
                 target.close()
 
-        return _dagpype_internal_fn_act_3
+        return _select_inds_fused(_dagpype_internal_fn_act_3, operator.itemgetter(*inds), inds)
 
     @filters
     def _dagpype_internal_fn_act(target):
@@ -199,7 +227,24 @@ def select_inds(inds):
             except GeneratorExit:
                 target.close()
 
-    return _dagpype_internal_fn_act
+    if len(inds) < 2:
+        return _select_inds_fused(_dagpype_internal_fn_act, lambda e : tuple(e[i] for i in inds), inds)
+    return _select_inds_fused(_dagpype_internal_fn_act, operator.itemgetter(*inds), inds)
+
+
+def _select_inds_fused(piped, getter, inds):
+    @batch_filters
+    def _dagpype_internal_fn_batch_act(target):
+        try:
+            while True:
+                target.send(list(map(getter, (yield))))
+        except GeneratorExit:
+            target.close()
+
+    return _node(
+        _fusable(_with_batch(piped, _dagpype_internal_fn_batch_act), [(_fuse_map, getter)]),
+        'select_inds',
+        inds = inds if type(inds) == int else tuple(inds))
 
 
 __all__ += ['relay']
@@ -222,7 +267,15 @@ def relay():
         except GeneratorExit:
             target.close();
 
-    return _dagpype_internal_fn_act
+    @batch_filters
+    def _dagpype_internal_fn_batch_act(target):
+        try:
+            while True:
+                target.send((yield))
+        except GeneratorExit:
+            target.close();
+
+    return _node(_fusable(_with_batch(_dagpype_internal_fn_act, _dagpype_internal_fn_batch_act), []), 'relay')
 
 
 __all__ += ['window_simple_ave']
@@ -513,7 +566,7 @@ def cast(types_):
             except GeneratorExit:
                 target.close()
 
-        return _dagpype_internal_fn_act_1
+        return _cast_fused(_dagpype_internal_fn_act_1, types_, types_)
 
     types_ = list(types_)
 
@@ -528,7 +581,8 @@ def cast(types_):
             except GeneratorExit:
                 target.close()
 
-        return _dagpype_internal_fn_act_2
+        return _cast_fused(_dagpype_internal_fn_act_2, 
+            lambda e, t0 = types_[0], t1 = types_[1] : (t0(e[0]), t1(e[1])), types_)
 
     if len(types_) == 3:
         @filters
@@ -541,7 +595,8 @@ def cast(types_):
             except GeneratorExit:
                 target.close()
 
-        return _dagpype_internal_fn_act_3
+        return _cast_fused(_dagpype_internal_fn_act_3, 
+            lambda e, t0 = types_[0], t1 = types_[1], t2 = types_[2] : (t0(e[0]), t1(e[1]), t2(e[2])), types_)
 
     @filters
     def _dagpype_internal_fn_act(target):
@@ -552,7 +607,23 @@ def cast(types_):
         except GeneratorExit:
             target.close()
 
-    return _dagpype_internal_fn_act
+    return _cast_fused(_dagpype_internal_fn_act, 
+        lambda e : tuple(t(ee) for t, ee in zip(types_, e)), types_)
+
+
+def _cast_fused(piped, cast_fn, types_):
+    @batch_filters
+    def _dagpype_internal_fn_batch_act(target):
+        try:
+            while True:
+                target.send(list(map(cast_fn, (yield))))
+        except GeneratorExit:
+            target.close()
+
+    return _node(
+        _fusable(_with_batch(piped, _dagpype_internal_fn_batch_act), [(_fuse_map, cast_fn)]),
+        'cast',
+        types_ = types_ if type(types_) == type else tuple(types_))
 
 
 __all__ += ['prepend']
@@ -700,7 +771,23 @@ def skip(n):
             except GeneratorExit:
                 target.close()
 
-        return _dagpype_internal_fn_act_p
+        @batch_filters
+        def _dagpype_internal_fn_batch_act_p(target):
+            remaining = n
+            try:
+                while True:
+                    l = (yield)
+                    if remaining == 0:
+                        target.send(l)
+                    elif len(l) <= remaining:
+                        remaining -= len(l)
+                    else:
+                        target.send(l[remaining: ])
+                        remaining = 0
+            except GeneratorExit:
+                target.close()
+
+        return _node(_with_batch(_dagpype_internal_fn_act_p, _dagpype_internal_fn_batch_act_p), 'skip', n = n)
 
     @filters
     def _dagpype_internal_fn_act_n(target):
@@ -714,7 +801,7 @@ def skip(n):
         except GeneratorExit:
             target.close()
 
-    return _dagpype_internal_fn_act_n
+    return _node(_dagpype_internal_fn_act_n, 'skip', n = n)
 
 
 __all__ += ['trace']
@@ -789,6 +876,7 @@ def csv_split(
 
     """
     Splits the values in a delimited stream (e.g., by commas for CSV files, or by tabs for TAB files) as tuples.
+        Fields may be quoted as in stream_vals (but not over lines).
 
     Keyword Arguments:
         cols -- Indication of which columns to read. If either an integer or a tuple of integers,
@@ -840,7 +928,15 @@ def csv_split(
         except GeneratorExit:
             target.close()
 
-    return _dagpype_internal_fn_act
+    def project(kind, params):
+        projected = _csv_utils.project(cols, types_, kind, params)
+        if projected is None:
+            return None
+        return csv_split(projected[0], projected[1], delimit, comment, skip_init_space)._fns[0]
+
+    return _projectable(
+        _node(_dagpype_internal_fn_act, 'csv_split', cols = cols, types_ = types_),
+        project)
 
 
 __all__ += ['cum_sum']
@@ -1222,12 +1318,14 @@ def slice_(
                     if i == stop:
                         break
                     e  = (yield)
-                    target.send(e)
+                    if i >= start:
+                        target.send(e)
                     i += 1
+            target.close()
         except GeneratorExit:
             target.close()
 
-    return _dagpype_internal_fn_act
+    return _node(_dagpype_internal_fn_act, 'slice_', start = start, stop = stop, step = step)
 	
 
 __all__ += ['tail']
@@ -1318,3 +1416,149 @@ def enumerate_(start = 0):
 
     return _dagpype_internal_fn_act
 
+
+
+# Number of elements pickled together in sort_ runs.
+_sort_dump_batch = 4096
+# Maximal number of runs merged at once by sort_.
+_sort_max_merge = 64
+
+
+def _approx_size(e):
+    size = sys.getsizeof(e) + 8
+    if isinstance(e, (tuple, list)):
+        size += sum(sys.getsizeof(ee) for ee in e)
+    return size
+
+
+def _dump_run(run):
+    f = tempfile.TemporaryFile()
+    batch = []
+    for e in run:
+        batch.append(e)
+        if len(batch) == _sort_dump_batch:
+            _pickle.dump(batch, f, -1)
+            batch = []
+    if len(batch) > 0:
+        _pickle.dump(batch, f, -1)
+    f.seek(0)
+    return f
+
+
+def _load_run(f):
+    while True:
+        try:
+            batch = _pickle.load(f)
+        except EOFError:
+            return
+        for e in batch:
+            yield e
+
+
+class _Reversed(object):
+    __slots__ = ['k']
+
+    def __init__(self, k):
+        self.k = k
+
+    def __lt__(self, other):
+        return other.k < self.k
+
+    def __eq__(self, other):
+        return self.k == other.k
+
+
+def _merge_runs(runs, key, reverse):
+    # Runs are merged stably: the run index breaks ties, and elements are never compared.
+    def decorated(i, f):
+        for e in _load_run(f):
+            k = e if key is None else key(e)
+            yield (_Reversed(k) if reverse else k, i, e)
+
+    for _, _, e in heapq.merge(*[decorated(i, f) for i, f in enumerate(runs)]):
+        yield e
+
+
+__all__ += ['sort_']
+def sort_(key = None, reverse = False, mem_limit = 256 * 1024 * 1024):
+    """
+    Sorts a stream (stably), even one which does not fit in memory. Runs of elements taking
+        up to about mem_limit bytes are sorted, and if there is more than one such run, 
+        the runs are spilled to temporary files (so that the elements must be picklable),
+        and merged. The elements are sent on when the stream ends.
+
+    Keyword Arguments:
+        key -- Function mapping each element to the key by which it is sorted, or None for 
+            the element itself (default None).
+        reverse -- Whether to sort in descending order (default False).
+        mem_limit -- Approximate number of bytes of a run (default 256MB). The size of a 
+            run's elements is estimated from that of its first element.
+
+    See Also:
+        :func:`dagpype.consec_group`
+        :func:`dagpype.from_to`
+        :func:`dagpype.np.sort_`
+
+    Examples:
+
+    >>> source([3, 1, 2]) | sort_() | to_list()
+    [1, 2, 3]
+    >>> source([(1, b'b'), (0, b'a'), (1, b'a')]) | sort_(key = lambda t : t[0], reverse = True) | to_list()
+    [(1, b'b'), (1, b'a'), (0, b'a')]
+    >>> # Counts the occurrences of each user in a log larger than the memory.
+    >>> stream_vals('log.csv', b'user', bytes) | sort_() | \\
+    ...     consec_group(lambda u : u, lambda u : sink(u) + count()) | \\
+    ...     to_dict()
+    """
+
+    if mem_limit <= 0:
+        raise InvalidParamError('mem_limit', mem_limit, 'Must be positive')
+
+    def merge(runs, levels, begin, end, level):
+        # Only consecutive runs are merged, so that the ties keep their order.
+        merged = _dump_run(_merge_runs(runs[begin: end], key, reverse))
+        for f in runs[begin: end]:
+            f.close()
+        runs[begin: end], levels[begin: end] = [merged], [level]
+
+    @filters
+    def _dagpype_internal_fn_act(target):
+        runs, levels, run, run_len = [], [], [], None
+        try:
+            try:
+                while True:
+                    e = (yield)
+                    if run_len is None:
+                        run_len = max(1, mem_limit // _approx_size(e))
+                    run.append(e)
+                    if len(run) < run_len:
+                        continue
+                    run.sort(key = key, reverse = reverse)
+                    runs.append(_dump_run(run))
+                    levels.append(0)
+                    run, run_len = [], None
+                    # Runs are merged by levels, bounding the number of open files.
+                    while len(runs) >= _sort_max_merge and \
+                            levels[-_sort_max_merge] == levels[-1]:
+                        merge(runs, levels, len(runs) - _sort_max_merge, len(runs), levels[-1] + 1)
+            except GeneratorExit:
+                run.sort(key = key, reverse = reverse)
+                if len(runs) == 0:
+                    for e in run:
+                        target.send(e)
+                    target.close()
+                    return
+                if len(run) > 0:
+                    runs.append(_dump_run(run))
+                    levels.append(0)
+                    run = []
+                while len(runs) > _sort_max_merge:
+                    merge(runs, levels, 0, _sort_max_merge, None)
+                for e in _merge_runs(runs, key, reverse):
+                    target.send(e)
+                target.close()
+        finally:
+            for f in runs:
+                f.close()
+
+    return _node(_dagpype_internal_fn_act, 'sort_', key = key, reverse = reverse)
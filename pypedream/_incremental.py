@@ -0,0 +1,114 @@
+"""
+Incremental reduction of append-only files.
+"""
+
+
+import os
+try:
+    import cPickle as _pickle
+except ImportError:
+    import pickle as _pickle
+
+from dagpype._core import partial_state, _partial_fns, _merge_fns, InvalidParamError
+
+
+__all__ = []
+
+
+class _Tail(object):
+    """
+    Iterates over the complete lines of a binary stream from an offset (preceded by a header,
+        if any), and records the offset after the last line iterated over. A last line
+        lacking a newline is possibly being appended, and is left for a later run.
+    """
+
+    def __init__(self, stream, begin, header):
+        self.stream, self.pos, self.header = stream, begin, header
+        self._lines = self._iter_lines()
+
+    def __iter__(self):
+        return self._lines
+
+    def _iter_lines(self):
+        if self.header is not None:
+            yield self.header
+        self.stream.seek(self.pos)
+        for l in iter(self.stream.readline, b''):
+            if not l.endswith(b'\n'):
+                break
+            self.pos += len(l)
+            yield l
+
+
+def _load_checkpoint(checkpoint):
+    if not os.path.exists(checkpoint):
+        return dict([]), None
+    with open(checkpoint, 'rb') as f:
+        c = _pickle.load(f)
+    return c['offsets'], c['state']
+
+
+def _save_checkpoint(checkpoint, offsets, state):
+    # Written aside and renamed over, so that a failed run leaves the previous checkpoint.
+    tmp = checkpoint + '.tmp'
+    with open(tmp, 'wb') as f:
+        _pickle.dump({'offsets': offsets, 'state': state}, f, 2)
+        f.flush()
+        os.fsync(f.fileno())
+    try:
+        os.replace(tmp, checkpoint)
+    except AttributeError:
+        if os.name == 'nt' and os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        os.rename(tmp, checkpoint)
+
+
+__all__ += ['incremental_reduce']
+def incremental_reduce(checkpoint, file_or_paths, pipe_factory, target, header = True):
+    """
+    Reduces append-only files incrementally: each call reduces only the lines appended since
+        the previous call with the same checkpoint, and returns the result of the target
+        over all the lines so far. The checkpoint file records the offset reached in each
+        file, and the partial state of the target (see partial_state); it is replaced
+        atomically, and only if the call succeeds. A last line lacking a newline is left
+        for a later call.
+
+    Arguments:
+        checkpoint -- Name of the checkpoint file (created if it does not exist).
+        file_or_paths -- Either the name of a file, or a sequence of names of files.
+        pipe_factory -- Function taking a binary stream of lines and returning a source pipe
+            (e.g., lambda s : stream_vals(s, b'wind')).
+        target -- Mergeable target (see partial_state).
+
+    Keyword Arguments:
+        header -- Whether the first line of each file is a header, repeated at the start of
+            the lines of each later call (default True).
+
+    See Also:
+        :func:`dagpype.partial_state`
+        :func:`dagpype.parallel_reduce`
+
+    Example:
+
+    >>> # Run hourly; each run reads only the lines logged since the previous one.
+    >>> m, n = incremental_reduce('log.ckpt', 'log.csv', lambda s : stream_vals(s, b'latency'), mean() + count())
+    """
+    paths = [file_or_paths] if isinstance(file_or_paths, str) else list(file_or_paths)
+    fns = target.simple()
+    _partial_fns(target, fns)
+
+    offsets, state = _load_checkpoint(checkpoint)
+    offsets = dict(offsets)
+    for path in paths:
+        begin = offsets.get(path, 0)
+        if os.path.getsize(path) < begin:
+            raise InvalidParamError('file_or_paths', path, 'Shrunk since the checkpoint')
+        with open(path, 'rb') as stream:
+            header_ = stream.readline() if header and begin > 0 else None
+            tail = _Tail(stream, begin, header_)
+            s = pipe_factory(tail) | partial_state(target)
+        offsets[path] = tail.pos
+        state = s if state is None else _merge_fns(fns, [state, s], final = False)
+
+    _save_checkpoint(checkpoint, offsets, state)
+    return _merge_fns(fns, [state])
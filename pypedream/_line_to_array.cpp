@@ -1,6 +1,8 @@
 #include <Python.h>
 #include <structmember.h>
 
+#include <new>
+
 #include "_line_to_array.hpp"
 
 using namespace std;
@@ -70,10 +72,6 @@ _line_to_array(
         }
 
         ++in_col_i;
-        if (in_col_i == max_field_len) {
-            PyErr_Format(PyExc_IndexError, "Max col length exceeded");
-            return -1;
-        }
 
         ++c; 
     }
@@ -123,10 +121,6 @@ _line_to_array(
         }
 
         ++in_col_i;
-        if (in_col_i == max_field_len) {
-            PyErr_Format(PyExc_IndexError, "Max col length exceeded");
-            return -1;
-        }
 
         ++c; 
     }
@@ -137,3 +131,127 @@ _line_to_array(
     return unique_col_i;
 }
 
+
+static bool 
+add_quoted_field(
+    bool should_parse,
+    char * & begin,
+    char * & out,
+    _ParsedT parsed[max_num_cols],
+    long & col_i)
+{
+    if (!should_parse)
+        return true;
+
+    if (col_i == max_num_cols) {
+        PyErr_Format(PyExc_IndexError, "Max num cols exceeded");
+        return false;
+    }
+
+    // Null-terminated, as the numeric conversions read up to a non-digit.
+    parsed[col_i++] = make_pair(begin, out);
+    *out++ = '\0';
+    begin = out;
+    return true;
+}
+
+long
+_quoted_line_to_array(
+    const long * cols, const long * unique_cols, 
+    long num_cols, long max_col,
+    char delimit, bool has_comment, char comment, int skip_init_space,
+    const char * c, long len, 
+    _ParsedT parsed[max_num_cols],
+    char * scratch)
+{
+    DBG_VERIFY(len >= 0);
+    long unique_col_i = 0, col_i = 0;
+    bool should_parse = _should_parse(unique_cols, 0, 0);
+    // Whether the current field has begun (past any initial spaces), and whether it is 
+    // within quotes.
+    bool started = false, in_quote = false;
+    char * begin = scratch, * out = scratch;
+    const char * const end = c + len;
+    for (; c != end; ++c) {
+        if (in_quote) {
+            if (*c != '"') {
+                if (should_parse)
+                    *out++ = *c;
+            }
+            else if (c + 1 != end && c[1] == '"') {
+                if (should_parse)
+                    *out++ = '"';
+                ++c;
+            }
+            else
+                in_quote = false;
+            continue;
+        }
+
+        if (*c == delimit){
+            if (!add_quoted_field(should_parse, begin, out, parsed, unique_col_i))
+                return -1;
+            ++col_i;
+            if(cols != NULL && col_i > max_col)
+                return unique_col_i;
+            should_parse = _should_parse(unique_cols, unique_col_i, col_i);
+            started = false;
+            continue;
+        }
+
+        if ((has_comment && *c == comment) || *c == '\n' || *c == '\r')
+            break;
+
+        if (*c == ' ' && !started && skip_init_space) 
+            continue;
+
+        // Only a quote beginning a field opens a quoted field.
+        const bool opens = *c == '"' && !started;
+        started = true;
+        if (opens) {
+            in_quote = true;
+            continue;
+        }
+
+        if (should_parse)
+            *out++ = *c;
+    }
+
+    if (in_quote)
+        return _unterminated_quote;
+
+    if (!add_quoted_field(should_parse, begin, out, parsed, unique_col_i))
+        return -1;
+
+    return unique_col_i;
+}
+
+long
+_any_line_to_array(
+    const long * cols, const long * unique_cols, 
+    long num_cols, long max_col,
+    char delimit, bool has_comment, char comment, int skip_init_space,
+    const char * c, long len, bool has_quote,
+    _ParsedT parsed[max_num_cols],
+    buf_t & scratch)
+{
+    if (!has_quote)
+        return has_comment?
+            _line_to_array(
+                cols, unique_cols, num_cols, max_col, delimit, comment, skip_init_space, 
+                c, len, parsed) :
+            _line_to_array(
+                cols, unique_cols, num_cols, max_col, delimit, skip_init_space, 
+                c, len, parsed);
+
+    try {
+        scratch.resize(2 * len + 2);
+    }
+    catch(std::bad_alloc &) {
+        PyErr_NoMemory();
+        return -1;
+    }
+    return _quoted_line_to_array(
+        cols, unique_cols, num_cols, max_col, delimit, has_comment, comment, skip_init_space, 
+        c, len, parsed, &scratch[0]);
+}
@@ -18,6 +18,32 @@ _line_to_array(
     char delimit, int skip_init_space,
     const char * c, long len, _ParsedT parsed[max_num_cols]);
 
+// Returned by _quoted_line_to_array for a line ending within a quoted field (which continues
+// on the next line).
+enum{_unterminated_quote = -2};
+
+// Parses a line whose fields may be quoted (RFC 4180): a field beginning with a quote ends at
+// the next quote not doubled, a doubled quote within it standing for a quote, and delimiters,
+// comments and newlines within it being part of it. The fields are unescaped into scratch 
+// (which must have room for 2 * len + 2 chars), each followed by a null.
+long
+_quoted_line_to_array(
+    const long * cols, const long * unique_cols, 
+    long num_cols, long max_col,
+    char delimit, bool has_comment, char comment, int skip_init_space,
+    const char * c, long len, _ParsedT parsed[max_num_cols],
+    char * scratch);
+
+// Parses a line by _quoted_line_to_array if has_quote (it contains a quote), and by 
+// _line_to_array otherwise, so that lines without quotes pay nothing for them.
+long
+_any_line_to_array(
+    const long * cols, const long * unique_cols, 
+    long num_cols, long max_col,
+    char delimit, bool has_comment, char comment, int skip_init_space,
+    const char * c, long len, bool has_quote, _ParsedT parsed[max_num_cols],
+    buf_t & scratch);
+
 #endif // #ifndef _LINE_TO_ARRAY_HPP
 
 
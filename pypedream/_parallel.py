@@ -0,0 +1,478 @@
+"""
+Stages employing multiple processes.
+
+Worker processes are forked, and inherit the pipes they run, so that these pipes need not be
+    picklable (only the elements passed to and from the workers need be). Consequently, these
+    stages require a platform supporting fork (e.g., GNU/Linux).
+"""
+
+
+import os
+import itertools
+import collections
+import multiprocessing
+try:
+    import Queue as _queue
+except ImportError:
+    import queue as _queue
+try:
+    import cPickle as _pickle
+except ImportError:
+    import pickle as _pickle
+
+from dagpype._core import filters, batch_filters, source, _with_batch, Error, InvalidParamError
+from dagpype._core import partial_state, merge_states, sub_pipe_target
+from dagpype._snk import to_list
+
+
+__all__ = []
+
+
+# Pipes (or pipe factories) run by workers, by key. Workers are forked after their pipes are placed here.
+_worker_pipes = dict([])
+_worker_keys = itertools.count()
+
+
+def _fork_context():
+    try:
+        return multiprocessing.get_context('fork')
+    except AttributeError:
+        return multiprocessing
+
+
+def _make_pool(workers):
+    return _fork_context().Pool(workers)
+
+
+# Seconds to wait on in-flight work before checking on the rest (the other batches, when
+# results are unordered, or the liveness of the workers).
+_poll_interval = 0.01
+
+
+def _run_mid_pipe(key, batch):
+    try:
+        return True, source(batch) | _worker_pipes[key] | to_list()
+    except Exception as e:
+        return False, e
+
+
+class _Dispatcher(object):
+    """
+    Ships batches of elements to a pool of workers running a mid pipe, and sends on
+        the results, while bounding the number of in-flight batches. The results are
+        waited on through their AsyncResults, whose get re-raises errors in the workers
+        and in pickling the batches or their results.
+    """
+
+    def __init__(self, mid_pipe, workers, batch, ordered, send):
+        self._key = next(_worker_keys)
+        _worker_pipes[self._key] = mid_pipe
+        self._pool = _make_pool(workers)
+        self._batch, self._ordered, self._send = batch, ordered, send
+        self._max_pending = 2 * workers
+        self._pending, self._results = [], collections.deque()
+
+    def push(self, e):
+        self._pending.append(e)
+        if len(self._pending) >= self._batch:
+            self._submit()
+
+    def extend(self, l):
+        self._pending.extend(l)
+        while len(self._pending) >= self._batch:
+            self._submit()
+
+    def _submit(self):
+        while len(self._results) >= self._max_pending:
+            self._receive()
+        batch, self._pending = self._pending[: self._batch], self._pending[self._batch: ]
+        self._results.append(self._pool.apply_async(_run_mid_pipe, (self._key, batch)))
+
+    def _next_ready(self):
+        while True:
+            for i, r in enumerate(self._results):
+                if r.ready():
+                    del self._results[i]
+                    return r
+            self._results[0].wait(_poll_interval)
+
+    def _receive(self):
+        r = self._results.popleft() if self._ordered else self._next_ready()
+        ok, res = r.get()
+        if not ok:
+            raise res
+        self._send(res)
+
+    def flush(self):
+        if len(self._pending) > 0:
+            self._submit()
+        while len(self._results) > 0:
+            self._receive()
+
+    def close(self):
+        self._pool.terminate()
+        del _worker_pipes[self._key]
+
+
+__all__ += ['parallel']
+def parallel(mid_pipe, workers = None, batch = 1024, ordered = True):
+    """
+    Runs a (stateless) mid pipe over batches of elements in a pool of worker processes.
+        The number of in-flight batches is bounded, so that memory stays bounded even for
+        unbounded sources.
+
+    Arguments:
+        mid_pipe -- Pipe applied to the elements. Each batch is passed through a separate
+            instance of this pipe, so it should not keep state between elements.
+
+    Keyword Arguments:
+        workers -- Number of worker processes, or None for the number of CPUs (default None).
+        batch -- Number of elements shipped to a worker at a time (default 1024).
+        ordered -- Whether the results are sent on in the order of the elements; otherwise
+            they are sent on as they become ready (default True).
+
+    See Also:
+        :func:`dagpype.filt`
+
+    Example:
+
+    >>> source(range(10)) | parallel(filt(lambda x : x * x), workers = 2, batch = 3) | to_list()
+    [0, 1, 4, 9, 16, 25, 36, 49, 64, 81]
+    """
+
+    workers_ = multiprocessing.cpu_count() if workers is None else workers
+    if workers_ < 1:
+        raise InvalidParamError('workers', workers, 'Must be positive')
+    if batch < 1:
+        raise InvalidParamError('batch', batch, 'Must be positive')
+
+    @filters
+    def _dagpype_internal_fn_act(target):
+        def send(res):
+            for e in res:
+                target.send(e)
+        d = _Dispatcher(mid_pipe, workers_, batch, ordered, send)
+        try:
+            try:
+                while True:
+                    d.push((yield))
+            except GeneratorExit:
+                d.flush()
+                target.close()
+        finally:
+            d.close()
+
+    @batch_filters
+    def _dagpype_internal_fn_batch_act(target):
+        def send(res):
+            if len(res) > 0:
+                target.send(res)
+        d = _Dispatcher(mid_pipe, workers_, batch, ordered, send)
+        try:
+            try:
+                while True:
+                    d.extend((yield))
+            except GeneratorExit:
+                d.flush()
+                target.close()
+        finally:
+            d.close()
+
+    return _with_batch(_dagpype_internal_fn_act, _dagpype_internal_fn_batch_act)
+
+
+def _collect(l):
+    while True:
+        l.append((yield))
+
+
+def _run_group_worker(i, key_pipe, in_q, out_q):
+    """
+    Groups the (sequence number, key, element) triplets of the batches received until None,
+        and replies (as its index, and the pickled reply) with the results of each key, and 
+        the sequence number of its first element. The reply is pickled here, so that a
+        failure to pickle it is replied too.
+    """
+    targets, firsts, results = dict([]), dict([]), dict([])
+    try:
+        while True:
+            batch = in_q.get()
+            if batch is None:
+                break
+            for seq, k, e in batch:
+                t = targets.get(k)
+                if t is None:
+                    firsts[k], results[k] = seq, []
+                    c = _collect(results[k])
+                    next(c)
+                    t = targets[k] = sub_pipe_target(key_pipe(k), c)
+                # As in group.
+                try:
+                    t.send(e)
+                except Exception as e:
+                    pass
+        for t in targets.values():
+            t.close()
+        out_q.put((i, _pickle.dumps((True, [(firsts[k], results[k]) for k in targets]), 2)))
+    except Exception as e:
+        try:
+            reply = _pickle.dumps((False, e), 2)
+        except Exception:
+            reply = _pickle.dumps((False, Error(repr(e))), 2)
+        out_q.put((i, reply))
+        # Keeps receiving, so that the dispatcher is not blocked.
+        while in_q.get() is not None:
+            pass
+
+
+class _GroupDispatcher(object):
+    """
+    Partitions elements by the hashes of their keys among worker processes, each grouping 
+        its partition, shipping elements in batches.
+    """
+
+    def __init__(self, key, key_pipe, workers, batch):
+        ctx = _fork_context()
+        self._key, self._batch = key, batch
+        self._ins = [ctx.Queue(2) for _ in range(workers)]
+        self._out = ctx.Queue()
+        self._procs = [ctx.Process(target = _run_group_worker, args = (i, key_pipe, q, self._out)) \
+            for i, q in enumerate(self._ins)]
+        for p in self._procs:
+            p.daemon = True
+            p.start()
+        self._pending, self._seq = [[] for _ in range(workers)], 0
+
+    def push(self, e):
+        self.extend((e, ))
+
+    def extend(self, l):
+        key, pending, ins, batch, seq = self._key, self._pending, self._ins, self._batch, self._seq
+        for e in l:
+            k = key(e)
+            i = hash(k) % len(ins)
+            p = pending[i]
+            p.append((seq, k, e))
+            seq += 1
+            if len(p) >= batch:
+                self._put(i, p)
+                pending[i] = []
+        self._seq = seq
+
+    def _check_alive(self, i):
+        code = self._procs[i].exitcode
+        if code is not None:
+            raise Error('Worker %d exited with code %d without replying' % (i, code))
+
+    def _put(self, i, batch):
+        while True:
+            try:
+                self._ins[i].put(batch, timeout = _poll_interval)
+                return
+            except _queue.Full:
+                self._check_alive(i)
+
+    def _replies(self):
+        # A dead worker's reply may still be on its way, so it is looked for once more 
+        # before the worker is taken to have died without replying.
+        replies, dead = dict([]), []
+        while len(replies) < len(self._procs):
+            try:
+                i, reply = self._out.get(timeout = _poll_interval)
+                replies[i] = _pickle.loads(reply)
+                continue
+            except _queue.Empty:
+                pass
+            for i in dead:
+                if i not in replies:
+                    self._check_alive(i)
+            dead = [i for i, p in enumerate(self._procs) if i not in replies and p.exitcode is not None]
+        return [replies[i] for i in range(len(self._procs))]
+
+    def finish(self):
+        """
+        Returns the results of all keys, ordered by the first appearances of the keys.
+        """
+        for i in range(len(self._ins)):
+            if len(self._pending[i]) > 0:
+                self._put(i, self._pending[i])
+            self._put(i, None)
+        self._pending = [[] for _ in self._ins]
+        replies = self._replies()
+        for ok, res in replies:
+            if not ok:
+                raise res
+        return [r for _, rs in sorted((f for _, res in replies for f in res), key = lambda f : f[0]) for r in rs]
+
+    def close(self):
+        for p in self._procs:
+            if p.is_alive():
+                p.terminate()
+            p.join()
+
+
+__all__ += ['parallel_group']
+def parallel_group(key, key_pipe, workers = None, batch = 1024):
+    """
+    Groups elements like group, in a pool of worker processes: the elements are partitioned 
+        among the workers by the hashes of their keys (in batches), and each worker sends the
+        elements of its keys through pipes created per key. The results of the pipes of 
+        all keys are sent on when the stream ends, ordered by the first appearances of the 
+        keys, as group does for pipes reducing their elements (e.g., sink(k) + count()).
+        The keys and results should be picklable.
+
+    Arguments:
+        key -- Function mapping each element to a key. This key will 
+            be used to decide which elements are similar. 
+        key_pipe -- Function mapping each key to a pipe.
+
+    Keyword Arguments:
+        workers -- Number of worker processes, or None for the number of CPUs (default None).
+        batch -- Number of elements shipped to a worker at a time (default 1024).
+
+    See Also:
+        :func:`dagpype.group`
+        :func:`dagpype.parallel`
+
+    Example:
+
+    >>> source([(1, 1), (13, 0), (1, 455)]) | \\
+    ...     parallel_group(
+    ...         lambda p : p[0], 
+    ...         lambda k : sink(k) + count(),
+    ...         workers = 2) | \\
+    ...     to_list()
+    [(1, 2), (13, 1)]
+    """
+
+    workers_ = multiprocessing.cpu_count() if workers is None else workers
+    if workers_ < 1:
+        raise InvalidParamError('workers', workers, 'Must be positive')
+    if batch < 1:
+        raise InvalidParamError('batch', batch, 'Must be positive')
+
+    @filters
+    def _dagpype_internal_fn_act(target):
+        d = _GroupDispatcher(key, key_pipe, workers_, batch)
+        try:
+            try:
+                while True:
+                    d.push((yield))
+            except GeneratorExit:
+                for r in d.finish():
+                    target.send(r)
+                target.close()
+        finally:
+            d.close()
+
+    @batch_filters
+    def _dagpype_internal_fn_batch_act(target):
+        d = _GroupDispatcher(key, key_pipe, workers_, batch)
+        try:
+            try:
+                while True:
+                    d.extend((yield))
+            except GeneratorExit:
+                res = d.finish()
+                if len(res) > 0:
+                    target.send(res)
+                target.close()
+        finally:
+            d.close()
+
+    return _with_batch(_dagpype_internal_fn_act, _dagpype_internal_fn_batch_act)
+
+
+def _range_lines(stream, begin, end, header):
+    if header is not None:
+        yield header
+    stream.seek(begin)
+    while begin < end:
+        l = stream.readline()
+        if len(l) == 0:
+            break
+        begin += len(l)
+        yield l
+
+
+def _reduce_partition(key_partition):
+    key, partition = key_partition
+    pipe_factory, target = _worker_pipes[key]
+    if not isinstance(partition, tuple):
+        return pipe_factory(partition) | target
+    f_name, begin, end, header = partition
+    with open(f_name, 'rb') as stream:
+        return pipe_factory(_range_lines(stream, begin, end, header)) | target
+
+
+def _split_file(f_name, num, header):
+    """
+    Splits a file into num newline-aligned byte ranges. If header, the first line is repeated
+        at the start of every range but the first.
+    """
+    size = os.path.getsize(f_name)
+    with open(f_name, 'rb') as stream:
+        header_ = stream.readline() if header else None
+        bounds = [0]
+        for i in range(1, num):
+            pos = max(size * i // num, bounds[-1])
+            if pos > 0:
+                stream.seek(pos - 1)
+                stream.readline()
+                pos = stream.tell()
+            bounds.append(pos)
+        bounds.append(size)
+    return [(f_name, b, e, header_ if i > 0 else None) \
+        for i, (b, e) in enumerate(zip(bounds[: -1], bounds[1: ])) if e > b]
+
+
+__all__ += ['parallel_reduce']
+def parallel_reduce(file_or_paths, pipe_factory, target, workers = None, header = True):
+    """
+    Reduces a file, or a sequence of files, in a pool of worker processes. The input is split
+        into partitions, each partition is reduced by a worker into a partial state,
+        and the partial states are merged.
+
+    Arguments:
+        file_or_paths -- Either the name of a file, which is split into newline-aligned
+            byte ranges, or a sequence of names of files, each of which is a partition.
+        pipe_factory -- Function taking a partition and returning a source pipe (e.g., 
+            lambda s : stream_vals(s, b'wind')). A partition is either the name of a file, 
+            or a binary stream of lines.
+        target -- Mergeable target (see partial_state).
+
+    Keyword Arguments:
+        workers -- Number of worker processes, or None for the number of CPUs (default None).
+        header -- Whether the first line of a split file is a header, repeated at the start of
+            each partition (default True).
+
+    See Also:
+        :func:`dagpype.partial_state`
+        :func:`dagpype.parallel`
+
+    Example:
+
+    >>> # Equivalent to stream_vals('meteo.csv', b'wind') | mean() + stddev()
+    >>> m, s = parallel_reduce('meteo.csv', lambda s : stream_vals(s, b'wind'), mean() + stddev())
+    """
+
+    workers_ = multiprocessing.cpu_count() if workers is None else workers
+    if workers_ < 1:
+        raise InvalidParamError('workers', workers, 'Must be positive')
+
+    if isinstance(file_or_paths, str):
+        partitions = _split_file(file_or_paths, workers_, header)
+    else:
+        partitions = list(file_or_paths)
+
+    key = next(_worker_keys)
+    _worker_pipes[key] = (pipe_factory, partial_state(target))
+    try:
+        pool = _make_pool(workers_)
+        try:
+            states = pool.imap(_reduce_partition, [(key, p) for p in partitions])
+            return merge_states(target, states)
+        finally:
+            pool.terminate()
+    finally:
+        del _worker_pipes[key]
@@ -0,0 +1,168 @@
+"""
+Per-stage profiling of pipes.
+"""
+
+
+import timeit
+
+from dagpype._core import _Piped, _SnkPiped, _SnkFannedPiped, _Chainer, _FinalActor, _stage_name, _rewrite
+from dagpype._core import InvalidParamError
+from dagpype import _core
+
+
+__all__ = []
+
+
+class _Probe(object):
+    """
+    Counts the elements a stage receives and sends, and times the calls to it and to its
+        target.
+    """
+
+    def __init__(self, name, pos, src):
+        self.name, self.pos, self.src = name, pos, src
+        self.n_in, self.n_out, self.inclusive, self.downstream = 0, 0, 0., 0.
+
+    def in_(self, target, batch):
+        clock = timeit.default_timer
+        try:
+            while True:
+                e = (yield)
+                self.n_in += len(e) if batch else 1
+                t = clock()
+                try:
+                    target.send(e)
+                except StopIteration:
+                    return
+                finally:
+                    self.inclusive += clock() - t
+        except GeneratorExit:
+            t = clock()
+            try:
+                target.close()
+            finally:
+                self.inclusive += clock() - t
+
+    def out(self, target, batch):
+        clock = timeit.default_timer
+        try:
+            while True:
+                e = (yield)
+                self.n_out += len(e) if batch else 1
+                t = clock()
+                try:
+                    target.send(e)
+                except StopIteration:
+                    return
+                finally:
+                    self.downstream += clock() - t
+        except GeneratorExit:
+            t = clock()
+            try:
+                target.close()
+            finally:
+                self.downstream += clock() - t
+
+    def stats(self):
+        exclusive = max(self.inclusive - self.downstream, 0.)
+        n = self.n_out if self.src else self.n_in
+        return {
+            'stage': self.name,
+            'position': '.'.join(str(p) for p in self.pos),
+            'in': None if self.src else self.n_in,
+            'out': self.n_out,
+            'inclusive': self.inclusive,
+            'exclusive': exclusive,
+            'rate': n / exclusive if exclusive > 0 else None}
+
+
+class _Profiler(object):
+    def __init__(self):
+        self.probes = []
+
+    def probe(self, fn, pos, src):
+        # The stages finalizing mergeable targets (e.g., sum_) are accounted to these targets.
+        if getattr(fn, '_dagpype_reduce', None) is not None:
+            return None
+        p = _Probe(_stage_name(fn), pos, src)
+        self.probes.append(p)
+        return p
+
+
+class _ProfiledSnkPiped(_Piped):
+    def __init__(self, fns, profiler):
+        self._fns, self._profiler = fns, profiler
+
+    def connect_src(self, prev):
+        self._profiler.probes = []
+        f = _FinalActor()
+        fns = prev._fns + self._fns
+        fns = _rewrite(fns) if _core._optimization else fns
+        gen = _Chainer(fns, f.gen, batch = True, src = True, profiler = self._profiler).gen
+        f.pump(gen)
+        return f.res()
+
+    def connect_mid(self, prev):
+        return _ProfiledSnkPiped(prev._fns + self._fns, self._profiler)
+
+    def stats(self):
+        """
+        Returns a list of the statistics of each stage of the last run, in pipe order.
+            Each is a dict with the keys 'stage' (name of the stage's function, e.g., 'filt'),
+            'position' (e.g., '2.1.0' for the first stage of the second branch of a fan
+            which is the third stage), 'in' and 'out' (numbers of elements received and sent;
+            'in' is None for sources), 'inclusive' and 'exclusive' (seconds spent in the
+            stage including and excluding its targets), and 'rate' (elements processed per
+            exclusive second, or None).
+        """
+        probes = sorted(self._profiler.probes, key = lambda p : p.pos)
+        return [p.stats() for p in probes]
+
+    def report(self):
+        """
+        Returns the statistics of the last run (see stats) as a text table.
+        """
+        def fmt(c, v):
+            if v is None:
+                return '-'
+            if c == 'rate':
+                return '%.0f' % v
+            return '%.4f' % v if isinstance(v, float) else str(v)
+
+        cols = ['position', 'stage', 'in', 'out', 'inclusive', 'exclusive', 'rate']
+        rows = [cols] + [[fmt(c, s[c]) for c in cols] for s in self.stats()]
+        widths = [max(len(r[i]) for r in rows) for i in range(len(cols))]
+        return '\n'.join(
+            '  '.join(v.ljust(w) if i < 2 else v.rjust(w) for i, (v, w) in enumerate(zip(r, widths))) \
+            for r in rows)
+
+
+__all__ += ['profile']
+def profile(target):
+    """
+    Transforms a target into one which records per-stage statistics of the pipes it runs:
+        the numbers of elements each stage receives and sends, the time spent in each stage
+        including and excluding its targets, and its rate. The statistics of the last run
+        are returned by the stats (list of dicts) and report (text table) methods of the
+        returned target. Stages are profiled as rewritten (see optimization) but unfused
+        (see fusion), and each is wrapped by probes, so the pipe runs slower than usual.
+
+    Arguments:
+        target -- Target (e.g., to_list(), or mean() + stddev()).
+
+    See Also:
+        :func:`dagpype.fusion`
+        :func:`dagpype.optimization`
+
+    Example:
+
+    >>> p = profile(filt(lambda x : 2 * x) | sum_())
+    >>> source(range(10)) | p
+    90
+    >>> [(s['stage'], s['in'], s['out']) for s in p.stats()]
+    [('source', None, 10), ('filt', 10, 10), ('sum_', 10, 1)]
+    >>> print(p.report())
+    """
+    if not isinstance(target, (_SnkPiped, _SnkFannedPiped)):
+        raise InvalidParamError('target', target, 'Must be a target')
+    return _ProfiledSnkPiped(target.simple(), _Profiler())
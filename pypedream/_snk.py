@@ -4,8 +4,11 @@ import collections
 import random
 import types
 import itertools
+import functools
+import operator
 
-from dagpype._core import sinks
+from dagpype._core import sinks, batch_sinks, _with_batch, NoResultError
+from dagpype._core import _mergeable, _merge_non_empty, _finalize_non_empty, _add_states, _node
 import dagpype_c
 _has_c_line_writer = 'line_writer' in dir(dagpype_c)
 
@@ -124,7 +127,7 @@ def to_stream(stream, names = None, delimit = b',', line_terminator = b'\n', buf
         if isinstance(stream, bytes):
             stream_.close()
 
-    return _dagpype_internal_fn_act
+    return _node(_dagpype_internal_fn_act, 'to_stream', stream = stream, names = names, delimit = delimit)
 
 
 __all__ += ['sum_']
@@ -146,6 +149,7 @@ def sum_():
 
     @sinks
     def _dagpype_internal_fn_act(target):
+        s = None
         try:
             s = (yield)
             while True:
@@ -154,7 +158,24 @@ def sum_():
             target.send(s)
             target.close()
 
-    return _dagpype_internal_fn_act
+    @batch_sinks
+    def _dagpype_internal_fn_batch_act(target):
+        s = None
+        try:
+            l = (yield)
+            while not l:
+                l = (yield)
+            s = functools.reduce(operator.iadd, itertools.islice(l, 1, None), l[0])
+            while True:
+                s = functools.reduce(operator.iadd, (yield), s)
+        except GeneratorExit:
+            target.send(s)
+            target.close()
+
+    return _node(_mergeable(
+        _with_batch(_dagpype_internal_fn_act, _dagpype_internal_fn_batch_act),
+        _merge_non_empty(operator.add),
+        _finalize_non_empty), 'sum_')
 
 
 __all__ += ['count']
@@ -182,7 +203,20 @@ def count():
             target.send(n)
             target.close()
 
-    return _dagpype_internal_fn_act
+    @batch_sinks
+    def _dagpype_internal_fn_batch_act(target):
+        n = 0
+        try:
+            while True:
+                n += len((yield))
+        except GeneratorExit:
+            target.send(n)
+            target.close()
+
+    return _node(_mergeable(
+        _with_batch(_dagpype_internal_fn_act, _dagpype_internal_fn_batch_act),
+        operator.add,
+        lambda n : n), 'count')
 
 
 __all__ += ['nth']
@@ -221,7 +255,7 @@ def nth(n):
             except GeneratorExit:
                 target.close()
 
-        return _dagpype_internal_fn_act_p
+        return _node(_dagpype_internal_fn_act_p, 'nth', n = n)
 
     @sinks
     def _dagpype_internal_fn_act_n(target):
@@ -234,7 +268,7 @@ def nth(n):
                 target.send(q.popleft())
             target.close()
 
-    return _dagpype_internal_fn_act_n
+    return _node(_dagpype_internal_fn_act_n, 'nth', n = n)
 
 
 __all__ += ['to_list']
@@ -262,7 +296,7 @@ def to_list():
             target.send(l)    
             target.close()
 
-    return _dagpype_internal_fn_act
+    return _node(_dagpype_internal_fn_act, 'to_list')
 
 
 __all__ += ['to_dict']
@@ -318,11 +352,31 @@ def mean():
                 s += (yield)
                 n += 1
         except GeneratorExit:
-            if n > 0:
-                target.send(s / n)
+            target.send((s, n))
             target.close()
 
-    return _dagpype_internal_fn_act
+    @batch_sinks
+    def _dagpype_internal_fn_batch_act(target):
+        s, n = 0, 0
+        try:
+            while True:
+                l = (yield)
+                s = functools.reduce(operator.iadd, l, s)
+                n += len(l)
+        except GeneratorExit:
+            target.send((s, n))
+            target.close()
+
+    def finalize(state):
+        s, n = state
+        if n == 0:
+            raise NoResultError()
+        return s / n
+
+    return _node(_mergeable(
+        _with_batch(_dagpype_internal_fn_act, _dagpype_internal_fn_batch_act),
+        _add_states,
+        finalize), 'mean')
 
 
 __all__ += ['stddev']
@@ -359,12 +413,16 @@ def stddev(ddof = 1):
                 ss += e * e
                 n += 1
         except GeneratorExit:
-            if n > ddof:
-                res = math.sqrt((ss - s * s / float(n)) / (n - ddof))
-                target.send(res)
+            target.send((s, ss, n))
             target.close()
 
-    return _dagpype_internal_fn_act
+    def finalize(state):
+        s, ss, n = state
+        if n <= ddof:
+            raise NoResultError()
+        return math.sqrt((ss - s * s / float(n)) / (n - ddof))
+
+    return _node(_mergeable(_dagpype_internal_fn_act, _add_states, finalize), 'stddev', ddof = ddof)
 
 
 __all__ += ['corr']
@@ -412,9 +470,17 @@ def corr():
                 x, y = (yield)
                 c.push(float(x), float(y))
         except GeneratorExit:
-            target.send(c.corr())
+            target.send(c.state())
             target.close()
-    return _dagpype_internal_fn_act
+
+    def finalize(state):
+        n, sx, sy, sxx, syy, sxy = state
+        vx, vy = n * sxx - sx * sx, n * syy - sy * sy
+        if vx <= 0 or vy <= 0:
+            return float('nan')
+        return (n * sxy - sx * sy) / math.sqrt(vx) / math.sqrt(vy)
+
+    return _node(_mergeable(_dagpype_internal_fn_act, _add_states, finalize), 'corr')
 
 
 __all__ += ['sink']
@@ -481,18 +547,16 @@ def min_():
 
     @sinks
     def _dagpype_internal_fn_act(target):
-        has = False
+        m = None
         try:
             m = (yield)
-            has = True
             while True:
                 m = min((yield), m)
         except GeneratorExit:
-            if has:
-                target.send(m)
+            target.send(m)
             target.close()
 
-    return _dagpype_internal_fn_act
+    return _node(_mergeable(_dagpype_internal_fn_act, _merge_non_empty(min), _finalize_non_empty), 'min_')
 
 
 __all__ += ['max_']
@@ -511,18 +575,16 @@ def max_():
 
     @sinks
     def _dagpype_internal_fn_act(target):
-        has = False
+        m = None
         try:
             m = (yield)
-            has = True
             while True:
                 m = max((yield), m)
         except GeneratorExit:
-            if has:
-                target.send(m)
+            target.send(m)
             target.close()
 
-    return _dagpype_internal_fn_act
+    return _node(_mergeable(_dagpype_internal_fn_act, _merge_non_empty(max), _finalize_non_empty), 'max_')
 
 
 __all__ += ['size_rand_sample']
@@ -11,12 +11,12 @@ import itertools
 
 import _csv_utils
 try:
-    from ._core import Error
-    from ._core import sources, source
+    from ._core import Error, InvalidParamError
+    from ._core import sources, source, _source, _node, _projectable
     from ._csv_utils import UnknownNamedCSVColError
 except ValueError:
-    from _core import Error
-    from _core import sources, source
+    from _core import Error, InvalidParamError
+    from _core import sources, source, _source, _node, _projectable
     from _csv_utils import UnknownNamedCSVColError
 import dagpype_c
 
@@ -25,7 +25,7 @@ __all__ = []
 
 
 __all__ += ['stream_lines']
-def stream_lines(stream, rstrip = True):
+def stream_lines(stream, rstrip = True, mapped = False):
     """
     Streams the lines from some stream.
 
@@ -34,6 +34,10 @@ def stream_lines(stream, rstrip = True):
 
     Keyword Arguments:
         rstrip -- if True, right-strips lines (default True).
+        mapped -- If True and stream is a name of a file, maps the file to memory, and 
+            streams read-only views of the lines (memoryviews, or buffers in Python 2) 
+            instead of copies of them (default False). A view should not be kept beyond 
+            the pipe's run, as it keeps the file mapped.
 
     See Also:
         :func:`dagpype.stream_vals`
@@ -44,23 +48,52 @@ def stream_lines(stream, rstrip = True):
     >>> # Places a file's lines in a list.
     >>> stream_lines('data.csv') | to_list()
     ['wind rain', '1 2', '3 4', '5 6']
+    >>> # Counts the lines starting with b'#' in a file, without copying them.
+    >>> stream_lines('data.csv', mapped = True) | filt(pre = lambda l : l[: 1] == b'#') | count()
+    0
     """
 
+    if mapped and isinstance(stream, str):
+        lines = _MappedLines(stream, rstrip)
+        return _node(_source(lines, lines.close), 'stream_lines', stream = stream, mapped = mapped)
+
     @sources
     def _dagpype_internal_fn_act():
-        stream_ = open(stream, 'rb') if isinstance(stream, str) else stream
+        stream_, opened = _csv_utils.open_input(stream, False)
         
-        if rstrip:
-            for l in stream_:
-                yield l.rstrip()
-        else:
-            for l in stream_:
-                yield bytes(l);
+        try:
+            if rstrip:
+                for l in stream_:
+                    yield l.rstrip()
+            else:
+                for l in stream_:
+                    yield bytes(l);
+        finally:
+            if opened:
+                stream_.close()
 
-        if isinstance(stream, str):
-            stream_.close()
+    return _node(_dagpype_internal_fn_act, 'stream_lines', stream = stream, mapped = mapped)
 
-    return _dagpype_internal_fn_act
+
+class _MappedLines(object):
+    """
+    Views of the lines of a file mapped to memory, which stays mapped until closed (rather 
+        than until the views are exhausted, as batches of them may still be on their way).
+    """
+
+    def __init__(self, name, rstrip):
+        self._name, self._rstrip = name, rstrip
+        self._mapped = None
+
+    def __iter__(self):
+        self.close()
+        self._mapped = _csv_utils._Mapped(self._name)
+        return self._mapped.views(self._rstrip)
+
+    def close(self):
+        if self._mapped is not None:
+            self._mapped.close()
+            self._mapped = None
 
 
 __all__ += ['stream_vals']
@@ -69,9 +102,15 @@ def stream_vals(stream,
     types_ = None, 
     delimit = b',', 
     comment = None, 
-    skip_init_space = True):
+    skip_init_space = True,
+    where = None,
+    mapped = False,
+    infer_types = False):
     """
     Streams delimited (e.g., by commas for CSV files, or by tabs for TAB files) values as tuples.
+        Fields may be quoted as in RFC 4180: a field beginning with a double quote extends to 
+        the matching one, over any delimiters and newlines, a doubled quote within it standing
+        for a quote.
 
     Arguments:
         stream -- Either the name of a file or a *binary* stream. 
@@ -88,10 +127,22 @@ def stream_vals(stream,
         comment -- Comment-starting binary character or ``None`` (default). 
             Any character starting from this one until the line end will be ignored.
         skip_init_space -- Whether spaces starting a field will be ignored (default True).
+        where -- Predicate on the read fields (see field), or None (default). If given, only rows
+            satisfying it are streamed; it is evaluated before the fields are converted, so 
+            that the other rows cost no Python objects. 
+        mapped -- If True and stream is a name of a file, maps the file to memory, and parses
+            the lines in place, without copying them (default False). This pays off for 
+            repeated reads of large files (e.g., ones already in the page cache).
+        infer_types -- Either False (default), True, or a number of rows. If not False and 
+            types_ is None, the type of each column is inferred as the narrowest of int, 
+            float, and bytes parsing all its values in a sample of rows (the first rows - 
+            1000 for True, and, for names of files, rows at random offsets), so that values 
+            are read natively as these types, without further cast stages. 
 
     See Also:
         :func:`dagpype.csv_split`
         :func:`dagpype.stream_lines`
+        :func:`dagpype.field`
         :func:`dagpype.np.chunk_stream_vals`
 
     Examples:
@@ -102,19 +153,74 @@ def stream_vals(stream,
     >>> # Find the correlation between two indexed columns.
     >>> stream_vals('neat_data.csv', (0, 3)) | corr()
     -0.0840752963937695
+    >>> # Find the correlation on windy days only.
+    >>> stream_vals('meteo.csv', (b'wind', b'rain'), where = field(0) > 5) | corr()
+    >>> # Read each column as int, float, or bytes, by its values.
+    >>> stream_vals('employee.csv', (b'Name', b'EmpId'), infer_types = True) | to_list()
+    [(b'Harry', 3415), (b'Sally', 2241), (b'George', 3401), (b'Harriet', 2202), (b'Nelson', 2455)]
     """
 
+    infer = types_ is None and infer_types is not False
+    if not infer:
+        _csv_utils.check_where(cols, types_, where)
+
     @sources
     def _dagpype_internal_fn_act():
-        stream_ = open(stream, 'rb') if isinstance(stream, str) else stream
+        stream__, types__ = stream, types_
+        if infer:
+            stream__, types__ = _csv_utils.infer(stream, cols, delimit, comment, skip_init_space, infer_types)
+            _csv_utils.check_where(cols, types__, where)
+        stream_, opened = _csv_utils.open_input(stream__, mapped)
+
+        try:
+            for t in _csv_utils.read(stream_, cols, types__, delimit, comment, skip_init_space, where):
+                yield t
+        finally:
+            if opened:
+                stream_.close()
+
+    def project(kind, params):
+        projected = _csv_utils.project_where(cols, types_, where, kind, params)
+        if projected is None:
+            return None
+        c, t, w = projected
+        return stream_vals(stream, c, t, delimit, comment, skip_init_space, w, mapped, infer_types)._fns[0]
+
+    return _projectable(
+        _node(_dagpype_internal_fn_act, 'stream_vals', stream = stream, cols = cols, types_ = types_, where = where),
+        project)
+
+
+__all__ += ['field']
+def field(ind):
+    """
+    Returns a field of the rows read by stream_vals or np.chunk_stream_vals, whose comparisons
+        (<, <=, >, >=, ==, != against a number, or ==, != against bytes), ranges (between),
+        and memberships (isin) are predicates. These can be combined by & (and), | (or), 
+        and ~ (not), and passed as these readers' where parameter; the readers then evaluate
+        them on the fields as parsed, and rejected rows never become Python objects.
+        Predicates are also callable on rows, and a filt whose pre is one (and which has 
+        neither trans nor post) directly following such a reader is folded into the
+        reader (see optimization). Comparisons of empty fields are false.
 
-        for t in _csv_utils.read(stream_, cols, types_, delimit, comment, skip_init_space):
-            yield t
+    Arguments:
+        ind -- Index of the field within the rows read (e.g., 1 for b'rain' in 
+            stream_vals('meteo.csv', (b'wind', b'rain'))).
 
-        if isinstance(stream, str):
-            stream_.close()
+    See Also:
+        :func:`dagpype.stream_vals`
+        :func:`dagpype.np.chunk_stream_vals`
+        :func:`dagpype.filt`
 
-    return _dagpype_internal_fn_act
+    Example:
+
+    >>> stream_vals('meteo.csv', (b'wind', b'rain'), where = (field(0) > 5) & field(1).between(1, 3)) | count()
+    >>> # Equivalent to (and, by default, rewritten to) the above.
+    >>> stream_vals('meteo.csv', (b'wind', b'rain')) | filt(pre = (field(0) > 5) & field(1).between(1, 3)) | count()
+    """
+    if not isinstance(ind, int) or ind < 0:
+        raise InvalidParamError('ind', ind, 'Must be a nonnegative integer')
+    return _csv_utils._Field(ind)
 
 
 __all__ += ['parse_xml']
@@ -141,12 +247,13 @@ def parse_xml(stream, events = ('end',)):
         else: 
             reader = stream
 
-        for event, elem in _element_tree.iterparse(reader, events):
-            yield (event, elem)
-            elem.clear()
-
-        if isinstance(stream, str):
-            reader.close()
+        try:
+            for event, elem in _element_tree.iterparse(reader, events):
+                yield (event, elem)
+                elem.clear()
+        finally:
+            if isinstance(stream, str):
+                reader.close()
 
     return _dagpype_internal_fn_act
 
@@ -4,8 +4,14 @@ Filter operations employing subgroup targets (group, equi-join).
 
 
 import types
-
-from dagpype._core import filters, sub_pipe_target
+import tempfile
+import collections
+try:
+    import cPickle as _pickle
+except ImportError:
+    import pickle as _pickle
+
+from dagpype._core import filters, sub_pipe_target, _Chainer, _missing, Error, InvalidParamError
 from dagpype._snk import to_list
 from dagpype._filt import filt
 
@@ -16,6 +22,24 @@ from dagpype._filt import filt
 __all__ = []
 
 
+class UnsortedKeyError(Error, ValueError):
+    """
+    Indicates a key decreased in a stream which should be sorted by it (see merge_join).
+    """
+
+    def __init__(self, key, prev_key):
+        Error.__init__(self, 'key %r follows key %r' % (key, prev_key))
+        self._key = key
+
+    def key(self):
+        """
+        Returns the offending key.
+        """
+
+        return self._key
+__all__ += ['UnsortedKeyError']
+
+
 __all__ += ['consec_group']
 def consec_group(key, key_pipe):
     """
@@ -64,8 +88,64 @@ def consec_group(key, key_pipe):
     return _dagpype_internal_fn_act
 
 
+# Number of files among which the elements of groups beyond the cap of group are spilled.
+_num_spills = 16
+
+
+class _SpillingGroup(object):
+    """
+    Sends elements through at most max_live sub-pipes (one per key) at a time. Elements
+        of other keys are spilled to files by hashes of their keys, and each file is 
+        later replayed through a _SpillingGroup hashing differently.
+    """
+
+    def __init__(self, key, key_pipe, target, max_live, depth):
+        self._key, self._key_pipe, self._target = key, key_pipe, target
+        self._max_live, self._depth = max_live, depth
+        self._pipes, self._targets, self._spills = [], dict([]), None
+
+    def send(self, e):
+        k = self._key(e)
+        t = self._targets.get(k)
+        if t is None:
+            if len(self._pipes) >= self._max_live:
+                self._spill(k, e)
+                return
+            t = self._targets[k] = sub_pipe_target(self._key_pipe(k), self._target)
+            self._pipes.append(t)
+        try:
+            t.send(e)
+        except Exception as e:
+            pass
+
+    def _spill(self, k, e):
+        if self._spills is None:
+            self._spills = [tempfile.TemporaryFile() for _ in range(_num_spills)]
+        _pickle.dump(e, self._spills[hash((self._depth, k)) % _num_spills], -1)
+
+    def close(self):
+        for p in self._pipes:
+            p.close()
+        self._pipes, self._targets = [], dict([])
+        spills, self._spills = self._spills, None
+        for i, f in enumerate(spills or []):
+            try:
+                f.seek(0)
+                g = _SpillingGroup(self._key, self._key_pipe, self._target, self._max_live, self._depth + 1)
+                while True:
+                    try:
+                        e = _pickle.load(f)
+                    except EOFError:
+                        break
+                    g.send(e)
+                g.close()
+            finally:
+                f.close()
+                spills[i] = None
+
+
 __all__ += ['group']
-def group(key, key_pipe):
+def group(key, key_pipe, max_live = None):
     """
     Groups not-necessarily-consecutive similar elements by sending all such elements
         through an ad-hoc create pipe.
@@ -75,6 +155,16 @@ def group(key, key_pipe):
             be used to decide which elements are similar. 
         key_pipe -- Function mapping each key to a pipe.
 
+    Keyword Arguments:
+        max_live -- Maximal number of sub-pipes existing at a time, or None for no maximum
+            (default None). If given, once this number of keys was encountered, the 
+            elements of further keys are spilled to temporary files (and so must be 
+            picklable), partitioned by the hashes of their keys; after the input ends, 
+            the live sub-pipes are closed, and each partition is grouped in turn (spilling
+            again if needed). The memory is then bounded by max_live sub-pipes, and the 
+            results of the groups are the same, but those of spilled groups are sent 
+            after those of the others.
+
     See Also:
         :func:`dagpype.consec_group`
 
@@ -87,8 +177,28 @@ def group(key, key_pipe):
     ...         lambda k : sink(k) + count()) | \\
     ...     to_list()
     [(1, 2), (13, 1)]
+    >>> # Count the occurrences of each user, with at most 100000 counts in memory.
+    >>> c = stream_vals('log.csv', b'user', bytes) | \\
+    ...     group(lambda u : u, lambda u : sink(u) + count(), max_live = 100000) | \\
+    ...     to_dict()
     """    
 
+    if max_live is not None and max_live < 1:
+        raise InvalidParamError('max_live', max_live, 'Must be positive')
+
+    @filters
+    def _dagpype_internal_fn_spill_act(target):
+        g = _SpillingGroup(key, key_pipe, target, max_live, 0)
+        try:
+            while True:
+                g.send((yield))
+        except GeneratorExit:
+            g.close()
+            target.close()
+
+    if max_live is not None:
+        return _dagpype_internal_fn_spill_act
+
     @filters
     def _dagpype_internal_fn_act(target):
         pipes, targets = [], dict([])
@@ -242,3 +352,315 @@ def dict_join(
 
     return _dagpype_internal_fn_act
 
+
+
+# Number of times the partitions of hash_join are partitioned again before they are joined in memory.
+_max_join_depth = 4
+
+
+def _dump_spills(spills, depth, k, e):
+    _pickle.dump((k, e), spills[hash((depth, k)) % _num_spills], -1)
+
+
+def _load_spill(f):
+    f.seek(0)
+    while True:
+        try:
+            yield _pickle.load(f)
+        except EOFError:
+            return
+
+
+class _HashJoin(object):
+    """
+    Joins probe elements with a table of build elements. If the table grows beyond
+        max_build elements, the build and probe elements are spilled to files by hashes of
+        their keys, and each pair of files is later joined by a _HashJoin hashing 
+        differently.
+    """
+
+    def __init__(self, common_pipe, target, probe_only_target, build_only_target, max_build, depth):
+        self._common_pipe, self._target = common_pipe, target
+        self._probe_only_target, self._build_only_target = probe_only_target, build_only_target
+        self._max_build, self._depth = max_build, depth
+        self._table, self._num_build, self._targets = dict([]), 0, dict([])
+        self._build_spills, self._probe_spills = None, None
+
+    def build(self, k, b):
+        if self._build_spills is not None:
+            _dump_spills(self._build_spills, self._depth, k, b)
+            return
+        self._table.setdefault(k, []).append(b)
+        self._num_build += 1
+        if self._max_build is None or self._num_build <= self._max_build or self._depth >= _max_join_depth:
+            return
+        self._build_spills = [tempfile.TemporaryFile() for _ in range(_num_spills)]
+        self._probe_spills = [tempfile.TemporaryFile() for _ in range(_num_spills)]
+        for k, bs in self._table.items():
+            for b in bs:
+                _dump_spills(self._build_spills, self._depth, k, b)
+        self._table = None
+
+    def probe(self, k, e):
+        if self._probe_spills is not None:
+            _dump_spills(self._probe_spills, self._depth, k, e)
+            return
+        targets = self._targets.get(k)
+        if targets is None:
+            bs = self._table.get(k)
+            if bs is None:
+                if self._probe_only_target is not None:
+                    self._probe_only_target.send(e)
+                return
+            targets = self._targets[k] = [sub_pipe_target(self._common_pipe(k, b), self._target) for b in bs]
+        for t in targets:
+            t.send(e)
+
+    def close(self):
+        if self._build_spills is None:
+            for targets in self._targets.values():
+                for t in targets:
+                    t.close()
+            if self._build_only_target is not None:
+                for k, bs in self._table.items():
+                    if k not in self._targets:
+                        for b in bs:
+                            self._build_only_target.send(b)
+            self._table, self._targets = None, None
+            return
+
+        try:
+            for build_f, probe_f in zip(self._build_spills, self._probe_spills):
+                j = _HashJoin(
+                    self._common_pipe, self._target, self._probe_only_target, self._build_only_target, 
+                    self._max_build, self._depth + 1)
+                for k, b in _load_spill(build_f):
+                    j.build(k, b)
+                build_f.close()
+                for k, e in _load_spill(probe_f):
+                    j.probe(k, e)
+                j.close()
+        finally:
+            for f in self._build_spills + self._probe_spills:
+                f.close()
+
+
+__all__ += ['hash_join']
+def hash_join(
+        build_pipe,
+        build_key,
+        probe_key,
+        common_pipe,
+        probe_only_pipe = None,
+        build_only_pipe = None,
+        max_build = None):
+    """
+    Performs an SQL-style join with the elements of another stream (like dict_join, but 
+        without requiring these elements to be in a dictionary). The elements of 
+        build_pipe are placed in a table by their keys; if there are more than max_build
+        of them, they are instead spilled to temporary files, partitioned by the hashes of
+        their keys (so that the elements and keys must be picklable), as are the elements 
+        joined with them, and each partition is joined in turn (a grace hash join).
+
+    Arguments:
+        build_pipe -- Source pipe of the elements with which to join.
+        build_key -- Function mapping each element of build_pipe to a key. 
+        probe_key -- Function mapping each element to a key. This key will be used to 
+            decide with which elements of build_pipe (if any) to join.
+        common_pipe -- Function taking a key and an element of build_pipe, and returning a 
+            pipe. This pipe will be used for all elements matching the key.
+
+    Keyword Arguments:
+        probe_only_pipe -- Pipe used for all elements not matching any element of 
+            build_pipe (default None).
+        build_only_pipe -- Pipe used for all elements of build_pipe not matching any 
+            element (default None).
+        max_build -- Maximal number of elements of build_pipe kept in memory, or None for
+            no maximum (default None). If exceeded, the results of all pipes are sent
+            after the stream ends.
+
+    See Also:
+        :func:`dagpype.dict_join`
+        :func:`dagpype.merge_join`
+
+    Example:
+
+    >>> # Create a dictionary mapping employees to managers (see dict_join):
+    >>> d = stream_vals('employee.csv', (b'Name', b'EmpId', b'DeptName'), (bytes, int, bytes)) | \\
+    ...     hash_join(
+    ...         stream_vals('dept.csv', (b'DeptName', b'Manager'), (bytes, bytes)),
+    ...         lambda dept_manager : dept_manager[0],
+    ...         lambda name_id_dept : name_id_dept[2],
+    ...         lambda dept, dept_manager : filt(lambda name_id_dept : (name_id_dept[0], dept_manager[1])),
+    ...         filt(lambda name_id_dept : (name_id_dept[0], None)),
+    ...         max_build = 1000000) | \\
+    ...     to_dict()
+    >>> assert d[b'Harriet'] == b'Harriet'
+    >>> assert d[b'Nelson'] is None
+    """
+
+    if max_build is not None and max_build < 1:
+        raise InvalidParamError('max_build', max_build, 'Must be positive')
+
+    def _build(j):
+        while True:
+            b = (yield)
+            j.build(build_key(b), b)
+
+    @filters
+    def _dagpype_internal_fn_act(target):
+        probe_only_target = sub_pipe_target(probe_only_pipe, target) if probe_only_pipe is not None else None
+        build_only_target = sub_pipe_target(build_only_pipe, target) if build_only_pipe is not None else None
+        j = _HashJoin(common_pipe, target, probe_only_target, build_only_target, max_build, 0)
+        b = _build(j)
+        next(b)
+        sub_pipe_target(build_pipe, b)
+        try:
+            while True:
+                e = (yield)
+                j.probe(probe_key(e), e)
+        except GeneratorExit:
+            j.close()
+            if probe_only_target is not None:
+                probe_only_target.close()
+            if build_only_target is not None:
+                build_only_target.close()
+            target.close()
+
+    return _dagpype_internal_fn_act
+
+
+class _SortedPuller(object):
+    """
+    Pulls the elements of a source pipe one at a time (running the pipe a step whenever
+        the elements it sent so far are exhausted), checking they are sorted by a key.
+    """
+
+    def __init__(self, pipe, key):
+        self._key, self._pending = key, collections.deque()
+        collect = self._collect()
+        next(collect)
+        self._gen = _Chainer(pipe.simple(), collect, batch = True, src = True).gen
+        self._done, self._prev_key = False, _missing
+
+    def _collect(self):
+        pending = self._pending
+        try:
+            while True:
+                pending.append((yield))
+        except GeneratorExit:
+            pass
+
+    def peek(self):
+        """
+        Returns the next (key, element) pair, or None if there are no more elements.
+        """
+        while not self._pending and not self._done:
+            try:
+                self._gen.send(True)
+            except StopIteration:
+                self._done = True
+        if not self._pending:
+            return None
+        e = self._pending[0]
+        return self._key(e), e
+
+    def pop(self):
+        k, e = self.peek()
+        self._pending.popleft()
+        if self._prev_key is not _missing and k < self._prev_key:
+            raise UnsortedKeyError(k, self._prev_key)
+        self._prev_key = k
+        return e
+
+    def close(self):
+        self._gen.close()
+
+
+__all__ += ['merge_join']
+def merge_join(other_source, key, other_key, how = 'inner'):
+    """
+    Performs an SQL-style join with the elements of another stream, where both streams 
+        are sorted by their keys (e.g., files keyed by timestamps). Both streams are 
+        advanced in lockstep, and only the elements of the other stream matching the
+        current key are held in memory. Sends on pairs of matching elements from the two 
+        streams; a key appearing multiple times in both streams results in all 
+        combinations.
+
+    Arguments:
+        other_source -- Source pipe of the elements with which to join.
+        key -- Function mapping each element to a key.
+        other_key -- Function mapping each element of other_source to a key.
+        
+    Keyword Arguments:
+        how -- One of 'inner' (send on only pairs of matching elements), 'left' (also send 
+            on (e, None) for each element e not matching any element of other_source), or 
+            'outer' (also send on (None, o) for each element o of other_source not 
+            matching any element) (default 'inner').
+
+    Raises:
+        UnsortedKeyError -- If a key is smaller than that of a previous element of the 
+            same stream.
+
+    See Also:
+        :func:`dagpype.dict_join`
+        :func:`dagpype.hash_join`
+
+    Examples:
+
+    >>> source([(1, 'a'), (2, 'b'), (2, 'c'), (4, 'd')]) | \\
+    ...     merge_join(source([(2, 'x'), (3, 'y'), (4, 'z')]), lambda e : e[0], lambda o : o[0]) | \\
+    ...     to_list()
+    [((2, 'b'), (2, 'x')), ((2, 'c'), (2, 'x')), ((4, 'd'), (4, 'z'))]
+
+    >>> source([(1, 'a'), (2, 'b')]) | \\
+    ...     merge_join(source([(2, 'x'), (3, 'y')]), lambda e : e[0], lambda o : o[0], how = 'outer') | \\
+    ...     to_list()
+    [((1, 'a'), None), ((2, 'b'), (2, 'x')), (None, (3, 'y'))]
+    """
+
+    if how not in ('inner', 'left', 'outer'):
+        raise InvalidParamError('how', how, "Must be 'inner', 'left', or 'outer'")
+    outer = how == 'outer'
+    unmatched = how != 'inner'
+
+    @filters
+    def _dagpype_internal_fn_act(target):
+        other = _SortedPuller(other_source, other_key)
+        group, prev_k = None, _missing
+        try:
+            try:
+                while True:
+                    e = (yield)
+                    k = key(e)
+                    if prev_k is _missing or k != prev_k:
+                        if prev_k is not _missing and k < prev_k:
+                            raise UnsortedKeyError(k, prev_k)
+                        group = []
+                        while True:
+                            o = other.peek()
+                            if o is None or not o[0] < k:
+                                break
+                            o = other.pop()
+                            if outer:
+                                target.send((None, o))
+                        while True:
+                            o = other.peek()
+                            if o is None or o[0] != k:
+                                break
+                            group.append(other.pop())
+                        prev_k = k
+                    if group:
+                        for o in group:
+                            target.send((e, o))
+                    elif unmatched:
+                        target.send((e, None))
+            except GeneratorExit:
+                if outer:
+                    while other.peek() is not None:
+                        target.send((None, other.pop()))
+                target.close()
+        finally:
+            other.close()
+
+    return _dagpype_internal_fn_act
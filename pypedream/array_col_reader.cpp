@@ -1,14 +1,20 @@
 #include <Python.h>
 #include <structmember.h>
+#define PY_ARRAY_UNIQUE_SYMBOL dagpype_c
+#define NO_IMPORT_ARRAY
 #include <numpy/arrayobject.h>
 
+#include <algorithm>
 #include <cstdlib>
-#include <cstdlib>
+#include <cstring>
 #include <iostream>
+#include <new>
 #include <vector>
 
 #include "array_col_reader.hpp"
 #include "_line_to_array.hpp"
+#include "row_pred.hpp"
+#include "line_source.hpp"
 
 using namespace std;
 
@@ -16,7 +22,7 @@ struct ArrayColReader
 {
     PyObject_HEAD
 
-    PyObject *input_iter;
+    _LineSource input;
 
     char delimit;
     bool has_comment;
@@ -36,7 +42,14 @@ struct ArrayColReader
 
     long max_elems;
 
+    // Arrays of the numeric columns (NULL for string columns).
     PyArrayObject * * bufs;
+
+    // Values, and end offsets of the values, of the string columns in the current chunk.
+    vector<char> * str_vals;
+    vector<long> * str_ends;
+
+    _RowPred pred;
 };
 
 extern PyTypeObject ArrayColReaderType;
@@ -44,7 +57,8 @@ extern PyTypeObject ArrayColReaderType;
 extern "C" int
 array_col_reader_traverse(ArrayColReader * self, visitproc visit, void *arg)
 {
-    Py_VISIT(self->input_iter);
+    if (line_source_traverse(self->input, visit, arg) != 0)
+        return -1;
 
     for (long j = 0; j < self->num_types; ++j)
         Py_VISIT(self->bufs[j]);
@@ -55,7 +69,7 @@ array_col_reader_traverse(ArrayColReader * self, visitproc visit, void *arg)
 extern "C" void
 array_col_reader_dealloc(ArrayColReader * self)
 {
-    Py_XDECREF(self->input_iter);
+    line_source_free(self->input);
 
     if (self->cols != NULL)
         PyMem_Free(self->cols);
@@ -75,6 +89,9 @@ array_col_reader_dealloc(ArrayColReader * self)
             Py_XDECREF(self->bufs[i]);
         PyMem_Free(self->bufs);
     }
+    delete [] self->str_vals;
+    delete [] self->str_ends;
+    row_pred_free(self->pred);
 
     PyObject_GC_UnTrack(self);
     PyObject_GC_Del(self);
@@ -97,11 +114,6 @@ array_col_reader_parse_missing_vals(PyObject * iterator, long num_types, bool &
 
     for (long j = 0; j < num_types; ++j) {
         parsed_missing_vals[j] = make_pair(missing_vals[j], missing_vals[j] + strlen(missing_vals[j]));
-        if (strlen(missing_vals[j]) >= max_field_len - 1) {
-            err = true;
-            PyErr_Format(PyExc_IndexError, "Missing value too long - max %d", max_field_len - 1);
-            return NULL;
-        }
     }
 
     return parsed_missing_vals;
@@ -126,6 +138,12 @@ parse_arrays(PyObject * iterator, long & num, bool & err)
             return NULL;
         }
 
+        if (obj == Py_None) {
+            Py_DECREF(obj);
+            arrays[num++] = NULL;
+            continue;
+        }
+
         PyArrayObject * const a = reinterpret_cast<PyArrayObject *>(obj);
 
         if (!is_delightful_array(a)) {
@@ -164,18 +182,24 @@ array_col_reader_new(PyTypeObject * type, PyObject *args, PyObject *keyword_args
     }   
 
     self->num_cols = self->num_unique_cols = self->num_copy_cols = 0;
-    self->input_iter = NULL;
+    line_source_init(self->input);
     self->cols = self->unique_cols = self->copy_cols = NULL;
     self->num_types = 0;
     self->types = NULL;
     self->missing_vals = NULL;
+    self->bufs = NULL;
+    self->str_vals = NULL;
+    self->str_ends = NULL;
+    row_pred_init(self->pred);
 
     // TRACE("Parsing");   
     PyObject * iterator, * comment, * cols_iterator, * unique_cols_iterator, * copy_cols_iterator, 
         * types_iterator, * missing_vals_iterator, * bufs_iterator;
+    PyObject * pred = Py_None;
+    long offset = -1;
     if (!PyArg_ParseTuple(
             args,
-            "OcOiiOOOlOOlO",
+            "OcOiiOOOlOOlO|Ol",
             &iterator,
             &self->delimit, &comment, &self->skip_init_space,
             &self->single,
@@ -184,14 +208,18 @@ array_col_reader_new(PyTypeObject * type, PyObject *args, PyObject *keyword_args
             &types_iterator,
             &missing_vals_iterator,
             &self->max_elems,
-            &bufs_iterator)) {
+            &bufs_iterator,
+            &pred, &offset)) {
         PyErr_SetString(PyExc_TypeError, "Failed to parse stuff");
         Py_DECREF(self);
         return NULL;
     }
 
+    if (!line_source_parse(iterator, offset, self->input)) {
+        Py_DECREF(self);
+        return NULL;
+    }
     bool err = false;
-    self->input_iter = PyObject_GetIter(iterator);
     _parse_comment(comment, self->has_comment, self->comment);
     self->cols = parse_longs(cols_iterator, self->num_cols, err);
     self->unique_cols = parse_longs(unique_cols_iterator, self->num_unique_cols, err);
@@ -199,13 +227,22 @@ array_col_reader_new(PyTypeObject * type, PyObject *args, PyObject *keyword_args
     self->types = parse_longs(types_iterator, self->num_types, err);
     self->missing_vals = array_col_reader_parse_missing_vals(missing_vals_iterator, self->num_types, err);
     self->bufs = parse_arrays(bufs_iterator, self->num_types, err);
-    if (self->input_iter == NULL || err) {
+    if (!err && !row_pred_parse(pred, self->pred)) {
+        Py_DECREF(self);
+        return NULL;
+    }
+    if (err) {
         PyErr_SetString(PyExc_TypeError, "Failed to parse stuff");
         Py_DECREF(self);
         return NULL;
     }
 
-    Py_INCREF(self->input_iter);
+    self->str_vals = new (nothrow) vector<char>[self->num_types];
+    self->str_ends = new (nothrow) vector<long>[self->num_types];
+    if (self->str_vals == NULL || self->str_ends == NULL) {
+        Py_DECREF(self);
+        return PyErr_NoMemory();
+    }
 
     PyObject_GC_Track(self);
     return (PyObject *)self;
@@ -235,18 +272,23 @@ array_col_reader_copy_float_parsed_col(
     return !err;
 }
 
-static void
+static bool
 array_col_reader_copy_str_parsed_col(
     const _ParsedT & t, 
     const _ParsedT & missing_val,
-    PyArrayObject * ret, 
-    long i)
+    vector<char> & vals,
+    vector<long> & ends)
 {
-    char buf[4];
     const _ParsedT & pt = t.first == t.second? missing_val : t;
-    sprintf(buf, "%03d", static_cast<int>(distance(pt.first, pt.second)));
-    copy(buf, buf + 3, (char *)ret->data + i * max_field_len);
-    copy(pt.first, pt.second, (char *)ret->data + i * max_field_len + 3);
+    try {
+        vals.insert(vals.end(), pt.first, pt.second);
+        ends.push_back(static_cast<long>(vals.size()));
+    }
+    catch (const bad_alloc &) {
+        PyErr_NoMemory();
+        return false;
+    }
+    return true;
 }
 
 static bool
@@ -263,8 +305,8 @@ array_col_reader_copy_parsed_col(
         case _float:
             return array_col_reader_copy_float_parsed_col(t, self->missing_vals[j], self->bufs[j], i);
         case _str:
-            array_col_reader_copy_str_parsed_col(t, self->missing_vals[j], self->bufs[j], i);
-            return true;
+            return array_col_reader_copy_str_parsed_col(
+                t, self->missing_vals[j], self->str_vals[j], self->str_ends[j]);
         default:
             DBG_VERIFY(false);
     }
@@ -302,39 +344,19 @@ array_col_reader_copy_parsed_from_inds(
 }
 
 static bool 
-array_col_reader_parse_line(ArrayColReader * self, _ParsedT parsed[max_num_cols])
+array_col_reader_parse_line(ArrayColReader * self, _ParsedT parsed[max_num_cols], long & num_parsed)
 {
-    PyObject * const lineobj = PyIter_Next(self->input_iter); 
-    if (lineobj == NULL) 
-        return false;
-
-    long line_len;
-    const char * line = pystring_as_string(lineobj, line_len);
-    if (line == NULL || line_len < 0) {
-        PyErr_Format(PyExc_TypeError, "No line, or negative line len %p %ld", line, line_len);
-        Py_DECREF(lineobj);
-        return false;
-    }
-
-    long num_parsed = self->has_comment?
-        _line_to_array(
-            self->cols, self->unique_cols, 
-            self->num_cols, self->max_col,
-            self->delimit, self->comment, self->skip_init_space,
-            line, line_len, parsed) :
-        _line_to_array(
+    if (line_source_next_record(
+            self->input,
             self->cols, self->unique_cols, 
             self->num_cols, self->max_col,
-            self->delimit, self->skip_init_space,
-            line, line_len, parsed);
-    if (num_parsed <= 0) {
-        Py_DECREF(lineobj);
+            self->delimit, self->has_comment, self->comment, self->skip_init_space,
+            parsed, num_parsed) <= 0)
+        return false;
+    if (num_parsed <= 0)
         return false;
-    }
     while (num_parsed < self->num_types) 
         parsed[num_parsed++] = make_pair((char *)NULL, (char *)NULL);
-   
-    Py_DECREF(lineobj);
 
     return true;
 }
@@ -342,12 +364,25 @@ array_col_reader_parse_line(ArrayColReader * self, _ParsedT parsed[max_num_cols]
 extern "C" PyObject *
 array_col_reader_iternext(ArrayColReader * self)
 {
-    long i;
+    long i, num_parsed;
     _ParsedT parsed[max_num_cols];
+    for (long j = 0; j < self->num_types; ++j) {
+        self->str_vals[j].clear();
+        self->str_ends[j].clear();
+    }
     for (i = 0; i  < self->max_elems; ++i) {
     
-        if (!array_col_reader_parse_line(self, parsed)) 
+        if (!array_col_reader_parse_line(self, parsed, num_parsed)) 
             break;
+
+        // Rows rejected by the predicate do not take buffer entries.
+        bool err;
+        if (!row_pred_accepts(self->pred, parsed, num_parsed, self->copy_cols, self->missing_vals, err)) {
+            if (err)
+                return NULL;
+            --i;
+            continue;
+        }
         
         if (self->copy_cols != NULL?
                 !array_col_reader_copy_parsed_from_inds(self, parsed, i) :
@@ -358,16 +393,60 @@ array_col_reader_iternext(ArrayColReader * self)
     return pyint_from_long(i);
 }
 
+// Returns the string column j of the last chunk, as a fixed-width bytes array as wide as its
+// longest value.
+extern "C" PyObject *
+array_col_reader_str_col(ArrayColReader * self, PyObject * args)
+{
+    long j;
+    if (!PyArg_ParseTuple(args, "l", &j))
+        return NULL;
+    if (j < 0 || j >= self->num_types || self->types[j] != _str) {
+        PyErr_Format(PyExc_IndexError, "No string column %ld", j);
+        return NULL;
+    }
+
+    const vector<char> & vals = self->str_vals[j];
+    const vector<long> & ends = self->str_ends[j];
+    long width = 1;
+    for (size_t i = 0, begin = 0; i < ends.size(); begin = ends[i++])
+        width = max(width, ends[i] - static_cast<long>(begin));
+
+#if PY_MAJOR_VERSION >= 3
+    PyObject * const dtype_str = PyUnicode_FromFormat("S%ld", width);
+#else // #if PY_MAJOR_VERSION >= 3
+    PyObject * const dtype_str = PyString_FromFormat("S%ld", width);
+#endif // #if PY_MAJOR_VERSION >= 3
+    if (dtype_str == NULL)
+        return NULL;
+    PyArray_Descr * descr;
+    const int converted = PyArray_DescrConverter(dtype_str, &descr);
+    Py_DECREF(dtype_str);
+    if (!converted)
+        return NULL;
+    npy_intp dims[1] = {static_cast<npy_intp>(ends.size())};
+    PyObject * const ret = PyArray_Zeros(1, dims, descr, 0);
+    if (ret == NULL)
+        return NULL;
+
+    char * const data = static_cast<char *>(PyArray_DATA(reinterpret_cast<PyArrayObject *>(ret)));
+    for (size_t i = 0, begin = 0; i < ends.size(); begin = ends[i++])
+        if (ends[i] > static_cast<long>(begin))
+            memcpy(data + i * width, &vals[begin], ends[i] - begin);
+    return ret;
+}
+
 extern "C" int
 array_col_reader_clear(ArrayColReader * self)
 {
-    Py_CLEAR(self->input_iter);
+    line_source_free(self->input);
     for (long j = 0; j < self->num_types; ++j)
         Py_CLEAR(self->bufs[j]);
     return 0;
 }
 
 static PyMethodDef array_col_reader_methods[] = {
+    { "str_col", (PyCFunction)array_col_reader_str_col, METH_VARARGS, "" },
     { NULL, NULL }
 };
 
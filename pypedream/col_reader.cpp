@@ -3,10 +3,13 @@
 
 #include <algorithm>
 #include <cstdlib>
+#include <cstring>
 #include <iostream>
 
 #include "col_reader.hpp"
 #include "_line_to_array.hpp"
+#include "row_pred.hpp"
+#include "line_source.hpp"
     
 using namespace std;
 
@@ -14,7 +17,7 @@ struct ColReader
 {
     PyObject_HEAD
 
-    PyObject * input_iter;
+    _LineSource input;
 
     char delimit;
     bool has_comment;
@@ -29,6 +32,8 @@ struct ColReader
  
     long * types;
     long num_types;
+
+    _RowPred pred;
 };
 
 extern PyTypeObject ColReaderType;
@@ -36,14 +41,13 @@ extern PyTypeObject ColReaderType;
 extern "C" int
 col_reader_traverse(ColReader * self, visitproc visit, void *arg)
 {
-    Py_VISIT(self->input_iter);
-    return 0;
+    return line_source_traverse(self->input, visit, arg);
 }
 
 extern "C" void
 col_reader_dealloc(ColReader * self)
 {
-    Py_XDECREF(self->input_iter);
+    line_source_free(self->input);
 
     if (self->cols != NULL)
         PyMem_Free(self->cols);
@@ -53,6 +57,7 @@ col_reader_dealloc(ColReader * self)
         PyMem_Free(self->copy_cols);
     if (self->types != NULL)
         PyMem_Free(self->types);
+    row_pred_free(self->pred);
 
     PyObject_GC_UnTrack(self);
     PyObject_GC_Del(self);
@@ -68,39 +73,49 @@ col_reader_new(PyTypeObject * type, PyObject *args, PyObject *keyword_args)
     }   
 
     self->num_cols = self->num_unique_cols = self->num_copy_cols = 0;
-    self->input_iter = NULL;
+    line_source_init(self->input);
     self->cols = self->unique_cols = self->copy_cols = NULL;
     self->num_types = 0;
     self->types = NULL;
+    row_pred_init(self->pred);
 
     PyObject * iterator, * comment, * cols_iterator, * unique_cols_iterator, * copy_cols_iterator, * types_iterator;
+    PyObject * pred = Py_None;
+    long offset = -1;
     if (!PyArg_ParseTuple(
             args,
-            "OcOiiOOOlO",
+            "OcOiiOOOlO|Ol",
             &iterator,
             &self->delimit, &comment, &self->skip_init_space,
             &self->single,
             &cols_iterator, &unique_cols_iterator, &copy_cols_iterator,
             &self->max_col,
-            &types_iterator)) {
+            &types_iterator,
+            &pred, &offset)) {
         PyErr_SetString(PyExc_TypeError, "Failed to parse stuff");
         Py_DECREF(self);
         return NULL;
     }
     
+    if (!line_source_parse(iterator, offset, self->input)) {
+        Py_DECREF(self);
+        return NULL;
+    }
     bool err = false;
-    self->input_iter = PyObject_GetIter(iterator);
     _parse_comment(comment, self->has_comment, self->comment);
     self->cols = parse_longs(cols_iterator, self->num_cols, err);
     self->unique_cols = parse_longs(unique_cols_iterator, self->num_unique_cols, err);
     self->copy_cols = parse_longs(copy_cols_iterator, self->num_copy_cols, err);
     self->types = parse_longs(types_iterator, self->num_types, err);
-    if (self->input_iter == NULL || err) {
+    if (!err && !row_pred_parse(pred, self->pred)) {
+        Py_DECREF(self);
+        return NULL;
+    }
+    if (err) {
         PyErr_SetString(PyExc_TypeError, "Failed to parse stuff");
         Py_DECREF(self);
         return NULL;
     }
-    Py_INCREF(self->input_iter);
 
     PyObject_GC_Track(self);
     return (PyObject *)self;
@@ -164,42 +179,33 @@ col_reader_copy_parsed_from_inds(ColReader * self, long num_parsed, _ParsedT con
 extern "C" PyObject *
 col_reader_iternext(ColReader * self)
 {
-    PyObject * const lineobj = PyIter_Next(self->input_iter); 
-    if (lineobj == NULL) 
-        return NULL;
-
-    long line_len;
-    const char * line = pystring_as_string(lineobj, line_len);
-    if (line == NULL || line_len < 0) {
-        PyErr_Format(PyExc_TypeError, "No line or negative line len %p %ld", line, line_len);
-        Py_DECREF(lineobj);
-        return NULL;
-    }
+    // Rows rejected by the predicate are skipped before any object is made of their fields.
+    for (;;) {
+        _ParsedT parsed[max_num_cols];
+        long num_parsed;
+        if (line_source_next_record(
+                self->input,
+                self->cols, self->unique_cols, 
+                self->num_cols, self->max_col,
+                self->delimit, self->has_comment, self->comment, self->skip_init_space,
+                parsed, num_parsed) <= 0)
+            return NULL;
+        if (num_parsed <= 0)
+            return NULL;
 
-    _ParsedT parsed[max_num_cols];
-    const long num_parsed = self->has_comment?
-        _line_to_array(
-            self->cols, self->unique_cols, 
-            self->num_cols, self->max_col,
-            self->delimit, self->comment, self->skip_init_space,
-            line, line_len, parsed) :
-        _line_to_array(
-            self->cols, self->unique_cols, 
-            self->num_cols, self->max_col,
-            self->delimit, self->skip_init_space,
-            line, line_len, parsed);
-    if (num_parsed <= 0) {
-        Py_DECREF(lineobj);
-        return NULL;
-    }
+        bool err;
+        if (!row_pred_accepts(self->pred, parsed, num_parsed, self->copy_cols, NULL, err)) {
+            if (err)
+                return NULL;
+            continue;
+        }
     
-    PyObject * const tup = self->copy_cols != NULL?
-        col_reader_copy_parsed_from_inds(self, num_parsed, parsed) :
-        col_reader_copy_parsed(self, num_parsed, parsed);
-   
-    Py_DECREF(lineobj);
+        PyObject * const tup = self->copy_cols != NULL?
+            col_reader_copy_parsed_from_inds(self, num_parsed, parsed) :
+            col_reader_copy_parsed(self, num_parsed, parsed);
 
-    return tup;
+        return tup;
+    }
 }
 
 extern "C" PyObject *
@@ -213,17 +219,14 @@ col_reader_parse_string(ColReader * self, PyObject * lineobj)
     }
 
     _ParsedT parsed[max_num_cols];
-    const long num_parsed = self->has_comment?
-        _line_to_array(
-            self->cols, self->unique_cols, 
-            self->num_cols, self->max_col,
-            self->delimit, self->skip_init_space,
-            line, line_len, parsed) :
-        _line_to_array(
-            self->cols, self->unique_cols, 
-            self->num_cols, self->max_col,
-            self->delimit, self->comment, self->skip_init_space,
-            line, line_len, parsed);
+    buf_t scratch;
+    const long num_parsed = _any_line_to_array(
+        self->cols, self->unique_cols, 
+        self->num_cols, self->max_col,
+        self->delimit, self->has_comment, self->comment, self->skip_init_space,
+        line, line_len, memchr(line, '"', line_len) != NULL, parsed, scratch);
+    if (num_parsed == _unterminated_quote)
+        PyErr_SetString(PyExc_ValueError, "Quoted field unterminated at the end of the line");
     if (num_parsed <= 0) {
         return NULL;
     }
@@ -238,8 +241,7 @@ col_reader_parse_string(ColReader * self, PyObject * lineobj)
 extern "C" int
 col_reader_clear(ColReader * self)
 {
-    if (self->input_iter != NULL)
-        Py_CLEAR(self->input_iter);
+    line_source_free(self->input);
     return 0;
 }
 
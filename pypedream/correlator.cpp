@@ -71,9 +71,18 @@ correlator_corr(Correlator * self)
     return PyFloat_FromDouble(corr);    
 }
 
+extern "C" PyObject *
+correlator_state(Correlator * self)
+{
+    return Py_BuildValue(
+        "(kddddd)", 
+        self->n, self->sx, self->sy, self->sxx, self->syy, self->sxy);
+}
+
 static PyMethodDef correlator_methods[] = {
     { "push", (PyCFunction)correlator_push, METH_VARARGS, "" },
     { "corr", (PyCFunction)correlator_corr, METH_NOARGS, "" },
+    { "state", (PyCFunction)correlator_state, METH_NOARGS, "" },
     { NULL}
 };
 
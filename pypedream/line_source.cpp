@@ -0,0 +1,339 @@
+#include <Python.h>
+
+#include <algorithm>
+#include <cstring>
+#include <new>
+
+#ifndef _WIN32
+#include <sys/mman.h>
+#include <unistd.h>
+#endif // #ifndef _WIN32
+
+#include "line_source.hpp"
+#include "_line_to_array.hpp"
+
+using namespace std;
+
+void
+line_source_init(_LineSource & src)
+{
+    src.iter = src.buf_obj = src.line = NULL;
+    src.cur = src.end = src.quote_free_end = NULL;
+    src.record = src.scratch = NULL;
+}
+
+// Length of the parts of a buffer scanned for quotes at once (bounded, so that the scan does
+// not run through a large mapped file ahead of the parsing).
+enum{_quote_scan_len = 1 << 16};
+
+static void
+line_source_advise_sequential(const char * begin, const char * end)
+{
+#if !defined(_WIN32) && defined(MADV_SEQUENTIAL)
+    // Buffers not mapped (e.g., bytes) fail harmlessly.
+    const long page = sysconf(_SC_PAGESIZE);
+    if (page <= 0 || begin == end)
+        return;
+    char * const aligned = const_cast<char *>(begin - reinterpret_cast<size_t>(begin) % page);
+    madvise(aligned, end - aligned, MADV_SEQUENTIAL);
+#endif // #if !defined(_WIN32) && defined(MADV_SEQUENTIAL)
+}
+
+bool
+line_source_parse(PyObject * input, long offset, _LineSource & src)
+{
+    line_source_init(src);
+
+    if (offset < 0) {
+        src.iter = PyObject_GetIter(input);
+        return src.iter != NULL;
+    }
+
+    const char * begin;
+    Py_ssize_t len;
+#if PY_MAJOR_VERSION >= 3
+    if (PyObject_GetBuffer(input, &src.view, PyBUF_SIMPLE) != 0)
+        return false;
+    begin = static_cast<const char *>(src.view.buf);
+    len = src.view.len;
+#else // #if PY_MAJOR_VERSION >= 3
+    const void * buf;
+    if (PyObject_AsReadBuffer(input, &buf, &len) != 0)
+        return false;
+    begin = static_cast<const char *>(buf);
+#endif // #if PY_MAJOR_VERSION >= 3
+    Py_INCREF(input);
+    src.buf_obj = input;
+    if (offset > len) {
+        PyErr_Format(PyExc_ValueError, "Offset %ld beyond the buffer's end", offset);
+        line_source_free(src);
+        return false;
+    }
+
+    src.cur = begin + offset;
+    src.end = begin + len;
+    line_source_advise_sequential(src.cur, src.end);
+    return true;
+}
+
+int
+line_source_next(_LineSource & src, const char * & line, long & len, bool terminate)
+{
+    Py_CLEAR(src.line);
+
+    if (src.buf_obj != NULL) {
+        if (src.cur == src.end)
+            return 0;
+        const char * const nl = static_cast<const char *>(memchr(src.cur, '\n', src.end - src.cur));
+        line = src.cur;
+        src.cur = nl == NULL? src.end : nl + 1;
+        len = src.cur - line;
+        if (nl != NULL || !terminate)
+            return 1;
+#if PY_MAJOR_VERSION >= 3
+        src.line = PyBytes_FromStringAndSize(line, len);
+#else // #if PY_MAJOR_VERSION >= 3
+        src.line = PyString_FromStringAndSize(line, len);
+#endif // #if PY_MAJOR_VERSION >= 3
+        if (src.line == NULL)
+            return -1;
+        line = pystring_as_string(src.line, len);
+        return 1;
+    }
+
+    if (src.iter == NULL)
+        return 0;
+    src.line = PyIter_Next(src.iter);
+    if (src.line == NULL)
+        return PyErr_Occurred()? -1 : 0;
+    line = pystring_as_string(src.line, len);
+    if (line == NULL || len < 0) {
+        PyErr_Format(PyExc_TypeError, "No line or negative line len %p %ld", line, len);
+        return -1;
+    }
+    return 1;
+}
+
+static bool
+line_source_has_quote(_LineSource & src, const char * line, long len)
+{
+    if (src.buf_obj == NULL || src.line != NULL)
+        return memchr(line, '"', len) != NULL;
+
+    // The lines of a buffer are consecutive, so the buffer is scanned once, a part at a time.
+    if (line + len > src.quote_free_end) {
+        const long scan_len = min<long>(src.end - line, max<long>(len, _quote_scan_len));
+        const char * const q = static_cast<const char *>(memchr(line, '"', scan_len));
+        src.quote_free_end = q == NULL? line + scan_len : q;
+    }
+    return line + len > src.quote_free_end;
+}
+
+int
+line_source_next_record(
+    _LineSource & src,
+    const long * cols, const long * unique_cols, 
+    long num_cols, long max_col,
+    char delimit, bool has_comment, char comment, int skip_init_space,
+    _ParsedT parsed[max_num_cols], long & num_parsed)
+{
+    const char * line;
+    long len;
+    const int ret = line_source_next(src, line, len);
+    if (ret <= 0)
+        return ret;
+
+    const bool has_quote = line_source_has_quote(src, line, len);
+    if (has_quote && src.scratch == NULL) {
+        src.record = new (nothrow) buf_t;
+        src.scratch = new (nothrow) buf_t;
+        if (src.record == NULL || src.scratch == NULL) {
+            PyErr_NoMemory();
+            return -1;
+        }
+    }
+
+    for (bool joined = false; ; joined = true) {
+        num_parsed = _any_line_to_array(
+            cols, unique_cols, num_cols, max_col,
+            delimit, has_comment, comment, skip_init_space,
+            line, len, has_quote, parsed, *src.scratch);
+        if (num_parsed != _unterminated_quote)
+            return 1;
+
+        // A quoted field continues on the next line; the lines are gathered into record (the
+        // first before the next line invalidates it).
+        const char * next;
+        long next_len;
+        try {
+            if (!joined)
+                src.record->assign(line, line + len);
+            const int next_ret = line_source_next(src, next, next_len);
+            if (next_ret == 0)
+                PyErr_SetString(PyExc_ValueError, "Quoted field unterminated at the end of the input");
+            if (next_ret <= 0)
+                return -1;
+            src.record->insert(src.record->end(), next, next + next_len);
+        }
+        catch(bad_alloc &) {
+            PyErr_NoMemory();
+            return -1;
+        }
+        line = &(*src.record)[0];
+        len = static_cast<long>(src.record->size());
+    }
+}
+
+int
+line_source_traverse(_LineSource & src, visitproc visit, void * arg)
+{
+    Py_VISIT(src.iter);
+    Py_VISIT(src.buf_obj);
+    Py_VISIT(src.line);
+    return 0;
+}
+
+void
+line_source_free(_LineSource & src)
+{
+    Py_CLEAR(src.iter);
+    Py_CLEAR(src.line);
+    if (src.buf_obj != NULL) {
+#if PY_MAJOR_VERSION >= 3
+        PyBuffer_Release(&src.view);
+#endif // #if PY_MAJOR_VERSION >= 3
+        Py_CLEAR(src.buf_obj);
+    }
+    src.cur = src.end = src.quote_free_end = NULL;
+    delete src.record;
+    delete src.scratch;
+    src.record = src.scratch = NULL;
+}
+
+struct LineViews
+{
+    PyObject_HEAD
+
+    _LineSource input;
+    const char * begin;
+    int rstrip;
+};
+
+extern "C" int
+line_views_traverse(LineViews * self, visitproc visit, void * arg)
+{
+    return line_source_traverse(self->input, visit, arg);
+}
+
+extern "C" int
+line_views_clear(LineViews * self)
+{
+    line_source_free(self->input);
+    return 0;
+}
+
+extern "C" void
+line_views_dealloc(LineViews * self)
+{
+    PyObject_GC_UnTrack(self);
+    line_source_free(self->input);
+    PyObject_GC_Del(self);
+}
+
+extern "C" PyObject *
+line_views_new(PyTypeObject * type, PyObject * args, PyObject * keyword_args)
+{
+    PyObject * buf;
+    long offset;
+    int rstrip;
+    if (!PyArg_ParseTuple(args, "Oli", &buf, &offset, &rstrip))
+        return NULL;
+    if (offset < 0) {
+        PyErr_Format(PyExc_ValueError, "Negative offset %ld", offset);
+        return NULL;
+    }
+
+    LineViews * const self = PyObject_GC_New(LineViews, &LineViewsType);
+    if (self == NULL) 
+        return PyErr_NoMemory();
+    self->rstrip = rstrip;
+    if (!line_source_parse(buf, offset, self->input)) {
+        line_source_init(self->input);
+        Py_DECREF(self);
+        return NULL;
+    }
+    self->begin = self->input.cur - offset;
+
+    PyObject_GC_Track(self);
+    return (PyObject *)self;
+}
+
+static inline bool
+line_views_is_space(char c)
+{
+    return c == ' ' || c == '\t' || c == '\n' || c == '\r' || c == '\v' || c == '\f';
+}
+
+extern "C" PyObject *
+line_views_iternext(LineViews * self)
+{
+    const char * line;
+    long len;
+    if (line_source_next(self->input, line, len, false) <= 0)
+        return NULL;
+    if (self->rstrip)
+        while (len > 0 && line_views_is_space(line[len - 1]))
+            --len;
+
+    const Py_ssize_t b = line - self->begin;
+#if PY_MAJOR_VERSION >= 3
+    return PySequence_GetSlice(self->input.buf_obj, b, b + len);
+#else // #if PY_MAJOR_VERSION >= 3
+    return PyBuffer_FromObject(self->input.buf_obj, b, len);
+#endif // #if PY_MAJOR_VERSION >= 3
+}
+
+PyDoc_STRVAR(LineViewsType_doc, "");
+
+PyTypeObject LineViewsType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "dagpype_c.LineViews",                  /*tp_name*/
+    sizeof(LineViews),                      /*tp_basicsize*/
+    0,                                      /*tp_itemsize*/
+    /* methods */
+    (destructor)line_views_dealloc,         /*tp_dealloc*/
+    0,                                      /*tp_print*/
+    0,                                      /*tp_getattr*/
+    0,                                      /*tp_setattr*/
+    0,                                      /*tp_compare*/
+    0,                                      /*tp_repr*/
+    0,                                      /*tp_as_number*/
+    0,                                      /*tp_as_sequence*/
+    0,                                      /*tp_as_mapping*/
+    0,                                      /*tp_hash*/
+    0,                                      /*tp_call*/
+    0,                                      /*tp_str*/
+    0,                                      /*tp_getattro*/
+    0,                                      /*tp_setattro*/
+    0,                                      /*tp_as_buffer*/
+    Py_TPFLAGS_DEFAULT | Py_TPFLAGS_HAVE_GC, /*tp_flags*/
+    LineViewsType_doc,                      /*tp_doc*/
+    (traverseproc)line_views_traverse,      /*tp_traverse*/
+    (inquiry)line_views_clear,              /*tp_clear*/
+    0,                                      /*tp_richcompare*/
+    0,                                      /*tp_weaklistoffset*/
+    PyObject_SelfIter,                      /*tp_iter*/
+    (iternextfunc)line_views_iternext,      /*tp_iternext*/
+    0,                                      /*tp_methods*/
+    0,                                      /*tp_members*/
+    0,                                      /* tp_getset */
+    0,                                      /* tp_base */
+    0,                                      /* tp_dict */
+    0,                                      /* tp_descr_get */
+    0,                                      /* tp_descr_set */
+    0,                                      /* tp_dictoffset */
+    0,                                      /* tp_init */
+    0,                                      /* tp_alloc */
+    line_views_new,                         /* tp_new */
+};
+
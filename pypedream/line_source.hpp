@@ -0,0 +1,68 @@
+#ifndef LINE_SOURCE_HPP
+#define LINE_SOURCE_HPP
+
+#include <Python.h>
+
+#include "parser_defs.hpp"
+
+// Source of the lines of the column readers: either an iterator of line objects, or
+// a buffer (e.g., a memory-mapped file) scanned directly from an offset, so that
+// lines are parsed in place, without being copied into line objects.
+struct _LineSource
+{
+    PyObject * iter;
+
+    PyObject * buf_obj;
+#if PY_MAJOR_VERSION >= 3
+    Py_buffer view;
+#endif // #if PY_MAJOR_VERSION >= 3
+    const char * cur, * end;
+
+    // Line object of the last line returned (iterator mode, or a copied last line).
+    PyObject * line;
+
+    // End of the part of the buffer (from the last line on) known to have no quotes.
+    const char * quote_free_end;
+    // Lines of a record spanning several lines, and the unescaped fields of quoted records
+    // (allocated on the first quoted record).
+    buf_t * record, * scratch;
+};
+
+void
+line_source_init(_LineSource & src);
+
+// If offset is negative, input is iterated over; otherwise, it is a buffer scanned from
+// offset.
+bool
+line_source_parse(PyObject * input, long offset, _LineSource & src);
+
+// Sets line and len to the next line (including its newline), which remains valid until
+// the next call. Returns 1 for a line, 0 at the end, and -1 on an error. If terminate, a 
+// last line of a buffer lacking a newline is copied, so that it is followed by a null 
+// (the numeric conversions read up to a non-digit).
+int
+line_source_next(_LineSource & src, const char * & line, long & len, bool terminate = true);
+
+// Parses the next record (a line, or several, if a quoted field spans them) into parsed, 
+// as _any_line_to_array, setting num_parsed to the number of fields. The fields remain 
+// valid until the next call. Returns 1 for a record, 0 at the end, and -1 on an error.
+int
+line_source_next_record(
+    _LineSource & src,
+    const long * cols, const long * unique_cols, 
+    long num_cols, long max_col,
+    char delimit, bool has_comment, char comment, int skip_init_space,
+    _ParsedT parsed[max_num_cols], long & num_parsed);
+
+int
+line_source_traverse(_LineSource & src, visitproc visit, void * arg);
+
+void
+line_source_free(_LineSource & src);
+
+// Iterator over read-only views of the lines of a buffer (memoryviews, or buffers in
+// Python 2), created from the buffer, an offset, and whether to right-strip the lines.
+extern PyTypeObject LineViewsType;
+
+#endif // #ifndef LINE_SOURCE_HPP
+
@@ -2,6 +2,7 @@
 #include <structmember.h>
 
 #include <assert.h>
+#include <cstring>
 
 #include "defs.hpp"
 #include "_line_to_array.hpp"
@@ -39,18 +40,21 @@ line_to_tuple(PyObject * self, PyObject * args)
     long line_len;
     char * const line = pystring_as_string(lineobj, line_len);
 
+    if (line == NULL) {
+        Py_XDECREF(iter);
+        Py_XDECREF(lineobj);
+        return NULL;
+    }
+
     _ParsedT parsed[max_num_cols];
-    const long num_parsed = has_comment?
-        _line_to_array(
-            NULL, NULL, 
-            0, 0,
-            delimit, comment, skip_init_space,
-            line, line_len, parsed) :
-        _line_to_array(
-            NULL, NULL, 
-            0, 0,
-            delimit, skip_init_space,
-            line, line_len, parsed);
+    buf_t scratch;
+    const long num_parsed = _any_line_to_array(
+        NULL, NULL, 
+        0, 0,
+        delimit, has_comment, comment, skip_init_space,
+        line, line_len, memchr(line, '"', line_len) != NULL, parsed, scratch);
+    if (num_parsed == _unterminated_quote)
+        PyErr_SetString(PyExc_ValueError, "Quoted field unterminated at the end of the line");
     if (num_parsed <= 0) {
         Py_XDECREF(iter);
         Py_XDECREF(lineobj);
@@ -17,6 +17,7 @@
 #include "exp_averager.hpp"
 #include "enumerator.hpp"
 #include "correlator.hpp"
+#include "line_source.hpp"
 
 using namespace std;
 
@@ -42,7 +43,6 @@ error_out(PyObject *m) {
 static PyMethodDef dagpype_c_methods[] =
 {
     { "line_to_tuple", (PyCFunction)line_to_tuple, METH_VARARGS, NULL},
-    { "parser_max_field_len", (PyCFunction)parser_max_field_len, METH_VARARGS, NULL},
 #ifdef DAGPYPE_USE_AIO
     { "line_writer", (PyCFunction)line_writer, METH_VARARGS, NULL},
     { "line_writer_write", (PyCFunction)line_writer_write, METH_VARARGS, NULL},
@@ -140,6 +140,13 @@ initdagpype_c(void)
     Py_INCREF(&ArrayColReaderType);
     PyModule_AddObject(module, "ArrayColReader", (PyObject *)&ArrayColReaderType);
 
+    if (PyType_Ready(&LineViewsType) < 0) {
+        Py_DECREF(module);
+        INITERROR;
+    }
+    Py_INCREF(&LineViewsType);
+    PyModule_AddObject(module, "LineViews", (PyObject *)&LineViewsType);
+
 #if PY_MAJOR_VERSION >= 3
     return module;
 #endif
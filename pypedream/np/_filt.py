@@ -1,8 +1,11 @@
 import collections
 import itertools
+import os
+import shutil
+import tempfile
 import numpy
 
-from dagpype._core import filters
+from dagpype._core import filters, InvalidParamError
 import dagpype_c
 
 
@@ -42,6 +45,7 @@ def chunk(max_elems = 8192, dtype = numpy.float64):
         except GeneratorExit:
             if len(l) > 0:
                 target.send(numpy.array(l, dtype = dtype_))        
+            target.close()
             
     return _dagpype_internal_fn_act
     
@@ -74,8 +78,7 @@ def unchunk():
                     for i in range(a.shape[0]):
                         target.send(tuple(a[i]))
         except GeneratorExit:
-            if len(l) > 0:
-                target.send(numpy.array(l, dtype = dtype_))        
+            target.close()
             
     return _dagpype_internal_fn_act
                 
@@ -298,3 +301,135 @@ def enumerate_(start = 0):
 
     return _dagpype_internal_fn_act
 
+
+
+def _chunk_parts(c):
+    return list(c) if isinstance(c, tuple) else [c]
+
+
+def _chunk_from_parts(parts, is_tuple):
+    return tuple(parts) if is_tuple else parts[0]
+
+
+def _sort_keys(parts, is_tuple, col):
+    if is_tuple:
+        return parts[col]
+    return parts[0] if parts[0].ndim == 1 else parts[0][:, col]
+
+
+def _concat_parts(parts_list):
+    return [numpy.concatenate([parts[i] for parts in parts_list]) for i in range(len(parts_list[0]))]
+
+
+def _merge_sorted_runs(runs, is_tuple, col, reverse, max_elems):
+    """
+    Merges runs (lists of parts, sorted in ascending order) into chunks. Each round takes
+        a block of each run, and sends on the elements up to the least of the blocks' last
+        keys, as no element following these blocks precedes them.
+    """
+    if reverse:
+        runs = [[p[:: -1] for p in r] for r in runs]
+    keys = [_sort_keys(r, is_tuple, col) for r in runs]
+    pos = [0] * len(runs)
+    while True:
+        active = [i for i in range(len(runs)) if pos[i] < len(keys[i])]
+        if len(active) == 0:
+            return
+        blocks = dict((i, keys[i][pos[i]: pos[i] + max_elems]) for i in active)
+        lasts = [blocks[i][-1] for i in active]
+        bound = max(lasts) if reverse else min(lasts)
+        taken_keys, taken = [], []
+        for i in active:
+            b = blocks[i]
+            if reverse:
+                n = len(b) - numpy.searchsorted(b[:: -1], bound, side = 'left')
+            else:
+                n = numpy.searchsorted(b, bound, side = 'right')
+            taken_keys.append(b[: n])
+            taken.append([p[pos[i]: pos[i] + n] for p in runs[i]])
+            pos[i] += n
+        order = numpy.argsort(numpy.concatenate(taken_keys), kind = 'mergesort')
+        if reverse:
+            order = order[:: -1]
+        yield _chunk_from_parts([p[order] for p in _concat_parts(taken)], is_tuple)
+
+
+__all__ += ['sort_']
+def sort_(col = 0, reverse = False, mem_limit = 256 * 1024 * 1024, max_elems = 8192):
+    """
+    Sorts a stream of chunks (e.g., as read by np.chunk_stream_vals), even one which does 
+        not fit in memory. The chunks are either arrays or tuples of arrays (whose elements 
+        are sorted together). Runs of chunks taking up to about mem_limit bytes are sorted
+        (via argsort), and if there is more than one such run, the runs are spilled to 
+        temporary .npy files, which are memory-mapped and merged. The chunks are sent on 
+        when the stream ends.
+
+    Keyword Arguments:
+        col -- For tuples of arrays, the index of the array by which to sort; for 
+            2-dimensional arrays, the index of the column by which to sort the rows
+            (default 0).
+        reverse -- Whether to sort in descending order (default False).
+        mem_limit -- Approximate number of bytes of a run (default 256MB).
+        max_elems -- Number of elements taken from each run at a time while merging; chunks
+            sent on have at most this number times the number of runs (default 8192).
+
+    See Also:
+        :func:`dagpype.sort_`
+        :func:`dagpype.np.chunk_stream_vals`
+
+    Examples:
+
+    >>> source([numpy.array([3, 1]), numpy.array([2])]) | np.sort_() | np.concatenate_chunks()
+    array([1, 2, 3])
+    >>> # Sorts the rows of a file by their second column.
+    >>> np.chunk_stream_vals('meteo.csv', (b'day', b'wind')) | np.sort_(1) | np.concatenate_chunks()
+    """
+
+    if mem_limit <= 0:
+        raise InvalidParamError('mem_limit', mem_limit, 'Must be positive')
+    if max_elems <= 0:
+        raise InvalidParamError('max_elems', max_elems, 'Must be positive')
+
+    def sort_run(run, is_tuple):
+        parts = _concat_parts(run)
+        order = numpy.argsort(_sort_keys(parts, is_tuple, col), kind = 'mergesort')
+        return [p[order] for p in parts]
+
+    @filters
+    def _dagpype_internal_fn_act(target):
+        run, run_bytes, is_tuple, spill_dir, runs = [], 0, None, None, []
+        try:
+            try:
+                while True:
+                    c = (yield)
+                    is_tuple = isinstance(c, tuple)
+                    parts = _chunk_parts(c)
+                    if len(parts[0]) == 0:
+                        continue
+                    run.append(parts)
+                    run_bytes += sum(p.nbytes for p in parts)
+                    if run_bytes < mem_limit:
+                        continue
+                    if spill_dir is None:
+                        spill_dir = tempfile.mkdtemp()
+                    f_names = []
+                    for i, p in enumerate(sort_run(run, is_tuple)):
+                        f_names.append(os.path.join(spill_dir, '%d_%d.npy' % (len(runs), i)))
+                        numpy.save(f_names[-1], p)
+                    runs.append(f_names)
+                    run, run_bytes = [], 0
+            except GeneratorExit:
+                runs = [[numpy.load(f_name, mmap_mode = 'r') for f_name in f_names] for f_names in runs]
+                if len(run) > 0:
+                    runs.append(sort_run(run, is_tuple))
+                    run = []
+                for c in _merge_sorted_runs(runs, is_tuple, col, reverse, max_elems):
+                    target.send(c)
+                target.close()
+        finally:
+            # The memory maps are dropped before their files are removed.
+            runs = []
+            if spill_dir is not None:
+                shutil.rmtree(spill_dir, ignore_errors = True)
+
+    return _dagpype_internal_fn_act
@@ -2,7 +2,8 @@ import numpy
 import math
 import types
 
-from dagpype._core import sinks
+from dagpype._core import sinks, NoResultError
+from dagpype._core import _mergeable, _merge_non_empty, _finalize_non_empty, _add_states
 
 
 __all__ = []
@@ -147,11 +148,16 @@ def corr():
 
                     n += xy.shape[0]
         except GeneratorExit:
-            if n > 0:
-                res = (n * sxy - sx * sy) / math.sqrt(n * sxx - sx * sx) / math.sqrt(n * syy - sy * sy)
-                target.send(res)
+            target.send((sx, sxx, sy, syy, sxy, n))
             target.close()
-    return act_
+
+    def finalize(state):
+        sx, sxx, sy, syy, sxy, n = state
+        if n == 0:
+            raise NoResultError()
+        return (n * sxy - sx * sy) / math.sqrt(n * sxx - sx * sx) / math.sqrt(n * syy - sy * sy)
+
+    return _mergeable(act_, _add_states, finalize)
     
 
 __all__ += ['to_array']
@@ -220,7 +226,7 @@ def sum_(axis = None):
             target.send(s)
             target.close()
 
-    return _dagpype_internal_fn_act
+    return _mergeable(_dagpype_internal_fn_act, lambda a, b : a + b, lambda s : s)
 
 
 __all__ += ['mean']
@@ -257,10 +263,16 @@ def mean(axis = None):
                 s += numpy.sum(a, axis)
                 n += a.shape[0] if axis is not None else a.size
         except GeneratorExit:
-            target.send(s / n)
+            target.send((s, n))
             target.close()
 
-    return _dagpype_internal_fn_act
+    def finalize(state):
+        s, n = state
+        if n == 0:
+            raise NoResultError()
+        return s / n
+
+    return _mergeable(_dagpype_internal_fn_act, _add_states, finalize)
 
 
 __all__ += ['min_']
@@ -291,21 +303,17 @@ def min_(axis = None):
     """
     @sinks
     def _dagpype_internal_fn_act(target):
-        has = False
+        m = None
         try:
             while True:
                 cm = (yield).min(axis)
-                if not has:
-                    m = cm
-                else:
-                    m = min(cm, m) if axis is None else numpy.minium(cm, m)
-                has = True
+                m = cm if m is None else merge(cm, m)
         except GeneratorExit:
-            if has:
-                target.send(m)
+            target.send(m)
             target.close()
 
-    return _dagpype_internal_fn_act
+    merge = _merge_non_empty(min if axis is None else numpy.minimum)
+    return _mergeable(_dagpype_internal_fn_act, merge, _finalize_non_empty)
 
 
 __all__ += ['max_']
@@ -336,21 +344,17 @@ def max_(axis = None):
     """
     @sinks
     def _dagpype_internal_fn_act(target):
-        has = False
+        m = None
         try:
             while True:
                 cm = (yield).max(axis)
-                if not has:
-                    m = cm
-                else:
-                    m = min(cm, m) if axis is None else numpy.maximum(cm, m)
-                has = True
+                m = cm if m is None else merge(cm, m)
         except GeneratorExit:
-            if has:
-                target.send(m)
+            target.send(m)
             target.close()
 
-    return _dagpype_internal_fn_act
+    merge = _merge_non_empty(max if axis is None else numpy.maximum)
+    return _mergeable(_dagpype_internal_fn_act, merge, _finalize_non_empty)
 
 
 __all__ += ['count']
@@ -382,7 +386,7 @@ def count():
             target.send(s)
             target.close()
 
-    return _dagpype_internal_fn_act
+    return _mergeable(_dagpype_internal_fn_act, lambda a, b : a + b, lambda s : s)
 
 
 __all__ += ['vstack_chunks']
@@ -460,10 +464,11 @@ def chunks_sum():
                 else:
                     e += numpy.array((yield))
         except GeneratorExit:
-            if e is not None:
-                target.send(e)
+            target.send(e)
             target.close()
-    return _dagpype_internal_fn_act
+
+    return _mergeable(
+        _dagpype_internal_fn_act, _merge_non_empty(lambda a, b : a + b), _finalize_non_empty)
 
 
 __all__ += ['chunks_mean']
@@ -491,10 +496,14 @@ def chunks_mean():
                     e = numpy.array((yield))
                 n += 1
         except GeneratorExit:
-            if n > 0:
-                target.send(e / n)
+            target.send((e, n) if n > 0 else None)
             target.close()
-    return _dagpype_internal_fn_act
+
+    def finalize(state):
+        e, n = _finalize_non_empty(state)
+        return e / n
+
+    return _mergeable(_dagpype_internal_fn_act, _merge_non_empty(_add_states), finalize)
 
 
 __all__ += ['chunks_stddev']
@@ -526,9 +535,14 @@ def chunks_stddev(ddof = 1):
                     ss = e * e
                 n += 1
         except GeneratorExit:
-            if n > ddof:
-                res = numpy.sqrt((ss - s * s / n) / (n - ddof))
-                target.send(res)
+            target.send((s, ss, n) if n > 0 else None)
             target.close()
-    return _dagpype_internal_fn_act
+
+    def finalize(state):
+        s, ss, n = _finalize_non_empty(state)
+        if n <= ddof:
+            raise NoResultError()
+        return numpy.sqrt((ss - s * s / n) / (n - ddof))
+
+    return _mergeable(_dagpype_internal_fn_act, _merge_non_empty(_add_states), finalize)
 
@@ -1,8 +1,20 @@
+import os
+import shutil
+import collections
+import tempfile
+import multiprocessing
 import numpy
 import itertools
 
-from dagpype._core import sources
+from dagpype._core import sources, _node, _projectable, InvalidParamError
 from dagpype._csv_utils import array_read as _csv_utils_array_read
+from dagpype._csv_utils import project_where as _csv_utils_project_where, _pick as _csv_utils_pick
+from dagpype._csv_utils import check_where as _csv_utils_check_where
+from dagpype._csv_utils import open_input as _csv_utils_open_input
+from dagpype._csv_utils import cols_are_type as _csv_utils_cols_are_type
+from dagpype._csv_utils import _inds_from_cols as _csv_utils_inds_from_cols, _Mapped as _csv_utils_Mapped
+from dagpype._csv_utils import infer as _csv_utils_infer
+from dagpype._parallel import _worker_pipes, _worker_keys, _make_pool, _split_file
 
 
 __all__ = []
@@ -50,18 +62,30 @@ def chunk_stream_bytes(stream, max_elems = 8192, dtype = numpy.float64, num_cols
 
         reader = open(stream, 'rb') if isinstance(stream, str) else stream
         
-        while True:
-            a = _stream_chunk(reader, dtype, max_elems, num_cols)
-            if a is None:
-                break
-            yield a
-
-        if isinstance(stream, str):
-            reader.close()
+        try:
+            while True:
+                a = _stream_chunk(reader, dtype, max_elems, num_cols)
+                if a is None:
+                    break
+                yield a
+        finally:
+            if isinstance(stream, str):
+                reader.close()
     
     return _dagpype_internal_fn_act
 
 
+def _default_types_missing_vals(cols, types_, missing_vals):
+    def _is_it_t(type_):
+        return isinstance(type_, list) or isinstance(type_, tuple)
+
+    if types_ is None:
+        types_ = tuple(float for _ in cols) if _is_it_t(cols) else float
+    if missing_vals is None:
+        missing_vals = tuple(type_(0) for type_ in types_) if _is_it_t(types_) else types_(0)
+    return types_, missing_vals
+
+
 __all__ += ['chunk_stream_vals']
 def chunk_stream_vals(stream, 
     cols, 
@@ -70,11 +94,14 @@ def chunk_stream_vals(stream,
     delimit = b',', 
     comment = None, 
     skip_init_space = True,
-    max_elems = 8192):
+    max_elems = 8192,
+    where = None,
+    mapped = False,
+    infer_types = False):
 
     """
     Streams delimited (e.g., by commas for CSV files, or by tabs for TAB files) values as tuples of
-        numpy.arrays.
+        numpy.arrays. Fields may be quoted as in stream_vals.
 
     Arguments:
         stream -- Either the name of a file or a *binary* stream. 
@@ -93,9 +120,18 @@ def chunk_stream_vals(stream,
             Any character starting from this one until the line end will be ignored.
         skip_init_space -- Whether spaces starting a field will be ignored (default True).
         max_elems -- Number of rows per chunk (last might have less) (default 8192).
+        where -- Predicate on the read fields (see field), or None (default). If given, only rows 
+            satisfying it are placed in the chunks; it is evaluated on the parsed fields (with
+            missing values filled from missing_vals). 
+        mapped -- If True and stream is a name of a file, maps the file to memory, and parses
+            the lines in place, without copying them (default False).
+        infer_types -- Either False (default), True, or a number of rows. If not False and 
+            types_ is None, the types are inferred from a sample of rows (see stream_vals), 
+            so that the arrays have these dtypes.
 
     See Also:
         :func:`dagpype.stream_vals`
+        :func:`dagpype.field`
         :func:`dagpype.np.chunk_stream_bytes`
 
     Examples:
@@ -110,28 +146,238 @@ def chunk_stream_vals(stream,
     >>> # Find the correlation between two indexed columns.
     >>> np.chunk_stream_vals('neat_data.csv', (3, 0)) | np.corr()    
     -0.084075296393769511
+
+    >>> # Find the correlation between two named columns on windy days only.
+    >>> np.chunk_stream_vals('meteo.csv', (b'day', b'wind'), where = field(1) > 5) | np.corr()    
     """
 
-    def _is_it_t(type_):
-        return isinstance(type_, list) or isinstance(type_, tuple)
+    infer = types_ is None and infer_types is not False
+    if not infer:
+        types_, missing_vals = _default_types_missing_vals(cols, types_, missing_vals)
+        _csv_utils_check_where(cols, types_, where)
 
-    if types_ is None:
-        types_ = tuple(float for _ in cols) if _is_it_t(cols) else float
-    if missing_vals is None:
-        missing_vals = tuple(type_(0) for type_ in types_) if _is_it_t(types_) else types_(0)
     @sources
     def _dagpype_internal_fn_act():
         assert max_elems > 0
-    
-        stream_ = open(stream, 'rb') if isinstance(stream, str) else stream
 
-        for t in _csv_utils_array_read(stream_, cols, types_, missing_vals, delimit, comment, skip_init_space, max_elems):
-            yield t
+        stream__, types__, missing_vals_ = stream, types_, missing_vals
+        if infer:
+            stream__, types__ = _csv_utils_infer(stream, cols, delimit, comment, skip_init_space, infer_types)
+            types__, missing_vals_ = _default_types_missing_vals(cols, types__, missing_vals)
+            _csv_utils_check_where(cols, types__, where)
+        stream_, opened = _csv_utils_open_input(stream__, mapped)
+
+        try:
+            for t in _csv_utils_array_read(stream_, cols, types__, missing_vals_, delimit, comment, skip_init_space, max_elems, where):
+                yield t
+        finally:
+            if opened:
+                stream_.close()
+
+    def project(kind, params):
+        if kind != 'select_inds' or not isinstance(cols, tuple):
+            return None
+        if not all(isinstance(a, tuple) or (infer and a is None) for a in (types_, missing_vals)):
+            return None
+        projected = _csv_utils_project_where(cols, None, where, kind, params)
+        if projected is None:
+            return None
+        inds = params['inds']
+        pick = lambda a : None if a is None else _csv_utils_pick(a, inds)
+        return chunk_stream_vals(
+            stream, 
+            projected[0], 
+            pick(types_), 
+            pick(missing_vals),
+            delimit, comment, skip_init_space, max_elems, projected[2], mapped, infer_types)._fns[0]
+
+    return _projectable(
+        _node(_dagpype_internal_fn_act, 'chunk_stream_vals', stream = stream, cols = cols, types_ = types_, where = where),
+        project)
+
+
+# Approximate number of bytes in each range parsed by a worker of parallel_chunk_stream_vals.
+_parallel_range_bytes = 32 * 1024 * 1024
+
+# Directory of the files through which workers pass parsed arrays (shared memory, if available).
+#     Each call makes its own directory in it, removed as a whole when the call ends, so that
+#     files of ranges whose results were never received are removed too.
+_shared_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+
+def _share_arrays(arrays, dir_):
+    if any(a.dtype.hasobject for a in arrays):
+        return False, arrays
+    f_names = []
+    try:
+        for a in arrays:
+            fd, f_name = tempfile.mkstemp(suffix = '.npy', dir = dir_)
+            f_names.append(f_name)
+            with os.fdopen(fd, 'wb') as f:
+                numpy.save(f, a)
+    except:
+        _remove_shared((True, f_names))
+        raise
+    return True, f_names
+
+
+def _unshare_arrays(shared):
+    is_shared, payload = shared
+    if not is_shared:
+        return payload
+    try:
+        # Copy-on-write mappings, so that downstream stages may modify chunks.
+        return [numpy.asarray(numpy.load(f_name, mmap_mode = 'c')) for f_name in payload]
+    finally:
+        _remove_shared(shared)
+
+
+def _remove_shared(shared):
+    is_shared, payload = shared
+    for f_name in payload if is_shared else []:
+        try:
+            os.remove(f_name)
+        except OSError:
+            pass
+
+
+def _parse_range(key_range):
+    key, begin, end = key_range
+    stream, cols, types_, missing_vals, delimit, comment, skip_init_space, max_elems, where, dir_ = _worker_pipes[key]
+    single = not isinstance(cols, tuple)
+    mapped = _csv_utils_Mapped(stream, begin, end)
+    try:
+        chunks = [(c, ) if single else c for c in _csv_utils_array_read(
+            mapped, cols, types_, missing_vals, delimit, comment, skip_init_space, max_elems, where)]
+    finally:
+        mapped.close()
+    if len(chunks) == 0:
+        return None
+    return _share_arrays([numpy.concatenate(col) for col in zip(*chunks)], dir_)
 
-        if isinstance(stream, str):
-            stream_.close()
 
-    return _dagpype_internal_fn_act
+def _rechunk(ranges_arrays, max_elems):
+    """
+    Splits a sequence of lists of column arrays into lists of column arrays of max_elems 
+        rows (the last might have less), as they would have been read serially.
+    """
+    carry = None
+    for arrays in ranges_arrays:
+        if carry is not None:
+            need = max_elems - len(carry[0])
+            carry = [numpy.concatenate((c, a[: need])) for c, a in zip(carry, arrays)]
+            arrays = [a[need: ] for a in arrays]
+            if len(carry[0]) < max_elems:
+                continue
+            yield carry
+            carry = None
+        num = len(arrays[0])
+        full = num - num % max_elems
+        for i in range(0, full, max_elems):
+            yield [a[i: i + max_elems] for a in arrays]
+        if full < num:
+            carry = [a[full: ] for a in arrays]
+    if carry is not None:
+        yield carry
+
+
+def _parse_ranges(pool, key, ranges, max_pending):
+    ranges, pending = iter(ranges), collections.deque()
+    for b, e in itertools.islice(ranges, max_pending):
+        pending.append(pool.apply_async(_parse_range, ((key, b, e), )))
+    while pending:
+        shared = pending[0].get()
+        pending.popleft()
+        for b, e in itertools.islice(ranges, 1):
+            pending.append(pool.apply_async(_parse_range, ((key, b, e), )))
+        if shared is not None:
+            yield _unshare_arrays(shared)
+
+
+__all__ += ['parallel_chunk_stream_vals']
+def parallel_chunk_stream_vals(stream, 
+    cols, 
+    types_ = None, 
+    missing_vals = None,
+    delimit = b',', 
+    comment = None, 
+    skip_init_space = True,
+    max_elems = 8192,
+    where = None,
+    workers = None):
+
+    """
+    Streams delimited values as tuples of numpy.arrays, like chunk_stream_vals, but parses 
+        the file in a pool of worker processes. The file is split into newline-aligned byte
+        ranges (after the header, which is parsed once), each range is parsed by a worker,
+        and the parsed arrays are passed back through shared memory (where available) and
+        sent on in the file's order, in the same chunks as chunk_stream_vals. Quoted fields
+        spanning lines are not supported (the ranges are split at any newline).
+
+    Arguments:
+        stream -- Name of a file.
+        cols -- Indication of which columns to read (see chunk_stream_vals).
+
+    Keyword Arguments:
+        types_ -- Either None, a type, or a tuple of types (see chunk_stream_vals).
+        missing_vals -- Either None, a value, or a tuple of values (see chunk_stream_vals).
+        delimit -- Delimiting binary character (default b',').
+        comment -- Comment-starting binary character or ``None`` (default). 
+            Any character starting from this one until the line end will be ignored.
+        skip_init_space -- Whether spaces starting a field will be ignored (default True).
+        max_elems -- Number of rows per chunk (last might have less) (default 8192).
+        where -- Predicate on the read fields (see field), or None (default).
+        workers -- Number of worker processes, or None for the number of CPUs (default None).
+
+    See Also:
+        :func:`dagpype.np.chunk_stream_vals`
+        :func:`dagpype.parallel_reduce`
+
+    Example:
+
+    >>> # Equivalent to np.chunk_stream_vals('meteo.csv', (b'day', b'wind')) | np.corr()
+    >>> np.parallel_chunk_stream_vals('meteo.csv', (b'day', b'wind'), workers = 4) | np.corr()    
+    0.019720323758326334
+    """
+
+    types_, missing_vals = _default_types_missing_vals(cols, types_, missing_vals)
+    _csv_utils_check_where(cols, types_, where)
+    workers_ = multiprocessing.cpu_count() if workers is None else workers
+    if workers_ < 1:
+        raise InvalidParamError('workers', workers, 'Must be positive')
+    if max_elems < 1:
+        raise InvalidParamError('max_elems', max_elems, 'Must be positive')
+
+    @sources
+    def _dagpype_internal_fn_act():
+        cols_, begin = cols, 0
+        if _csv_utils_cols_are_type(cols, bytes):
+            mapped = _csv_utils_Mapped(stream)
+            try:
+                inds = _csv_utils_inds_from_cols(mapped, cols, types_, delimit, comment, skip_init_space)[2]
+                cols_, begin = inds[0] if isinstance(cols, bytes) else tuple(inds), mapped.pos
+            finally:
+                mapped.close()
+        size = os.path.getsize(stream)
+        num = max(workers_, (size - begin) // _parallel_range_bytes + 1)
+        ranges = [(max(b, begin), e) for _, b, e, _ in _split_file(stream, num, False) if e > begin]
+
+        key, dir_ = next(_worker_keys), tempfile.mkdtemp(dir = _shared_dir)
+        _worker_pipes[key] = (stream, cols_, types_, missing_vals, delimit, comment, skip_init_space, max_elems, where, dir_)
+        try:
+            pool = _make_pool(workers_)
+            try:
+                for arrays in _rechunk(_parse_ranges(pool, key, ranges, 2 * workers_), max_elems):
+                    yield arrays[0] if not isinstance(cols, tuple) else tuple(arrays)
+            finally:
+                # Terminating joins the workers, so that none is still writing to dir_.
+                pool.terminate()
+        finally:
+            del _worker_pipes[key]
+            shutil.rmtree(dir_, ignore_errors = True)
+
+    return _node(
+        _dagpype_internal_fn_act, 'parallel_chunk_stream_vals', stream = stream, cols = cols, types_ = types_, where = where)
 
 
 __all__ += ['chunk_source']
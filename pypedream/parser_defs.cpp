@@ -207,9 +207,3 @@ parse_strings(PyObject * iterator, long & num, bool & err)
     return ret;
 }
 
-extern "C" PyObject *
-parser_max_field_len(PyObject *module, PyObject *args, PyObject *keyword_args)
-{
-    return pyint_from_long(max_field_len);
-}
-
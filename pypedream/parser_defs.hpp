@@ -33,7 +33,7 @@ typedef std::vector<char> buf_t;
 
 enum{_int = 0, _float = 1, _str = 2};
 enum{_inds_cols = 0, _names_cols = 1, _all_cols = 2};
-enum{max_num_cols = 1000, max_field_len = 128};
+enum{max_num_cols = 1000};
 
 typedef std::pair<const char *, const char *> _ParsedT;
 
@@ -58,7 +58,4 @@ parse_longs(PyObject * iterator, long & num, bool & err);
 char * *
 parse_strings(PyObject * iterator, long & num, bool & err);
 
-extern "C" PyObject *
-parser_max_field_len(PyObject *module, PyObject *args, PyObject *keyword_args);
-
 #endif // #ifndef PARSER_DEFS_HPP
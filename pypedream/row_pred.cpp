@@ -0,0 +1,172 @@
+#include <Python.h>
+
+#include <cstring>
+
+#include "row_pred.hpp"
+
+using namespace std;
+
+void
+row_pred_init(_RowPred & pred)
+{
+    pred.prog = NULL;
+    pred.num = 0;
+    pred.ops = pred.inds = NULL;
+    pred.nums = NULL;
+    pred.strs = NULL;
+    pred.stack = NULL;
+}
+
+bool
+row_pred_parse(PyObject * prog, _RowPred & pred)
+{
+    row_pred_init(pred);
+    if (prog == NULL || prog == Py_None)
+        return true;
+
+    PyObject * const seq = PySequence_Fast(prog, "Row predicate must be a sequence");
+    if (seq == NULL)
+        return false;
+
+    pred.num = PySequence_Fast_GET_SIZE(seq);
+    pred.ops = static_cast<long *>(PyMem_Malloc((pred.num + 1) * sizeof(long)));
+    pred.inds = static_cast<long *>(PyMem_Malloc((pred.num + 1) * sizeof(long)));
+    pred.nums = static_cast<double *>(PyMem_Malloc((pred.num + 1) * sizeof(double)));
+    pred.strs = static_cast<_ParsedT *>(PyMem_Malloc((pred.num + 1) * sizeof(_ParsedT)));
+    pred.stack = static_cast<bool *>(PyMem_Malloc((pred.num + 1) * sizeof(bool)));
+    if (pred.ops == NULL || pred.inds == NULL || pred.nums == NULL || pred.strs == NULL || pred.stack == NULL) {
+        Py_DECREF(seq);
+        row_pred_free(pred);
+        PyErr_NoMemory();
+        return false;
+    }
+
+    for (long i = 0; i < pred.num; ++i) {
+        PyObject * s;
+        if (!PyArg_ParseTuple(
+                PySequence_Fast_GET_ITEM(seq, i),
+                "lldO",
+                &pred.ops[i], &pred.inds[i], &pred.nums[i], &s)) {
+            Py_DECREF(seq);
+            row_pred_free(pred);
+            return false;
+        }
+        // The strings are owned by prog, which is kept.
+        long len;
+        const char * const c = pystring_as_string(s, len);
+        if (c == NULL) {
+            Py_DECREF(seq);
+            row_pred_free(pred);
+            return false;
+        }
+        pred.strs[i] = make_pair(c, c + len);
+    }
+
+    Py_DECREF(seq);
+    Py_INCREF(prog);
+    pred.prog = prog;
+    return true;
+}
+
+void
+row_pred_free(_RowPred & pred)
+{
+    Py_XDECREF(pred.prog);
+    if (pred.ops != NULL)
+        PyMem_Free(pred.ops);
+    if (pred.inds != NULL)
+        PyMem_Free(pred.inds);
+    if (pred.nums != NULL)
+        PyMem_Free(pred.nums);
+    if (pred.strs != NULL)
+        PyMem_Free(pred.strs);
+    if (pred.stack != NULL)
+        PyMem_Free(pred.stack);
+    row_pred_init(pred);
+}
+
+static bool
+row_pred_field(
+    const _ParsedT parsed[max_num_cols], long num_parsed,
+    const long * copy_cols, const _ParsedT * missing_vals,
+    long ind, _ParsedT & t)
+{
+    const long i = copy_cols != NULL? copy_cols[ind] : ind;
+    t = i < num_parsed? parsed[i] : make_pair((const char *)NULL, (const char *)NULL);
+    if (t.first == t.second && missing_vals != NULL)
+        t = missing_vals[ind];
+    return t.first != t.second;
+}
+
+bool
+row_pred_accepts(
+    const _RowPred & pred,
+    const _ParsedT parsed[max_num_cols], long num_parsed,
+    const long * copy_cols, const _ParsedT * missing_vals,
+    bool & err)
+{
+    err = false;
+    if (pred.num == 0)
+        return true;
+
+    long top = 0;
+    for (long i = 0; i < pred.num; ++i) {
+        const long op = pred.ops[i];
+        if (op == _pred_and || op == _pred_or) {
+            --top;
+            pred.stack[top - 1] = op == _pred_and?
+                pred.stack[top - 1] && pred.stack[top] : pred.stack[top - 1] || pred.stack[top];
+            continue;
+        }
+        if (op == _pred_not) {
+            pred.stack[top - 1] = !pred.stack[top - 1];
+            continue;
+        }
+
+        // Comparisons of empty fields are false.
+        _ParsedT t;
+        if (!row_pred_field(parsed, num_parsed, copy_cols, missing_vals, pred.inds[i], t)) {
+            pred.stack[top++] = false;
+            continue;
+        }
+        if (op == _pred_bytes_eq || op == _pred_bytes_ne) {
+            const _ParsedT & s = pred.strs[i];
+            const bool eq = distance(t.first, t.second) == distance(s.first, s.second) &&
+                memcmp(t.first, s.first, distance(t.first, t.second)) == 0;
+            pred.stack[top++] = op == _pred_bytes_eq? eq : !eq;
+            continue;
+        }
+
+        const double d = _ParsedTo_double(t, err);
+        if (err)
+            return false;
+        const double v = pred.nums[i];
+        switch (op) {
+            case _pred_lt:
+                pred.stack[top++] = d < v;
+                break;
+            case _pred_le:
+                pred.stack[top++] = d <= v;
+                break;
+            case _pred_gt:
+                pred.stack[top++] = d > v;
+                break;
+            case _pred_ge:
+                pred.stack[top++] = d >= v;
+                break;
+            case _pred_eq:
+                pred.stack[top++] = d == v;
+                break;
+            case _pred_ne:
+                pred.stack[top++] = d != v;
+                break;
+            default:
+                err = true;
+                PyErr_Format(PyExc_ValueError, "Unknown row predicate operation %ld", op);
+                return false;
+        }
+    }
+
+    return pred.stack[0];
+}
+
@@ -0,0 +1,43 @@
+#ifndef ROW_PRED_HPP
+#define ROW_PRED_HPP
+
+#include <Python.h>
+
+#include "parser_defs.hpp"
+
+// Operations of row predicates (must match dagpype._csv_utils).
+enum{
+    _pred_lt = 0, _pred_le = 1, _pred_gt = 2, _pred_ge = 3, _pred_eq = 4, _pred_ne = 5,
+    _pred_bytes_eq = 6, _pred_bytes_ne = 7,
+    _pred_and = 8, _pred_or = 9, _pred_not = 10};
+
+// Row predicate, as a postfix program evaluated on the (unconverted) fields of a row.
+struct _RowPred
+{
+    PyObject * prog;
+
+    long num;
+    long * ops, * inds;
+    double * nums;
+    _ParsedT * strs;
+    bool * stack;
+};
+
+void
+row_pred_init(_RowPred & pred);
+
+bool
+row_pred_parse(PyObject * prog, _RowPred & pred);
+
+void
+row_pred_free(_RowPred & pred);
+
+bool
+row_pred_accepts(
+    const _RowPred & pred,
+    const _ParsedT parsed[max_num_cols], long num_parsed,
+    const long * copy_cols, const _ParsedT * missing_vals,
+    bool & err);
+
+#endif // #ifndef ROW_PRED_HPP
+
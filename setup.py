@@ -123,6 +123,8 @@ pypedream_c = Extension('pypedream_c',
         'pypedream/defs.hpp',
         'pypedream/parser_defs.hpp',
         'pypedream/line_to_tuple.hpp',
+        'pypedream/row_pred.hpp',
+        'pypedream/line_source.hpp',
         'pypedream/exp_averager.hpp'],
     sources = [
         'pypedream/line_writer.cpp',
@@ -135,6 +137,8 @@ pypedream_c = Extension('pypedream_c',
         'pypedream/defs.cpp',
         'pypedream/parser_defs.cpp',
         'pypedream/line_to_tuple.cpp',
+        'pypedream/row_pred.cpp',
+        'pypedream/line_source.cpp',
         'pypedream/exp_averager.cpp'])
 
 
@@ -10,6 +10,12 @@ import itertools
 import string
 import math
 import doctest
+import tempfile
+import multiprocessing.pool
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
 
 sys.path.extend(['..', '../dagpype'])
 from dagpype import *
@@ -1428,6 +1434,1044 @@ class _TestSeq16Sed(unittest.TestCase):
         self.assertEqual(l, [1, 2, 4, 3, 5])
 
 
+class _Test17Batch(unittest.TestCase):
+    def tearDown(self):
+        batch_size(1024)
+
+    def _both(self, fn):
+        prev = batch_size(0)
+        unbatched = fn()
+        batch_size(prev)
+        self.assertEqual(fn(), unbatched)
+        batch_size(3)
+        self.assertEqual(fn(), unbatched)
+        return unbatched
+
+    def test_00(self):
+        l = self._both(lambda : source(range(10)) | filt(lambda x : 2 * x, pre = lambda x : x % 2) | to_list())
+        self.assertEqual(l, [2, 6, 10, 14, 18])
+
+    def test_01(self):
+        r = self._both(lambda : source(range(10)) | filt(lambda x : x + 1, post = lambda x : x > 5) | mean())
+        self.assertEqual(r, 8)
+
+    def test_02(self):
+        r = self._both(lambda : source(range(10)) | skip(3) | count() + sum_() + mean())
+        self.assertEqual(r, (7, 42, 6))
+
+    def test_03(self):
+        r = self._both(lambda : source(range(10)) | (skip(3) | count()) + nth(2) + (relay() | to_list()))
+        self.assertEqual(r, (7, 2, list(range(10))))
+
+    def test_04(self):
+        l = self._both(lambda : source([(1, '2', 3.0)] * 3) | cast((float, int, str)) | select_inds((2, 0)) | to_list())
+        self.assertEqual(l, [('3.0', 1.0)] * 3)
+
+    def test_05(self):
+        @batch_filters
+        def dbl(target):
+            try:
+                while True:
+                    target.send([2 * e for e in (yield)])
+            except GeneratorExit:
+                target.close()
+        l = self._both(lambda : source(range(5)) | dbl | nth(-1))
+        self.assertEqual(l, 8)
+        l = self._both(lambda : source([(1, 1), (13, 0), (1, 455)]) | \
+            group(lambda p : p[0], lambda k : sink(k) + (dbl | select_inds(1) | sum_())) | to_list())
+        self.assertEqual(l, [(1, 456), (13, 0)])
+
+    def test_06(self):
+        @batch_sinks
+        def num(target):
+            n = 0
+            try:
+                while True:
+                    n += len((yield))
+            except GeneratorExit:
+                target.send(n)
+                target.close()
+        n = self._both(lambda : stream_vals('data/data.csv', (b'wind', b'rain')) | filt(pre = lambda t : t[0] > 5) | num)
+        self.assertEqual(n, stream_vals('data/data.csv', (b'wind', b'rain')) | filt(pre = lambda t : t[0] > 5) | count())
+
+    def test_07(self):
+        @batch_filters
+        def large(target):
+            try:
+                while True:
+                    target.send([e for e in (yield) if e >= 4500])
+            except GeneratorExit:
+                target.close()
+        self.assertEqual(source(range(5000)) | large | sum_(), sum(range(4500, 5000)))
+        self.assertRaises(NoResultError, lambda : source(range(5000)) | large | filt(pre = lambda e : e < 0) | sum_())
+
+    def test_08(self):
+        # Sources shorter than a batch run per element, adapting to batch-only stages.
+        @batch_sinks
+        def num(target):
+            n = 0
+            try:
+                while True:
+                    n += len((yield))
+            except GeneratorExit:
+                target.send(n)
+                target.close()
+        self.assertEqual(source([1, 2, 3]) | filt(lambda x : x) | num, 3)
+        self.assertEqual(source([1, 2, 3]) | filt(lambda x : 2 * x) | sum_(), 12)
+        self.assertEqual(source(range(3000)) | filt(lambda x : 2 * x) | num, 3000)
+
+
+class _Test18Fusion(unittest.TestCase):
+    def tearDown(self):
+        fusion(True)
+        batch_size(1024)
+
+    def _both(self, fn):
+        fusion(False)
+        unfused = fn()
+        fusion(True)
+        for size in (0, 1024):
+            batch_size(size)
+            self.assertEqual(fn(), unfused)
+        return unfused
+
+    def test_00(self):
+        l = self._both(lambda : source(range(10)) | \
+            filt(lambda x : x * 2) | filt(pre = lambda x : x > 4) | relay() | cast(float) | to_list())
+        self.assertEqual(l, [6.0, 8.0, 10.0, 12.0, 14.0, 16.0, 18.0])
+
+    def test_01(self):
+        l = self._both(lambda : source(range(10)) | \
+            filt(lambda x : (x, 2 * x), pre = lambda x : x % 2, post = lambda t : t[1] > 2) | \
+            select_inds(1) | to_list())
+        self.assertEqual(l, [6, 10, 14, 18])
+
+    def test_02(self):
+        r = self._both(lambda : source(range(10)) | filt(lambda x : (x, 2 * x)) | select_inds(1) | \
+            (filt(pre = lambda x : x > 4) | relay() | count()) + (cast(float) | relay() | mean()))
+        self.assertEqual(r, (7, 9.0))
+
+    def test_03(self):
+        l = self._both(lambda : source([b'a', b'ab', b'b']) | grep(b'b') | relay() | prob_rand_sample(1) | to_list())
+        self.assertEqual(l, [b'ab', b'b'])
+
+    def test_04(self):
+        s = freeze(filt(lambda x : 2 * x) | filt(pre = lambda x : x > 2) | sum_())
+        for i in range(4):
+            source([1, 2, 3, 4]) | relay() | s
+        self.assertEqual(thaw(s), 72)
+
+    def test_05(self):
+        # Pipes of the same shape share the code of their fused stages, but not the steps.
+        fused = [dagpype._core._plan((filt(lambda x : x + i) | filt(pre = lambda x : x > 2) | sum_())._fns)[0] for i in (1, 2)]
+        self.assertIs(fused[0].__code__, fused[1].__code__)
+        self.assertEqual(
+            [source([1, 2]) | filt(lambda x : x + i) | filt(pre = lambda x : x > 2) | sum_() for i in (1, 2)], 
+            [3, 7])
+
+    def test_06(self):
+        # Short plans, and plans of sources shorter than a batch, are not fused.
+        fns = source([1, 2])._fns + sum_()._fns
+        self.assertIs(dagpype._core._plan_run(fns), fns)
+        t = (filt(lambda x : x + 1) | filt(pre = lambda x : x > 2) | sum_())._fns
+        self.assertEqual(len(dagpype._core._plan_run(source([1, 2])._fns + t)), len(t) + 1)
+        self.assertEqual(len(dagpype._core._plan_run(source(range(5000))._fns + t)), len(t))
+
+
+class _Test19Parallel(unittest.TestCase):
+    def test_00(self):
+        l = source(range(100)) | parallel(filt(lambda x : x * x), workers = 2, batch = 7) | to_list()
+        self.assertEqual(l, [x * x for x in range(100)])
+
+    def test_01(self):
+        l = source(range(100)) | \
+            parallel(filt(lambda x : x * x, pre = lambda x : x % 3), workers = 3, batch = 5, ordered = False) | \
+            to_list()
+        self.assertEqual(sorted(l), [x * x for x in range(100) if x % 3])
+
+    def test_02(self):
+        prev = batch_size(0)
+        try:
+            l = stream_vals('data/data.csv', (b'wind', b'rain')) | \
+                parallel(filt(lambda t : t[0] + t[1]), workers = 2, batch = 4) | to_list()
+        finally:
+            batch_size(prev)
+        self.assertEqual(l, stream_vals('data/data.csv', (b'wind', b'rain')) | filt(lambda t : t[0] + t[1]) | to_list())
+
+    def test_03(self):
+        self.assertRaises(InvalidParamError, parallel, relay(), workers = 0)
+        self.assertRaises(InvalidParamError, parallel, relay(), batch = 0)
+
+    def test_04(self):
+        # Results that cannot be pickled back raise rather than being waited on forever.
+        for ordered in (True, False):
+            self.assertRaises(
+                multiprocessing.pool.MaybeEncodingError,
+                lambda : source(range(10)) | parallel(filt(lambda x : (lambda : x)), workers = 2, batch = 2, ordered = ordered) | count())
+
+
+class _Test20Mergeable(unittest.TestCase):
+    def test_00(self):
+        target = count() + sum_() + mean() + stddev() + min_() + max_()
+        ls = [[2, 4, 4], [4, 5], [], [5, 7, 9]]
+        states = [source(l) | partial_state(target) for l in ls]
+        self.assertEqual(merge_states(target, states), source(sum(ls, [])) | target)
+
+    def test_01(self):
+        l = [(60, 3.1), (61, 3.6), (62, 3.8), (63, 4), (65, 4.1)]
+        states = [source(l[: 2]) | partial_state(corr()), source(l[2: ]) | partial_state(corr())]
+        self.assertAlmostEqual(merge_states(corr(), states), source(l) | corr())
+
+    def test_02(self):
+        self.assertRaises(NoResultError, merge_states, mean(), [source([]) | partial_state(mean())])
+        self.assertRaises(InvalidParamError, partial_state, to_list())
+
+    def test_03(self):
+        target = mean() + stddev() + count()
+        res = parallel_reduce('data/data.csv', lambda s : stream_vals(s, b'wind'), target, workers = 3)
+        expected = stream_vals('data/data.csv', b'wind') | target
+        self.assertAlmostEqual(res[0], expected[0])
+        self.assertAlmostEqual(res[1], expected[1])
+        self.assertEqual(res[2], expected[2])
+
+    def test_04(self):
+        res = parallel_reduce(
+            ['data/data.csv', 'data/meteo.csv'], 
+            lambda s : stream_vals(s, (b'wind', b'rain')) | select_inds(0), 
+            sum_() + count(), 
+            workers = 2)
+        expected = (stream_vals('data/data.csv', b'wind') | sum_()) + \
+            (stream_vals('data/meteo.csv', b'wind') | sum_())
+        self.assertAlmostEqual(res[0], expected)
+        self.assertEqual(res[1], 120)
+
+    def test_05(self):
+        target = np.sum_(axis = 0) + np.min_() + np.max_() + np.count()
+        a = numpy.array([[1., 2.], [3., 4.], [0., 7.]])
+        states = [source([a[: 1]]) | partial_state(target), source([a[1: ]]) | partial_state(target)]
+        s, mn, mx, n = merge_states(target, states)
+        self.assertTrue(numpy.allclose(s, [4., 13.]))
+        self.assertEqual((mn, mx, n), (0., 7., 3))
+
+
+class _Test21ThreadedFans(unittest.TestCase):
+    def _both(self, fn):
+        prev = threaded_fans(False)
+        try:
+            expected = fn()
+            threaded_fans(True)
+            self.assertEqual(fn(), expected)
+        finally:
+            threaded_fans(prev)
+
+    def test_00(self):
+        self._both(lambda : source(range(100)) | np.chunk() | np.mean() + np.min_() + np.max_() + np.count())
+
+    def test_01(self):
+        self._both(lambda : source(range(100)) | (filt(lambda x : 2 * x) + filt(lambda x : x + 1)) | to_list())
+
+    def test_02(self):
+        self._both(lambda : source(range(100)) | nth(3) + count() + (filt(pre = lambda x : x > 50) | sum_()))
+
+    def test_03(self):
+        self._both(lambda : stream_vals('data/data.csv', (b'wind', b'rain')) | \
+            (select_inds(0) | mean()) + (select_inds(1) | stddev()) + corr())
+
+    def test_04(self):
+        prev = threaded_fans(True)
+        try:
+            self.assertRaises(ZeroDivisionError, lambda : 
+                source(range(1000)) | (filt(lambda x : 1 / (x - 999)) | to_list()) + count())
+        finally:
+            threaded_fans(prev)
+
+
+class _Test22Prefetch(unittest.TestCase):
+    def test_00(self):
+        self.assertEqual(
+            stream_vals('data/meteo.csv', b'wind') | prefetch(4) | filt(lambda x : 2 * x) | sum_(),
+            stream_vals('data/meteo.csv', b'wind') | filt(lambda x : 2 * x) | sum_())
+
+    def test_01(self):
+        for size in [0, 3, 1024]:
+            prev = batch_size(size)
+            try:
+                l = source(range(100)) | prefetch(2) | filt(lambda x : 2 * x) | prefetch(3) | to_list()
+                self.assertEqual(l, [2 * x for x in range(100)])
+                self.assertEqual((source([1, 2]) + source([3, 4])) | prefetch(1) | to_list(), [(1, 3), (2, 4)])
+            finally:
+                batch_size(prev)
+
+    def test_02(self):
+        self.assertEqual(source(itertools.count()) | prefetch(4) | filt(pre = lambda x : x > 5) | nth(0), 6)
+
+    def test_03(self):
+        self.assertRaises(ZeroDivisionError, lambda : 
+            source(range(10)) | filt(lambda x : 1 / (x - 7)) | prefetch(2) | to_list())
+
+    def test_04(self):
+        self.assertEqual(source(range(10)) | (prefetch(3) | sum_()) + count(), (45, 10))
+        self.assertRaises(InvalidParamError, prefetch, 0)
+
+
+class _Ticks(object):
+    def __init__(self, n):
+        self._it = iter(range(n))
+
+    def __aiter__(self):
+        return self
+
+    def __anext__(self):
+        import asyncio
+        try:
+            return asyncio.sleep(0.001, next(self._it))
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+@unittest.skipIf(dagpype._async is None, 'Requires asyncio')
+class _Test23Async(unittest.TestCase):
+    def _run(self, pipe, target):
+        import asyncio
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(pipe.run_async(target))
+        finally:
+            loop.close()
+
+    def _double(self, x):
+        import asyncio
+        return asyncio.sleep(0.001, 2 * x)
+
+    def test_00(self):
+        self.assertEqual(source([1, 2, 3]) | async_filt(self._double) | to_list(), [2, 4, 6])
+        self.assertEqual(async_source(_Ticks(3)) | to_list(), [0, 1, 2])
+
+    def test_01(self):
+        l = self._run(source(range(100)) | async_filt(self._double, limit = 10) | filt(lambda x : x + 1), to_list())
+        self.assertEqual(l, [2 * x + 1 for x in range(100)])
+
+    def test_02(self):
+        res = self._run(async_source(_Ticks(10)) | offload(lambda x : x * x, limit = 3), sum_() + count())
+        self.assertEqual(res, (285, 10))
+
+    def test_03(self):
+        self.assertEqual(self._run(source(range(100000)) | async_filt(self._double), nth(1)), 2)
+        self.assertRaises(InvalidParamError, self._run, 
+            source(range(10)) | (async_filt(self._double) + relay()), to_list())
+
+
+class _Test24Align(unittest.TestCase):
+    def test_00(self):
+        self.assertEqual(
+            source(range(10)) | skip(5) + relay() | to_list(),
+            [(5, 0), (6, 1), (7, 2), (8, 3), (9, 4)])
+
+    def test_01(self):
+        self.assertEqual(
+            source(range(8)) | align(skip(5) + relay(), max_buffer = 2, overflow = 'drop') | to_list(),
+            [(5, 3), (6, 4), (7, 5)])
+
+    def test_02(self):
+        self.assertRaises(JoinOverflowError, lambda : 
+            source(range(10)) | align(skip(5) + relay(), max_buffer = 3) | to_list())
+
+    def test_03(self):
+        self.assertEqual(
+            source([1, 2, 3]) | align(filt(pre = lambda x : x % 2 == 1) + relay(), 'latest') | to_list(),
+            [(1, 1), (1, 2), (3, 2), (3, 3)])
+
+    def test_04(self):
+        # Once a branch has ended, nothing more is buffered.
+        self.assertEqual(
+            source(itertools.islice(itertools.count(), 10 ** 5)) | \
+                align(to(lambda x : x == 2) + relay(), max_buffer = 1) | to_list(),
+            [(0, 0), (1, 1), (2, 2)])
+
+    def test_05(self):
+        self.assertEqual(
+            source([1., 2., 3.]) | align(mean() + max_(), 'latest'),
+            (2., 3.))
+
+    def test_06(self):
+        self.assertRaises(InvalidParamError, lambda : align(relay(), 'zip'))
+        self.assertRaises(InvalidParamError, lambda : align(relay() + relay(), 'first'))
+        self.assertRaises(InvalidParamError, lambda : align(relay() + relay(), 'latest', max_buffer = 2))
+        self.assertRaises(InvalidParamError, lambda : align(relay() + relay(), overflow = 'block'))
+
+    def test_07(self):
+        # Branches emitting 0, 1, or 2 elements per element, leaving buffers uneven.
+        def repeat(n):
+            @filters
+            def _act(target):
+                try:
+                    while True:
+                        e = (yield)
+                        for i in range(n(e)):
+                            target.send(e)
+                except GeneratorExit:
+                    target.close()
+            return _act
+        self.assertEqual(
+            source(range(9)) | repeat(lambda x : x % 3) + repeat(lambda x : (x + 1) % 3) + relay() | to_list(),
+            [(1, 0, 0), (2, 1, 1), (2, 1, 2), (4, 3, 3), (5, 4, 4), (5, 4, 5), (7, 6, 6), (8, 7, 7), (8, 7, 8)])
+        self.assertEqual(
+            source(range(9)) | repeat(lambda x : 2) + skip(3) | to_list(),
+            [(0, 3), (0, 4), (1, 5), (1, 6), (2, 7), (2, 8)])
+
+
+class _Test25Profile(unittest.TestCase):
+    def test_00(self):
+        p = profile(filt(lambda x : 2 * x) | sum_())
+        self.assertEqual(source(range(10)) | p, 90)
+        self.assertEqual(
+            [(s['stage'], s['position'], s['in'], s['out']) for s in p.stats()],
+            [('source', '0', None, 10), ('filt', '1', 10, 10), ('sum_', '2', 10, 1)])
+
+    def test_01(self):
+        p = profile((skip(2) | count()) + (filt(pre = lambda x : x % 2 == 0) | to_list()))
+        self.assertEqual(source(range(10)) | p, (8, [0, 2, 4, 6, 8]))
+        self.assertEqual(
+            [(s['stage'], s['position'], s['in'], s['out']) for s in p.stats()],
+            [('source', '0', None, 10), 
+                ('skip', '1.0.0', 10, 8), ('count', '1.0.1', 8, 1), 
+                ('filt', '1.1.0', 10, 5), ('to_list', '1.1.1', 5, 1)])
+
+    def test_02(self):
+        p = profile(window_quantile(3) | sum_())
+        source(range(1000)) | p
+        for s in p.stats():
+            self.assertTrue(0 <= s['exclusive'] <= s['inclusive'])
+        self.assertEqual(len(p.report().split('\n')), 4)
+
+    def test_03(self):
+        p = profile(np.chunk() | np.sum_())
+        self.assertEqual(source(range(10)) | p, 45)
+        self.assertEqual([(s['stage'], s['in']) for s in p.stats()], [('source', None), ('chunk', 10), ('sum_', 1)])
+
+    def test_04(self):
+        self.assertRaises(InvalidParamError, lambda : profile(relay()))
+
+
+class _Test26Compile(unittest.TestCase):
+    def test_00(self):
+        double_sum = compile_(filt(lambda x : 2 * x) | filt(pre = lambda x : x > 2) | sum_())
+        self.assertEqual([double_sum(l) for l in [[1, 2], [3], [4, 5, 6]]], [4, 6, 30])
+
+    def test_01(self):
+        r = compile_(count() + to_list(), lambda n : source(range(n)))
+        self.assertEqual(r(3), (3, [0, 1, 2]))
+        self.assertEqual(r(2), (2, [0, 1]))
+        self.assertEqual(r(0), (0, []))
+
+    def test_02(self):
+        r = compile_(filt(lambda x : x + 1) | freeze(sum_()))
+        for l in [[1, 2], [3], [4, 5]]:
+            r(l)
+        self.assertEqual(thaw(r), 20)
+
+    def test_03(self):
+        r = compile_(np.chunk() | np.mean(), lambda f_name : stream_vals(f_name, b'wind'))
+        self.assertAlmostEqual(r('data/data.csv'), stream_vals('data/data.csv', b'wind') | mean())
+
+    def test_04(self):
+        self.assertRaises(InvalidParamError, lambda : compile_(relay()))
+        self.assertRaises(InvalidParamError, lambda : compile_(to_list(), lambda l : l)([1]))
+
+    def test_05(self):
+        # Sources of several stages are planned per run; single-stage ones need not be.
+        r = compile_(to_list(), lambda n : source(range(n)) | relay() | filt(lambda x : 2 * x) | skip(1))
+        self.assertEqual([r(3), r(1)], [[2, 4], []])
+
+    def test_06(self):
+        # Inputs are sent directly, in batches if long enough, and sinks may stop early.
+        r = compile_(filt(lambda x : 2 * x) | sum_())
+        l = list(range(5000))
+        self.assertEqual([r(l), r(iter(l)), r([3])], [source(l) | filt(lambda x : 2 * x) | sum_()] * 2 + [6])
+        self.assertRaises(NoResultError, lambda : r([]))
+        r = compile_(filt(lambda x : x + 1) | nth(2))
+        self.assertEqual([r(l), r([1, 2, 3])], [3, 4])
+
+    def test_07(self):
+        def add_1():
+            @batch_filters
+            def _act(target):
+                try:
+                    while True:
+                        target.send([e + 1 for e in (yield)])
+                except GeneratorExit:
+                    target.close()
+            return _act
+        r = compile_(add_1() | to_list())
+        prev = batch_size(0)
+        try:
+            self.assertEqual(r([1, 2]), [2, 3])
+        finally:
+            batch_size(prev)
+        self.assertEqual([r([1, 2]), r(range(2000))[-1]], [[2, 3], 2000])
+
+
+class _Test27Cancel(unittest.TestCase):
+    def _gen(self, log):
+        try:
+            for i in itertools.count():
+                log.append(i)
+                yield i
+        finally:
+            log.append('closed')
+
+    def test_00(self):
+        log = []
+        self.assertEqual(sources(lambda : self._gen(log)) | nth(2), 2)
+        self.assertEqual(log, [0, 1, 2, 'closed'])
+
+    def test_01(self):
+        log = []
+        self.assertEqual(sources(lambda : self._gen(log)) | slice_(3) | to_list(), [0, 1, 2])
+        self.assertEqual(log[-1], 'closed')
+        self.assertTrue(len(log) <= 5)
+
+    def test_02(self):
+        log = []
+        self.assertEqual(sources(lambda : self._gen(log)) | (slice_(2) + relay()) | to_list(), [(0, 0), (1, 1)])
+        self.assertEqual(log[-1], 'closed')
+        self.assertTrue(len(log) <= 5)
+
+    def test_03(self):
+        log = []
+        self.assertEqual(sources(lambda : self._gen(log)) | nth(2) + (to(4) | to_list()), (2, [0, 1, 2, 3, 4]))
+        self.assertEqual(log[-1], 'closed')
+        self.assertTrue(len(log) <= 7)
+
+    def test_04(self):
+        self.assertEqual(source(range(10)) | slice_(0) | to_list(), [])
+
+    def test_05(self):
+        with open('data/data.csv', 'rb') as f:
+            self.assertEqual(stream_lines(f) | nth(0), b'day,wind,hail,rain')
+            self.assertFalse(f.closed)
+
+    def test_06(self):
+        # Generators passed to source are the caller's, and are left open.
+        log = []
+        g = self._gen(log)
+        self.assertEqual(source(g) | nth(2), 2)
+        self.assertNotIn('closed', log)
+        self.assertEqual(next(g), log[-1])
+
+
+class _Test28Plan(unittest.TestCase):
+    def test_00(self):
+        self.assertEqual(
+            (relay() | (select_inds(0) | sum_()) + (select_inds(0) | count())).explain().split('\n'),
+            ['0      select_inds(inds=0)', '1      fan', '1.0.0    sum_()', '1.1.0    count()'])
+
+    def tearDown(self):
+        assume_pure(False)
+
+    def test_01(self):
+        self.assertEqual(
+            (select_inds(0) | skip(2) | to_list()).explain().split('\n'),
+            ['0      skip(n=2)', '1      select_inds(inds=0)', '2      to_list()'])
+        self.assertEqual(
+            (filt(lambda x : x * x) | skip(2) | to_list()).explain().split('\n'),
+            ['0      filt(trans=<lambda>)', '1      skip(n=2)', '2      to_list()'])
+        assume_pure(True)
+        self.assertEqual(
+            (filt(lambda x : x * x) | skip(2) | to_list()).explain().split('\n'),
+            ['0      skip(n=2)', '1      filt(trans=<lambda>)', '2      to_list()'])
+        self.assertEqual(
+            (filt(lambda x : x * x) | skip(2) | to_list()).explain(optimize = False).split('\n'),
+            ['0      filt(trans=<lambda>)', '1      skip(n=2)', '2      to_list()'])
+
+    def test_02(self):
+        calls = []
+        def square(x):
+            calls.append(x)
+            return x * x
+        # Unless assumed pure, functions are called on every element, and may keep state.
+        self.assertEqual(source(range(10)) | filt(square) | skip(8) | to_list(), [64, 81])
+        self.assertEqual(calls, list(range(10)))
+        counter = itertools.count(1)
+        self.assertEqual(source('abcde') | filt(lambda c : next(counter)) | skip(2) | to_list(), [3, 4, 5])
+        assume_pure(True)
+        del calls[:]
+        self.assertEqual(source(range(10)) | filt(square) | slice_(2, 4) | to_list(), [4, 9])
+        self.assertEqual(calls, [2, 3])
+
+    def test_03(self):
+        f = lambda x : x + 1
+        p = (filt(f) | filt(pre = lambda x : x > 2) | count()) + (filt(f) | skip(1) | to_list())
+        self.assertEqual(p.explain().split('\n')[0], '0      fan')
+        self.assertEqual(source(range(5)) | p, (3, [2, 3, 4, 5]))
+        assume_pure(True)
+        self.assertEqual(p.explain().split('\n')[0], '0      filt(trans=<lambda>)')
+        self.assertEqual(source(range(5)) | p, (3, [2, 3, 4, 5]))
+        prev = optimization(False)
+        try:
+            self.assertEqual(source(range(5)) | p, (3, [2, 3, 4, 5]))
+        finally:
+            optimization(prev)
+
+    def test_04(self):
+        # A branch consisting of only the shared stage keeps it.
+        p = skip(1) + (skip(1) | count())
+        self.assertEqual(len(p.explain().split('\n')), 4)
+        self.assertEqual(source(range(3)) | (relay() + relay()) | to_list(), [(0, 0), (1, 1), (2, 2)])
+
+    def test_05(self):
+        # Stages without nodes are described by their factories, and are not rewritten.
+        self.assertEqual(
+            (window_simple_ave(2) | skip(1) | count()).explain().split('\n'),
+            ['0      window_simple_ave()', '1      skip(n=1)', '2      count()'])
+
+    def test_06(self):
+        # Plans with nothing to rewrite are not copied by the passes.
+        fns = (source([1]) | filt(lambda x : x + 1) | filt(pre = lambda x : x > 1))._fns + to_list()._fns
+        self.assertIs(dagpype._core._rewrite(fns), fns)
+
+
+class _Test29Pushdown(unittest.TestCase):
+    def _check(self, make):
+        res = make() | to_list()
+        prev = optimization(False)
+        try:
+            self.assertEqual(make() | to_list(), res)
+        finally:
+            optimization(prev)
+        return res
+
+    def test_00(self):
+        make = lambda : stream_vals('data/meteo.csv', (b'day', b'wind', b'rain')) | select_inds((2, 0))
+        self.assertEqual(len(make().explain().split('\n')), 1)
+        self.assertEqual(self._check(make)[: 2], [(4, 1), (6, 1)])
+
+    def test_01(self):
+        make = lambda : stream_vals('data/meteo.csv', (b'day', b'wind')) | skip(1) | select_inds(1) | cast(float)
+        self.assertEqual(len(make().explain().split('\n')), 2)
+        self.assertEqual(self._check(make)[0], 4.)
+
+    def test_02(self):
+        # Casts to other types than float are not pushed, as the readers would parse differently.
+        make = lambda : stream_vals('data/meteo.csv', (b'day', b'wind')) | select_inds(1) | cast(int)
+        self.assertEqual(make().explain().split('\n')[1], '1      cast(types_=int)')
+        self._check(make)
+
+    def test_03(self):
+        make = lambda : stream_lines('data/meteo.csv') | csv_split((b'day', b'wind')) | select_inds(1)
+        self.assertEqual(len(make().explain().split('\n')), 2)
+        self._check(make)
+
+    def test_04(self):
+        make = lambda : np.chunk_stream_vals('data/meteo.csv', (b'day', b'wind', b'rain')) | \
+            select_inds((2, 1))
+        self.assertEqual(len(make().explain().split('\n')), 1)
+        res = make() | np.concatenate_chunks()
+        prev = optimization(False)
+        try:
+            self.assertEqual([list(c) for c in make() | np.concatenate_chunks()], [list(c) for c in res])
+        finally:
+            optimization(prev)
+
+
+class _Test30RowPred(unittest.TestCase):
+    def test_00(self):
+        w = (field(0) > 3) & ~field(1).isin([4, 6])
+        res = stream_vals('data/meteo.csv', (b'wind', b'rain'), where = w) | to_list()
+        self.assertEqual(len(res), 24)
+        all_ = stream_vals('data/meteo.csv', (b'wind', b'rain')) | to_list()
+        self.assertEqual(res, [t for t in all_ if t[0] > 3 and t[1] not in (4, 6)])
+        self.assertEqual(res, [t for t in all_ if w(t)])
+
+    def test_01(self):
+        make = lambda : stream_vals('data/meteo.csv', (b'wind', b'rain')) | filt(pre = field(1).between(3, 4))
+        self.assertEqual(len(make().explain().split('\n')), 1)
+        res = make() | to_list()
+        prev = optimization(False)
+        try:
+            self.assertEqual(make() | to_list(), res)
+        finally:
+            optimization(prev)
+
+    def test_02(self):
+        self.assertEqual(
+            stream_vals('data/meteo.csv', (b'day', b'rain'), (int, bytes), where = field(1) == b'1') | to_list(),
+            [t for t in stream_vals('data/meteo.csv', (b'day', b'rain'), (int, bytes)) | to_list() if t[1] == b'1'])
+        self.assertRaises(InvalidParamError, lambda : stream_vals('data/meteo.csv', (b'wind', b'rain'), where = field(2) > 1))
+        self.assertRaises(InvalidParamError, lambda : stream_vals('data/meteo.csv', b'wind', where = field(0) == b'1'))
+        self.assertRaises(InvalidParamError, lambda : field(0) < b'1')
+
+    def test_03(self):
+        w = field(0) > 3
+        res = np.chunk_stream_vals('data/meteo.csv', (b'wind', b'rain'), where = w, max_elems = 5) | \
+            select_inds(1) | np.concatenate_chunks()
+        self.assertEqual(list(res), [t[1] for t in stream_vals('data/meteo.csv', (b'wind', b'rain'), where = w) | to_list()])
+
+
+class _Test31Incremental(unittest.TestCase):
+    def _append(self, s):
+        with open('tmp_log.csv', 'ab') as f:
+            f.write(s)
+
+    def test_00(self):
+        target = mean() + count()
+        lines = []
+        def pipe_factory(s):
+            return source(s) | filt(lambda l : lines.append(l) or l) | csv_split(b'b')
+        try:
+            self._append(b'a,b\n1,2\n3,4\n')
+            self.assertEqual(incremental_reduce('tmp_log.ckpt', 'tmp_log.csv', pipe_factory, target), (3., 2))
+            self._append(b'5,6\n7,')
+            del lines[:]
+            self.assertEqual(incremental_reduce('tmp_log.ckpt', 'tmp_log.csv', pipe_factory, target), (4., 3))
+            self.assertEqual(lines, [b'a,b\n', b'5,6\n'])
+            self._append(b'8\n')
+            self.assertEqual(incremental_reduce('tmp_log.ckpt', ['tmp_log.csv'], pipe_factory, target), (5., 4))
+            self.assertEqual(incremental_reduce('tmp_log.ckpt', 'tmp_log.csv', pipe_factory, target), (5., 4))
+            self.assertEqual(stream_vals('tmp_log.csv', b'b') | target, (5., 4))
+        finally:
+            for f_name in ['tmp_log.csv', 'tmp_log.ckpt']:
+                if os.path.exists(f_name):
+                    os.remove(f_name)
+
+    def test_01(self):
+        try:
+            self._append(b'1\n2\n')
+            incremental_reduce('tmp_log.ckpt', 'tmp_log.csv', stream_vals, sum_(), header = False)
+            with open('tmp_log.csv', 'wb') as f:
+                f.write(b'1\n')
+            self.assertRaises(InvalidParamError, 
+                lambda : incremental_reduce('tmp_log.ckpt', 'tmp_log.csv', stream_vals, sum_(), header = False))
+            self.assertRaises(InvalidParamError, 
+                lambda : incremental_reduce('tmp_log.ckpt', 'tmp_log.csv', stream_vals, to_list(), header = False))
+        finally:
+            for f_name in ['tmp_log.csv', 'tmp_log.ckpt']:
+                if os.path.exists(f_name):
+                    os.remove(f_name)
+
+
+class _Test32GroupSpill(unittest.TestCase):
+    def test_00(self):
+        data = [(random.randint(0, 300), random.randint(0, 10)) for _ in range(5000)]
+        key_pipe = lambda k : sink(k) + (select_inds(1) | sum_()) + count()
+        res = sorted(source(data) | group(lambda t : t[0], key_pipe) | to_list())
+        for max_live in [1, 7, 1000]:
+            self.assertEqual(
+                sorted(source(data) | group(lambda t : t[0], key_pipe, max_live = max_live) | to_list()),
+                res)
+
+    def test_01(self):
+        # The groups beyond the cap are sent after the others.
+        res = source([1, 2, 1, 3, 2]) | group(lambda x : x, lambda k : filt(lambda x : 10 * x), max_live = 1) | to_list()
+        self.assertEqual(res[: 2], [10, 10])
+        self.assertEqual(sorted(res[2: ]), [20, 20, 30])
+        self.assertRaises(InvalidParamError, lambda : group(lambda x : x, lambda k : count(), max_live = 0))
+
+
+class _Test33Sort(unittest.TestCase):
+    def test_00(self):
+        data = [(random.randint(0, 20), i) for i in range(3000)]
+        for reverse in [False, True]:
+            res = sorted(data, key = lambda t : t[0], reverse = reverse)
+            for mem_limit in [10 ** 9, 2000, 1]:
+                self.assertEqual(
+                    source(data) | sort_(lambda t : t[0], reverse, mem_limit) | to_list(),
+                    res)
+        self.assertEqual(source([]) | sort_() | to_list(), [])
+
+    def test_01(self):
+        # More runs than are merged at once.
+        data = [random.random() for _ in range(500)]
+        self.assertEqual(source(data) | sort_(mem_limit = 1) | to_list(), sorted(data))
+
+    def test_02(self):
+        a = numpy.array([random.randint(0, 50) for _ in range(2000)])
+        b = numpy.arange(2000) * 1.
+        chunks = [(a[i: i + 300], b[i: i + 300]) for i in range(0, 2000, 300)]
+        for reverse in [False, True]:
+            for mem_limit in [10 ** 9, 5000]:
+                res = source(chunks) | np.sort_(0, reverse, mem_limit, 100) | to_list()
+                keys = numpy.concatenate([c[0] for c in res])
+                vals = numpy.concatenate([c[1] for c in res])
+                self.assertEqual(list(keys), sorted(a, reverse = reverse))
+                self.assertEqual(sorted(zip(keys, vals)), sorted(zip(a, b)))
+
+    def test_03(self):
+        m = numpy.array([[3, 0], [1, 1], [2, 2]])
+        self.assertEqual(
+            (source([m[: 2], m[2: ]]) | np.sort_(0, mem_limit = 1) | np.concatenate_chunks()).tolist(),
+            [[1, 1], [2, 2], [3, 0]])
+
+
+class _Test34ParallelGroup(unittest.TestCase):
+    def test_00(self):
+        data = [(random.randint(0, 100), random.randint(0, 10)) for _ in range(3000)]
+        key_pipe = lambda k : sink(k) + count() + (select_inds(1) | sum_())
+        self.assertEqual(
+            source(data) | parallel_group(lambda t : t[0], key_pipe, workers = 3, batch = 50) | to_list(),
+            source(data) | group(lambda t : t[0], key_pipe) | to_list())
+
+    def test_01(self):
+        self.assertEqual(
+            source([]) | parallel_group(lambda t : t[0], lambda k : count(), workers = 2) | to_list(), 
+            [])
+        self.assertRaises(
+            TypeError,
+            lambda : source([1, 2]) | parallel_group(lambda t : t[0], lambda k : count(), workers = 2) | to_list())
+        self.assertRaises(InvalidParamError, lambda : parallel_group(lambda t : t, lambda k : count(), workers = 0))
+
+    def test_02(self):
+        # Results that cannot be pickled, and workers dying, raise rather than being waited on forever.
+        self.assertRaises(
+            (pickle.PicklingError, AttributeError),
+            lambda : source(range(10)) | parallel_group(lambda x : x % 3, lambda k : filt(lambda x : (lambda : x)) | to_list(), workers = 2) | to_list())
+        self.assertRaises(
+            Error,
+            lambda : source(range(10)) | parallel_group(lambda x : x % 3, lambda k : filt(lambda x : os._exit(3)) | to_list(), workers = 2) | to_list())
+
+
+class _Test35HashJoin(unittest.TestCase):
+    def _join(self, build, probe, max_build):
+        return source(probe) | hash_join(
+            source(build), 
+            lambda b : b[0], 
+            lambda p : p[0],
+            lambda k, b : sink(b[1]) + count(),
+            filt(lambda p : ('probe', p[1])),
+            filt(lambda b : ('build', b[1])),
+            max_build = max_build) | to_list()
+
+    def test_00(self):
+        build = [(random.randint(0, 100), i) for i in range(300)]
+        probe = [(random.randint(50, 150), i) for i in range(1000)]
+        expected = self._join(build, probe, None)
+        self.assertEqual(sorted(self._join(build, probe, 10), key = repr), sorted(expected, key = repr))
+        self.assertEqual(sorted(self._join(build, probe, 1), key = repr), sorted(expected, key = repr))
+
+    def test_01(self):
+        build, probe = [(1, 'a'), (1, 'b'), (2, 'c')], [(1, 0), (3, 1), (1, 2)]
+        self.assertEqual(
+            sorted(self._join(build, probe, None), key = repr),
+            sorted([('a', 2), ('b', 2), ('probe', 1), ('build', 'c')], key = repr))
+        self.assertRaises(InvalidParamError, lambda : hash_join(source([]), None, None, None, max_build = 0))
+
+
+class _Test36MergeJoin(unittest.TestCase):
+    def test_00(self):
+        a = sorted((random.randint(0, 20), i) for i in range(50))
+        b = sorted((random.randint(0, 20), -i) for i in range(50))
+        for how in ['inner', 'left', 'outer']:
+            res = source(a) | merge_join(source(b), lambda e : e[0], lambda o : o[0], how = how) | to_list()
+            expected = [(e, o) for e in a for o in b if e[0] == o[0]]
+            if how != 'inner':
+                expected += [(e, None) for e in a if e[0] not in set(o[0] for o in b)]
+            if how == 'outer':
+                expected += [(None, o) for o in b if o[0] not in set(e[0] for e in a)]
+            self.assertEqual(sorted(res, key = repr), sorted(expected, key = repr))
+
+    def test_01(self):
+        self.assertEqual(
+            source([1, 2, 2, 5]) | merge_join(source([2, 3]) | filt(lambda o : o * 10), lambda e : e * 10, lambda o : o, how = 'outer') | to_list(),
+            [(1, None), (2, 20), (2, 20), (None, 30), (5, None)])
+        self.assertRaises(
+            UnsortedKeyError,
+            lambda : source([2, 1]) | merge_join(source([1, 2]), lambda e : e, lambda o : o) | to_list())
+        self.assertRaises(InvalidParamError, lambda : merge_join(source([]), None, None, how = 'right'))
+
+
+class _Test37Mapped(unittest.TestCase):
+    def test_00(self):
+        for where in [None, field(0) > 5]:
+            self.assertEqual(
+                stream_vals('data/meteo.csv', (b'wind', b'rain'), where = where, mapped = True) | to_list(),
+                stream_vals('data/meteo.csv', (b'wind', b'rain'), where = where) | to_list())
+        chunks = lambda mapped : \
+            np.chunk_stream_vals('data/meteo.csv', (b'day', b'wind'), max_elems = 7, mapped = mapped) | \
+            filt(lambda t : [a.tolist() for a in t]) | \
+            to_list()
+        self.assertEqual(chunks(True), chunks(False))
+
+    def test_01(self):
+        for rstrip in [True, False]:
+            self.assertEqual(
+                stream_lines('data/meteo.csv', rstrip, mapped = True) | filt(lambda l : bytes(l)) | to_list(),
+                stream_lines('data/meteo.csv', rstrip) | to_list())
+
+    def test_02(self):
+        try:
+            open('tmp_data.csv', 'wb').close()
+            self.assertEqual(stream_lines('tmp_data.csv', mapped = True) | count(), 0)
+            with open('tmp_data.csv', 'wb') as f:
+                f.write(b'a,b\n1,2\n3,4')
+            self.assertEqual(stream_vals('tmp_data.csv', (b'a', b'b'), mapped = True) | to_list(), [(1., 2.), (3., 4.)])
+        finally:
+            os.remove('tmp_data.csv')
+
+    def test_03(self):
+        # Spans several batches, the last of which is sent after the views are exhausted.
+        try:
+            with open('tmp_data.csv', 'wb') as f:
+                f.write(b''.join(b'%d\n' % i for i in range(5000)))
+            self.assertEqual(stream_lines('tmp_data.csv', mapped = True) | filt(len) | sum_(), 18890)
+            self.assertEqual(stream_lines('tmp_data.csv', mapped = True) | filt(lambda l : int(bytes(l))) | sum_(), 12497500)
+            self.assertEqual(stream_lines('tmp_data.csv', mapped = True) | count(), 5000)
+        finally:
+            os.remove('tmp_data.csv')
+
+
+class _Test38ParallelChunkStreamVals(unittest.TestCase):
+    def _lists(self, pipe):
+        return pipe | filt(lambda t : [a.tolist() for a in t] if isinstance(t, tuple) else t.tolist()) | to_list()
+
+    def test_00(self):
+        for f_name, cols, max_elems in [
+                ('data/meteo.csv', (b'day', b'wind'), 7), 
+                ('data/meteo.csv', b'wind', 8192), 
+                ('data/neat_data.csv', (2, 0), 5)]:
+            self.assertEqual(
+                self._lists(np.parallel_chunk_stream_vals(f_name, cols, max_elems = max_elems, workers = 3)),
+                self._lists(np.chunk_stream_vals(f_name, cols, max_elems = max_elems)))
+
+    def test_01(self):
+        self.assertEqual(
+            self._lists(np.parallel_chunk_stream_vals('data/meteo.csv', (b'day', b'wind'), where = field(1) > 5, max_elems = 5, workers = 2)),
+            self._lists(np.chunk_stream_vals('data/meteo.csv', (b'day', b'wind'), where = field(1) > 5, max_elems = 5)))
+        self.assertRaises(InvalidParamError, lambda : np.parallel_chunk_stream_vals('data/meteo.csv', b'wind', workers = 0))
+
+    def test_02(self):
+        # Pipes ending early leave no files of the ranges parsed meanwhile.
+        src = sys.modules['dagpype.np._src']
+        dir_ = tempfile.gettempdir() if src._shared_dir is None else src._shared_dir
+        before, prev = set(os.listdir(dir_)), src._parallel_range_bytes
+        src._parallel_range_bytes = 1000
+        try:
+            for _ in range(3):
+                np.parallel_chunk_stream_vals('data/meteo.csv', (b'day', b'wind'), max_elems = 5, workers = 2) | nth(0)
+        finally:
+            src._parallel_range_bytes = prev
+        self.assertEqual(set(os.listdir(dir_)) - before, set())
+
+    def test_03(self):
+        class _Unsavable(object):
+            dtype = numpy.dtype(float)
+            def __reduce__(self):
+                raise IOError('No space left on device')
+        dir_ = tempfile.mkdtemp()
+        try:
+            self.assertRaises(
+                IOError, 
+                lambda : sys.modules['dagpype.np._src']._share_arrays([numpy.arange(3.), _Unsavable()], dir_))
+            self.assertEqual(os.listdir(dir_), [])
+        finally:
+            os.rmdir(dir_)
+
+
+class _Test39InferTypes(unittest.TestCase):
+    def test_00(self):
+        self.assertEqual(
+            stream_vals('data/employee.csv', (b'Name', b'EmpId'), infer_types = True) | to_list(),
+            stream_vals('data/employee.csv', (b'Name', b'EmpId'), (bytes, int)) | to_list())
+        self.assertEqual(
+            stream_vals(open('data/employee.csv', 'rb'), b'EmpId', infer_types = 2) | to_list(),
+            [3415, 2241, 3401, 2202, 2455])
+        self.assertEqual(
+            stream_vals('data/employee.csv', (b'Name', b'EmpId'), infer_types = True, where = field(0) == b'Harry') | to_list(),
+            [(b'Harry', 3415)])
+        a = np.chunk_stream_vals('data/meteo.csv', (b'day', b'wind'), infer_types = True) | np.concatenate_chunks()
+        self.assertEqual(a[0].dtype.kind, 'i')
+
+    def test_01(self):
+        # Only rows sampled from random offsets show the column is not of ints.
+        try:
+            with open('tmp_data.csv', 'wb') as f:
+                f.write(b'a,b\n')
+                for i in range(5000):
+                    f.write((u'%d,%s\n' % (i, i if i < 100 else i + 0.5)).encode())
+            self.assertEqual(
+                stream_vals('tmp_data.csv', (b'a', b'b'), infer_types = 10) | nth(200),
+                (200, 200.5))
+            self.assertEqual(
+                stream_vals(open('tmp_data.csv', 'rb'), (b'a', b'b'), infer_types = 10) | nth(2),
+                (2, 2))
+        finally:
+            os.remove('tmp_data.csv')
+
+    def test_02(self):
+        # Ints beyond C longs are not inferred as ints (which the readers would clamp).
+        try:
+            with open('tmp_data.csv', 'wb') as f:
+                f.write(b'id,n\n18446744073709551617,1\n12,2\n')
+            self.assertEqual(
+                stream_vals('tmp_data.csv', (b'id', b'n'), infer_types = True) | to_list(),
+                [(1.8446744073709552e+19, 1), (12., 2)])
+            a = np.chunk_stream_vals('tmp_data.csv', (b'id', b'n'), infer_types = True) | np.concatenate_chunks()
+            self.assertEqual((a[0].dtype.kind, a[1].dtype.kind), ('f', 'i'))
+            self.assertEqual(a[0][0], 1.8446744073709552e+19)
+        finally:
+            os.remove('tmp_data.csv')
+
+
+class _Test40StrCols(unittest.TestCase):
+    def test_00(self):
+        cols, types_ = (b'Name', b'EmpId', b'DeptName'), (bytes, int, bytes)
+        chunks = np.chunk_stream_vals('data/employee.csv', cols, types_, max_elems = 2) | to_list()
+        self.assertEqual([len(c[0]) for c in chunks], [2, 2, 1])
+        self.assertEqual(
+            [tuple(c[i][j] for i in range(3)) for c in chunks for j in range(len(c[0]))],
+            stream_vals('data/employee.csv', cols, types_) | to_list())
+        self.assertEqual(chunks[2][2].dtype, numpy.dtype('S13'))
+
+    def test_01(self):
+        try:
+            with open('tmp_data.csv', 'wb') as f:
+                f.write(b'a,b\n1,\n2,' + b'x' * 1000 + b'\n')
+            a = np.chunk_stream_vals('tmp_data.csv', b'b', bytes, b'?') | np.concatenate_chunks()
+            self.assertEqual(a.tolist(), [b'?', b'x' * 1000])
+        finally:
+            os.remove('tmp_data.csv')
+
+
+class _Test41Quoting(unittest.TestCase):
+    _data = b'a,"b,c",d\n1,"x ""y"" z",2.5\n3,"two\nlines, here",4\n"5",  "q",6\n7,ab"c,8\n'
+    _cols, _types = (b'a', b'b,c', b'd'), (int, bytes, float)
+    _rows = [(1, b'x "y" z', 2.5), (3, b'two\nlines, here', 4.), (5, b'q', 6.), (7, b'ab"c', 8.)]
+
+    def _read(self, data, fn):
+        try:
+            with open('tmp_data.csv', 'wb') as f:
+                f.write(data)
+            return fn()
+        finally:
+            os.remove('tmp_data.csv')
+
+    def test_00(self):
+        self.assertEqual(
+            self._read(self._data, lambda : stream_vals('tmp_data.csv', self._cols, self._types) | to_list()), 
+            self._rows)
+        self.assertEqual(
+            self._read(self._data, lambda : stream_vals('tmp_data.csv', self._cols, self._types, mapped = True) | to_list()), 
+            self._rows)
+        self.assertEqual(
+            self._read(self._data, lambda : stream_vals('tmp_data.csv', self._cols, self._types, where = field(1) == b'q') | to_list()), 
+            self._rows[2: 3])
+
+    def test_01(self):
+        chunks = self._read(
+            self._data, 
+            lambda : np.chunk_stream_vals('tmp_data.csv', self._cols, self._types, max_elems = 3) | to_list())
+        self.assertEqual(
+            [tuple(c[i][j] for i in range(3)) for c in chunks for j in range(len(c[0]))], 
+            self._rows)
+
+    def test_02(self):
+        self.assertEqual(
+            self._read(b'1,"a,b"\n', lambda : stream_lines('tmp_data.csv') | csv_split(types_ = (int, bytes)) | to_list()), 
+            [(1, b'a,b')])
+        self.assertRaises(
+            ValueError, 
+            lambda : self._read(b'a,b\n1,"x\n', lambda : stream_vals('tmp_data.csv', (b'a', b'b'), (int, bytes)) | to_list()))
+
+
 if __name__ == '__main__':
     unittest.main()
 